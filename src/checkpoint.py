@@ -0,0 +1,148 @@
+import datetime
+import json
+import logging
+import os
+import threading
+from prometheus_client import Counter
+from transitions.initiate_standby import complete_standby, standby_not_ready
+from transitions.wait_for import WaitFor
+
+logger = logging.getLogger(__name__)
+
+# Logic's pipeline tracking, retry state and pending standby trigger, written
+# to a small JSON file whenever they change so a restarted logic worker picks
+# up the Tekton event it was tracking instead of forgetting it.
+#
+#   {"pipeline": {"event_id": "..", "start_ts": "2026-01-01T00:00:00", ..},
+#    "retry_state": {..}, "transition_failed": false,
+#    "failed_transition_maintenance": null,
+#    "triggers": [{"condition": "patroni_has_no_standby_concerns", "keys": ["patroni"],
+#                  "action": "complete_standby", "args": ["ns", "prod", "gold-standby"],
+#                  "deadline": null, "on_timeout": null, "timeout_args": [],
+#                  "not_before": null, "failures": 0}]}
+#
+# Triggers are recorded by name; the first argument of a trigger action is
+# always the Logic instance, which is supplied again on restore.  A trigger
+# whose action was running is recorded too, so it runs again after a restart.
+
+ACTIONS = dict(complete_standby=complete_standby, standby_not_ready=standby_not_ready)
+
+DATETIMES = (('pipeline', 'start_ts'), ('retry_state', 'transition_started_ts'), ('retry_state', 'retry_at'))
+
+WRITES = Counter('switchover_checkpoint_writes', 'Switchover Logic checkpoint writes', ['result'])
+
+
+def snapshot(logic):
+    return dict(
+        pipeline=dict(logic.pipeline),
+        retry_state=None if logic.retry_state is None else dict(logic.retry_state),
+        transition_failed=logic.transition_failed,
+        failed_transition_maintenance=logic.failed_transition_maintenance,
+        triggers=[trigger_state(trigger) for trigger in _triggers(logic)],
+    )
+
+
+def trigger_state(trigger: WaitFor):
+    return dict(condition=trigger.condition.__name__,
+                keys=list(trigger.keys),
+                action=trigger.action.__name__,
+                args=list(trigger.args[1:]),
+                deadline=trigger.deadline,
+                on_timeout=None if trigger.on_timeout is None else trigger.on_timeout.__name__,
+                timeout_args=list(trigger.timeout_args),
+                not_before=trigger.not_before,
+                failures=trigger.failures)
+
+
+def _triggers(logic):
+    triggers = list(logic.triggers)
+    if logic.running_trigger is not None:
+        triggers.append(logic.running_trigger)
+    return triggers
+
+
+def restore(logic, state: dict):
+    logic.pipeline = state['pipeline']
+    logic.retry_state = state['retry_state']
+    logic.transition_failed = state['transition_failed']
+    logic.failed_transition_maintenance = state['failed_transition_maintenance']
+    logic.clear_triggers()
+    for trigger in state['triggers']:
+        if trigger['action'] not in ACTIONS:
+            logger.error("Not restoring unknown trigger %s", trigger['action'])
+            continue
+        logic.triggers.add(restore_trigger(logic, trigger))
+
+
+def restore_trigger(logic, trigger: dict):
+    """The WaitFor recorded by trigger_state, bound to logic again."""
+    work = WaitFor().watching(*trigger['keys']).wait_until(getattr(logic, trigger['condition'])).then_trigger(
+        ACTIONS[trigger['action']], logic, *trigger['args'])
+    if trigger['deadline'] is not None:
+        work.expire_at(datetime.datetime.fromisoformat(str(trigger['deadline'])),
+                       ACTIONS.get(trigger['on_timeout']), *trigger['timeout_args'])
+    if trigger.get('not_before') is not None:
+        work.not_before = datetime.datetime.fromisoformat(str(trigger['not_before']))
+    work.failures = trigger.get('failures', 0)
+    return work
+
+
+def _default(value):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    raise TypeError("Can not checkpoint %r" % value)
+
+
+def encode(state: dict):
+    return json.dumps(state, default=_default, sort_keys=True)
+
+
+def decode(text: str):
+    state = json.loads(text)
+    for section, key in DATETIMES:
+        if state.get(section) is not None and state[section].get(key) is not None:
+            state[section][key] = datetime.datetime.fromisoformat(state[section][key])
+    return state
+
+
+class Journal:
+    """The checkpoint file; writes are atomic and skipped when nothing changed."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.last = None
+        self._lock = threading.Lock()
+
+    def save(self, state: dict):
+        if not self.path:
+            return
+        text = encode(state)
+        with self._lock:
+            if text == self.last:
+                return
+            try:
+                with open(self.path + '.tmp', 'w') as f:
+                    f.write(text)
+                os.replace(self.path + '.tmp', self.path)
+                self.last = text
+                WRITES.labels(result='ok').inc()
+            except OSError as ex:
+                logger.warning("Unable to checkpoint Logic state - %s", ex)
+                WRITES.labels(result='failed').inc()
+
+    def load(self):
+        """The last checkpointed state, or None if there is none to use."""
+        if not self.path:
+            return None
+        try:
+            with open(self.path) as f:
+                text = f.read()
+            state = decode(text)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as ex:
+            logger.error("Ignoring unreadable Logic checkpoint %s - %s", self.path, ex)
+            return None
+        with self._lock:
+            self.last = text
+        return state
@@ -3,11 +3,18 @@ import asyncio
 import logging
 import time
 import requests
-from prometheus_client import Counter
+from prometheus_client import Counter, Gauge, Histogram
+from clients.dns_query import resolve_a, default_nameservers
+from config import config
+from event_bus import stamped
 
 logger = logging.getLogger(__name__)
 
 COUNTER = Counter('switchover_dns', 'Switchover DNS results', ['ip'])
+PROBE_LATENCY = Histogram('switchover_dns_probe_seconds', 'Switchover DNS probe latency',
+                          ['resolver'])
+ANSWER_AGE = Gauge('switchover_dns_answer_age_seconds',
+                   'Seconds since the last successful DNS answer')
 
 
 def dns_watch(mechanism, domain_name: str, logic_q):
@@ -18,32 +25,166 @@ def dns_watch(mechanism, domain_name: str, logic_q):
     new_loop.run_forever()
 
 
+async def probe(resolver: dict, domain_name: str, timeout: float):
+    """Returns dict(addresses=[...], ttl=N); ttl is None when the mechanism
+    does not expose it."""
+    loop = asyncio.get_running_loop()
+    if resolver['mechanism'] == 'service':
+        r = await loop.run_in_executor(
+            None, lambda: requests.get(resolver['service_url'], timeout=timeout))
+        lookup = r.json()
+        if len(lookup) == 0:
+            raise socket.gaierror('Simulated no DNS response')
+        return dict(addresses=[entry[4][0] for entry in lookup], ttl=None)
+    if resolver['mechanism'] == 'udp':
+        answer = await resolve_udp(domain_name, resolver['nameservers'], timeout)
+        if len(answer['addresses']) == 0:
+            raise socket.gaierror('No A records')
+        return answer
+    lookup = await asyncio.wait_for(
+        loop.getaddrinfo(domain_name, 0, family=socket.AF_INET), timeout)
+    return dict(addresses=[entry[4][0] for entry in lookup], ttl=None)
+
+
+async def resolve_udp(domain_name: str, nameservers, timeout: float):
+    """Asks each nameserver in turn, as the system resolver does, until one
+    answers; each is sent the query DNS_PROBE_ATTEMPTS times.  A name that
+    does not resolve is an answer too, so the next nameserver is not asked."""
+    attempts = config.get('dns_probe_attempts')
+    for i, nameserver in enumerate(nameservers):
+        try:
+            return await resolve_a(domain_name, nameserver, timeout, attempts=attempts)
+        except socket.gaierror:
+            raise
+        except (asyncio.TimeoutError, OSError) as ex:
+            if i == len(nameservers) - 1:
+                raise
+            logger.warning("No DNS response from %s, trying %s - %r", nameserver, nameservers[i + 1], ex)
+
+
+async def probe_result(resolver: dict, domain_name: str, timeout: float):
+    """Returns dict(result=..., ttl=N) where result is the first IP, 'error'
+    when the name did not resolve, or None when the probe was inconclusive."""
+    started = time.monotonic()
+    try:
+        answer = await probe(resolver, domain_name, timeout)
+        logger.debug("DNS [%s] %s", resolver['name'], answer)
+        return dict(result=answer['addresses'][0], ttl=answer['ttl'])
+    except (socket.gaierror, asyncio.TimeoutError):
+        logger.error("No DNS response from %s" % resolver['name'])
+        return dict(result='error', ttl=None)
+    except Exception as ex:
+        logger.error("DNS probe via %s failed - %s" % (resolver['name'], ex))
+        return dict(result=None, ttl=None)
+    finally:
+        PROBE_LATENCY.labels(resolver=resolver['name']).observe(
+            time.monotonic() - started)
+
+
+def build_resolvers(dns_service_url: str):
+    nameservers = [ns.strip() for ns in (config.get('dns_nameservers') or '').split(',')
+                   if ns.strip() != '']
+    if len(nameservers) > 0:
+        resolvers = [dict(name=ns, mechanism='udp', nameservers=[ns]) for ns in nameservers]
+        if dns_service_url != '':
+            resolvers.append(dict(name='service', mechanism='service',
+                                  service_url=dns_service_url))
+        return resolvers
+
+    if dns_service_url != '':
+        return [dict(name='service', mechanism='service', service_url=dns_service_url)]
+    nameservers = [config.get('dns_nameserver')] if config.get('dns_nameserver') else default_nameservers()
+    if len(nameservers) > 0:
+        return [dict(name='udp', mechanism='udp', nameservers=nameservers)]
+    return [dict(name='getaddrinfo', mechanism='getaddrinfo')]
+
+
+def dns_quorum(resolvers) -> int:
+    """DNS_QUORUM, or a majority of the resolvers when it is not set.  A
+    quorum larger than the number of resolvers could never be met, and one
+    that is not a majority lets two answers tie."""
+    quorum = config.get('dns_quorum') or (len(resolvers) // 2 + 1)
+    if quorum > len(resolvers) or quorum <= len(resolvers) / 2:
+        raise ValueError("DNS_QUORUM %d must be a majority of the %d resolvers %s" %
+                         (quorum, len(resolvers), [r['name'] for r in resolvers]))
+    return quorum
+
+
+def quorum_result(results, quorum: int):
+    """Returns the result reported by at least `quorum` resolvers, or None if
+    no result has enough votes.  Inconclusive (None) results never vote."""
+    votes = {}
+    for result in results:
+        if result is not None:
+            votes[result] = votes.get(result, 0) + 1
+    best = None
+    for result, count in votes.items():
+        if count >= quorum and (best is None or count > votes[best]):
+            best = result
+    return best
+
+
+def confirm_error(result, errors: int):
+    """Returns (result, errors), where errors counts consecutive 'error'
+    results.  An 'error' is only reported once DNS_ERROR_PROBES probes in a
+    row have failed; until then it is inconclusive (None), so one lost
+    answer does not look like the site disappearing from DNS."""
+    if result != 'error':
+        return result, 0 if result is not None else errors
+    errors += 1
+    if errors < config.get('dns_error_probes'):
+        logger.warning("DNS probe failed (%d of %d before reporting)", errors, config.get('dns_error_probes'))
+        return None, errors
+    return result, errors
+
+
+def next_probe_delay(ttl):
+    """Re-probe when the record expires, bounded so a long TTL never makes us
+    slower than the max interval and a zero TTL does not spin."""
+    min_interval = config.get('dns_probe_min_interval_seconds')
+    max_interval = config.get('dns_probe_max_interval_seconds')
+    if ttl is None:
+        return max_interval
+    return min(max(ttl, min_interval), max_interval)
+
+
 async def dns_lookup(dns_service_url: str, domain_name: str, logic_q):
     logger.info("DNS Inspection %s" % domain_name)
+    resolvers = build_resolvers(dns_service_url)
+    quorum = dns_quorum(resolvers)
+    timeout = config.get('dns_probe_timeout_seconds')
+    logger.info("DNS resolvers %s (quorum %d)" %
+                ([r['name'] for r in resolvers], quorum))
+
     last_result = "unknown"
+    last_answer = time.monotonic()
+    errors = 0
     while True:
-        result = 'none'
-        try:
-            if dns_service_url == '':
-              lookup = socket.getaddrinfo(domain_name, 0)
-            else:
-              lookup = requests.get(dns_service_url).json()
-              if len(lookup) == 0:
-                raise socket.gaierror('Simulated no DNS response')
-              
-            logger.debug("DNS %s", lookup)
-            if len(lookup) > 0:
-                ip = lookup[0][4][0]
-                logger.debug("IP => %s" % ip)
-                result = ip
+        outcomes = await asyncio.gather(
+            *[probe_result(r, domain_name, timeout) for r in resolvers])
+        answers = dict((r['name'], o['result']) for r, o in zip(resolvers, outcomes))
 
-        except socket.gaierror:
-            logger.error("No DNS response")
-            result = 'error'
-
-        COUNTER.labels(ip=result).inc()
-        if last_result != result:
-            logic_q.put(
-                {'event': 'dns', 'result': result, 'message': 'IP CHANGE %s' % result})
-            last_result = result
-        time.sleep(5)
+        result, errors = confirm_error(quorum_result(answers.values(), quorum), errors)
+        if result is None:
+            logger.warning("DNS answers have no quorum %s" % answers)
+        elif result != 'error':
+            logger.debug("IP => %s" % result)
+            last_answer = time.monotonic()
+
+        ANSWER_AGE.set(time.monotonic() - last_answer)
+
+        if result is not None:
+            COUNTER.labels(ip=result).inc()
+            if last_result != result:
+                logic_q.put(stamped(
+                    {'event': 'dns', 'result': result, 'answers': answers,
+                     'message': 'IP CHANGE %s' % result}))
+                last_result = result
+
+        if result is None or result == 'error':
+            # Failed probes are retried quickly so recovery is noticed early
+            await asyncio.sleep(config.get('dns_probe_min_interval_seconds'))
+        else:
+            ttls = [o['ttl'] for o in outcomes
+                    if o['result'] == result and o['ttl'] is not None]
+            await asyncio.sleep(next_probe_delay(min(ttls) if len(ttls) > 0 else None))
@@ -0,0 +1,128 @@
+import asyncio
+import random
+import socket
+import struct
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Minimal DNS-over-UDP client (RFC 1035) so that lookups can be awaited on the
+# event loop and the record TTL is available for scheduling the next probe.
+
+TYPE_A = 1
+TYPE_CNAME = 5
+CLASS_IN = 1
+
+RCODE_NXDOMAIN = 3
+
+
+def default_nameservers(resolv_conf: str = '/etc/resolv.conf'):
+    """The nameservers in resolv.conf, in the order the system resolver
+    tries them."""
+    nameservers = []
+    try:
+        with open(resolv_conf) as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0] == 'nameserver':
+                    nameservers.append(parts[1])
+    except OSError:
+        pass
+    return nameservers
+
+
+def build_query(query_id: int, domain_name: str) -> bytes:
+    header = struct.pack('!HHHHHH', query_id, 0x0100, 1, 0, 0, 0)
+    qname = b''
+    for label in domain_name.rstrip('.').split('.'):
+        qname += struct.pack('!B', len(label)) + label.encode('ascii')
+    return header + qname + b'\x00' + struct.pack('!HH', TYPE_A, CLASS_IN)
+
+
+def _skip_name(data: bytes, offset: int) -> int:
+    while True:
+        length = data[offset]
+        if length & 0xC0 == 0xC0:
+            return offset + 2
+        if length == 0:
+            return offset + 1
+        offset += length + 1
+
+
+def parse_response(query_id: int, data: bytes):
+    """Returns dict(addresses=[...], ttl=N) for the A records in the answer
+    section.  The ttl is the lowest TTL along the CNAME chain."""
+    (resp_id, flags, qdcount, ancount, _, _) = struct.unpack('!HHHHHH', data[:12])
+    if resp_id != query_id:
+        raise ValueError('DNS response id mismatch')
+
+    rcode = flags & 0x000F
+    if rcode == RCODE_NXDOMAIN:
+        raise socket.gaierror('NXDOMAIN')
+    if rcode != 0:
+        raise socket.gaierror('DNS server failure (rcode %d)' % rcode)
+
+    offset = 12
+    for _ in range(qdcount):
+        offset = _skip_name(data, offset) + 4
+
+    addresses = []
+    ttl = None
+    for _ in range(ancount):
+        offset = _skip_name(data, offset)
+        (rtype, rclass, rttl, rdlength) = struct.unpack('!HHIH', data[offset:offset + 10])
+        offset += 10
+        rdata = data[offset:offset + rdlength]
+        offset += rdlength
+        if rclass != CLASS_IN or rtype not in (TYPE_A, TYPE_CNAME):
+            continue
+        ttl = rttl if ttl is None else min(ttl, rttl)
+        if rtype == TYPE_A:
+            addresses.append(socket.inet_ntoa(rdata))
+
+    return dict(addresses=addresses, ttl=ttl)
+
+
+class _QueryProtocol(asyncio.DatagramProtocol):
+    def __init__(self, query_id: int, future):
+        self.query_id = query_id
+        self.future = future
+
+    def datagram_received(self, data, addr):
+        if self.future.done():
+            return
+        try:
+            self.future.set_result(parse_response(self.query_id, data))
+        except ValueError:
+            # Stray or late packet for another query; keep waiting.
+            logger.debug("Ignoring DNS response from %s", addr)
+        except Exception as ex:
+            self.future.set_exception(ex)
+
+    def error_received(self, exc):
+        if not self.future.done():
+            self.future.set_exception(exc)
+
+
+async def resolve_a(domain_name: str, nameserver: str, timeout: float, port: int = 53, attempts: int = 1):
+    """Sends the query up to attempts times, waiting timeout for an answer
+    after each; a late answer to an earlier send is still accepted."""
+    loop = asyncio.get_running_loop()
+    query_id = random.randint(0, 0xFFFF)
+    query = build_query(query_id, domain_name)
+    future = loop.create_future()
+    transport, _ = await loop.create_datagram_endpoint(
+        lambda: _QueryProtocol(query_id, future),
+        remote_addr=(nameserver, port))
+    try:
+        for attempt in range(1, attempts + 1):
+            transport.sendto(query)
+            try:
+                return await asyncio.wait_for(asyncio.shield(future), timeout)
+            except asyncio.TimeoutError:
+                if attempt == attempts:
+                    raise
+                logger.debug("No DNS response from %s, retransmitting", nameserver)
+    finally:
+        future.cancel()
+        transport.close()
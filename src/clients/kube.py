@@ -9,6 +9,11 @@ import sys
 import time
 import datetime
 from config import config as switchover_config
+from clients.kube_client import get_api
+from clients.kube_cache import informer, cached
+from clients.kube_watcher import async_resumable_stream
+from clients.rollout import RolloutGoal, scaled_to, wait_for_rollout
+from event_bus import stamped
 
 logger = logging.getLogger(__name__)
 
@@ -25,53 +30,41 @@ def kube_watch(namespace: str, kind: str, label_selector: str, py_env: str, logi
 
 async def watch_stream(namespace: str, kind: str, label_selector: str, py_env: str, logic_q):
 
-    # Configs can be set in Configuration class directly or using helper utility
     v1 = init_client(py_env)
-    v1_app = init_apps_client(py_env)
 
-    w = watch.Watch()
-
-    last_result = "unknown"
-
-    while True:
-        logger.info("Watching for %s matching %s..." % (kind, label_selector))
-        try:
-            if kind == 'configmap':
-                list = v1.list_namespaced_config_map
-            if kind == 'statefulset':
-                list = v1.list_namespaced_pod
-            for event in w.stream(list, namespace=namespace, label_selector=label_selector, watch=True, timeout_seconds=600):
-                logger.debug("Event: %s %s %s" % (
-                    event['type'], event['object'].kind, event['object'].metadata.name))
-                if kind == 'configmap':
-                    config_as_str = json.dumps(event['object'].data, indent=4)
-                    logger.info(config_as_str)
-                    if last_result != config_as_str and event['type'] != 'DELETED':
-                        logic_q.put(
-                            {"event": "switchover_state", "data": event['object'].data})
-                        last_result = config_as_str
-
-        except ReadTimeoutError:
-            logger.warning("There was a timeout error accessing the Kube API. "
-                           "Retrying request.", exc_info=True)
-            time.sleep(1)
-        except Exception:
-            logger.error('Unknown error in KubernetesJobWatcher. Failing')
-            traceback.print_exc(file=sys.stdout)
-            time.sleep(5)
-        else:
-            logger.debug('Watch died gracefully, starting back up')
+    last_result = None
+
+    logger.info("Watching for %s matching %s..." % (kind, label_selector))
+    if kind == 'configmap':
+        list = v1.list_namespaced_config_map
+    if kind == 'statefulset':
+        list = v1.list_namespaced_pod
+    async for event in async_resumable_stream(kind, list, namespace=namespace, label_selector=label_selector):
+        if event['type'] == 'SYNCED':
+            continue
+        logger.debug("Event: %s %s %s" % (
+            event['type'], event['object'].kind, event['object'].metadata.name))
+        if kind == 'configmap':
+            logger.info(event['object'].data)
+            if last_result != event['object'].data and event['type'] != 'DELETED':
+                logic_q.put(stamped(
+                    {"event": "switchover_state", "data": event['object'].data}))
+                last_result = event['object'].data
 
 
 def get_configmap(namespace: str, label_selector: str, py_env: str):
-    v1 = init_client(py_env)
     logger.debug("[get_configmap] %s %s", namespace, label_selector)
-    configmaps = v1.list_namespaced_config_map(
-        namespace=namespace, label_selector=label_selector)
-    if len(configmaps.items) == 0:
+    cache = informer('configmap', namespace, py_env)
+    if cache is not None:
+        items = cache.list(label_selector)
+    else:
+        v1 = init_client(py_env)
+        items = v1.list_namespaced_config_map(
+            namespace=namespace, label_selector=label_selector).items
+    if len(items) == 0:
       raise Exception("Configmap not found")
       
-    return configmaps.items[0]
+    return items[0]
 
 
 def update_configmap(namespace: str, name: str, py_env: str, configmap_spec):
@@ -85,6 +78,10 @@ def update_configmap(namespace: str, name: str, py_env: str, configmap_spec):
             name=name,
             namespace=namespace,
             body=configmap_spec)
+        # Read-your-writes for the cache; the watch event follows shortly
+        cache = cached('configmap', namespace)
+        if cache is not None:
+            cache.write(api_response)
     except ApiException as e:
         logger.error(
             "Exception when calling AppsV1Api->patch_namespaced_config_map: %s\n" % e)
@@ -92,11 +89,16 @@ def update_configmap(namespace: str, name: str, py_env: str, configmap_spec):
 
 
 def get_service(namespace: str, label_selector: str, py_env: str):
-    v1 = init_client(py_env)
-
-    services = v1.list_namespaced_service(
-        namespace=namespace, label_selector=label_selector)
-    return services.items[0]
+    cache = informer('service', namespace, py_env)
+    if cache is not None:
+        items = cache.list(label_selector)
+    else:
+        v1 = init_client(py_env)
+        items = v1.list_namespaced_service(
+            namespace=namespace, label_selector=label_selector).items
+    if len(items) == 0:
+        raise Exception("Service not found matching %s" % label_selector)
+    return items[0]
 
 
 def update_service(namespace: str, name: str, py_env: str, service_spec):
@@ -106,10 +108,13 @@ def update_service(namespace: str, name: str, py_env: str, service_spec):
     logger.debug("Updating service %s" % name)
 
     try:
-        v1.patch_namespaced_service(
+        api_response = v1.patch_namespaced_service(
             name=name,
             namespace=namespace,
             body=service_spec)
+        cache = cached('service', namespace)
+        if cache is not None:
+            cache.write(api_response)
     except ApiException as e:
         logger.error(
             "Exception when calling AppsV1Api->patch_namespaced_service: %s\n" % e)
@@ -117,8 +122,19 @@ def update_service(namespace: str, name: str, py_env: str, service_spec):
 
 
 def scale_and_wait(namespace: str, kind: str, name: str, label_selector: str, replicas: int, py_env: str):
-    scale(namespace, kind, name, replicas, py_env)
-    wait_for_scale(namespace, kind, label_selector, replicas, py_env)
+    scale_many_and_wait(namespace, [RolloutGoal(kind, name, label_selector, replicas)], py_env)
+
+
+def scale_many_and_wait(namespace: str, goals, py_env: str, timeout: float = None):
+    """Scales every goal's workload, then waits for all of them together."""
+    for goal in goals:
+        scale(namespace, goal.kind, goal.name, goal.replicas, py_env)
+    progress = wait_for_rollout(namespace, goals,
+                                timeout or switchover_config.get('rollout_timeout_seconds'), py_env)
+    if progress is None:
+        for goal in goals:
+            watch_for_scale(namespace, goal.kind, goal.label_selector, goal.replicas, py_env)
+    return progress
 
 
 def scale(namespace: str, kind: str, name: str, replicas: int, py_env: str):
@@ -142,6 +158,25 @@ def scale(namespace: str, kind: str, name: str, replicas: int, py_env: str):
 
 
 def wait_for_scale(namespace: str, kind: str, label_selector: str, replicas: int, py_env: str):
+    logger.debug("wait_for_scale %s : %s" % (kind, label_selector))
+
+    cache = informer(kind, namespace, py_env)
+    if cache is None:
+        return watch_for_scale(namespace, kind, label_selector, replicas, py_env)
+
+    def done(inf):
+        return any(scaled_to(obj, replicas) for obj in inf.list(label_selector))
+
+    if cache.wait_until(done, 120):
+        logger.debug("wait done - %s scaled to %d" %
+                     (label_selector, replicas))
+        return True
+
+    raise Exception(
+        "Giving up waiting for stateful set scale to %d" % replicas)
+
+
+def watch_for_scale(namespace: str, kind: str, label_selector: str, replicas: int, py_env: str):
     v1 = init_apps_client(py_env)
 
     w = watch.Watch()
@@ -150,22 +185,11 @@ def wait_for_scale(namespace: str, kind: str, label_selector: str, replicas: int
         api_call = v1.list_namespaced_deployment
     else:
         api_call = v1.list_namespaced_stateful_set
-    logger.debug("wait_for_scale %s : %s" % (kind, label_selector))
 
     for event in w.stream(api_call, namespace=namespace, label_selector=label_selector, watch=True, timeout_seconds=120):
         logger.debug("Event: %s %s %s %s" % (
             event['type'], event['object'].kind, event['object'].metadata.name, event['object'].status.ready_replicas))
-        if event['object'].status.replicas == 0 and replicas == 0:
-            w.stop()
-            logger.debug("wait done - %s scaled to %d" %
-                         (label_selector, replicas))
-            return True
-        if event['object'].status.ready_replicas is None and replicas == 0:
-            w.stop()
-            logger.debug("wait done - %s scaled to NONE" % (label_selector))
-            return True
-
-        if event['object'].status.ready_replicas == replicas:
+        if scaled_to(event['object'], replicas):
             w.stop()
             logger.debug("wait done - %s scaled to %d" %
                          (label_selector, replicas))
@@ -252,26 +276,14 @@ def patch_secret(namespace: str, name: str, py_env: str, secret_data):
 
 
 def init_client(py_env: str):
-    if py_env == 'production':
-        config.load_incluster_config()
-    else:
-        config.load_kube_config()
-    return client.CoreV1Api()
+    return get_api('core', py_env)
 
 
 def init_apps_client(py_env: str):
-    if py_env == 'production':
-        config.load_incluster_config()
-    else:
-        config.load_kube_config()
-    return client.AppsV1Api()
+    return get_api('apps', py_env)
 
 def init_policy_client(py_env: str):
-    if py_env == 'production':
-        config.load_incluster_config()
-    else:
-        config.load_kube_config()
-    return client.PolicyV1Api()
+    return get_api('policy', py_env)
 
 def update_pdb(namespace, name, min_available, py_env):
     logger.debug(f"[update_pdb] Updating PDB {name} in namespace {namespace} with minAvailable: {min_available}")
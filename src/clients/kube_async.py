@@ -0,0 +1,66 @@
+import asyncio
+import functools
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from clients import kube
+from config import config as switchover_config
+
+logger = logging.getLogger(__name__)
+
+# Awaitable Kubernetes access.  The kubernetes client is synchronous, so calls
+# run on a bounded pool of I/O threads, letting independent mutations overlap
+# (watches are bridged onto the event loop by
+# kube_watcher.async_resumable_stream).  Transition steps await these; plain
+# code runs them with run_concurrently.
+#
+#   await kube_async.scale(ns, 'deployment', name, 2, py_env)
+#   run_concurrently(kube_async.delete_pvc(ns, 'storage-volume-patroni-spilo-1', py_env),
+#                    kube_async.delete_pvc(ns, 'storage-volume-patroni-spilo-2', py_env))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _pool():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=switchover_config.get('kube_async_threads'),
+                thread_name_prefix='kube-io')
+        return _executor
+
+
+async def run(fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_pool(), functools.partial(fn, *args, **kwargs))
+
+
+def _awaitable(fn):
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        return await run(fn, *args, **kwargs)
+    return wrapper
+
+
+update_configmap = _awaitable(kube.update_configmap)
+scale = _awaitable(kube.scale)
+update_pdb = _awaitable(kube.update_pdb)
+patch_secret = _awaitable(kube.patch_secret)
+delete_pvc = _awaitable(kube.delete_pvc)
+delete_configmap = _awaitable(kube.delete_configmap)
+
+
+def run_concurrently(*coros):
+    """Runs independent coroutines together from synchronous code.  On a
+    thread whose event loop is already running (asyncio runtime mode, a
+    synchronous plan step) they get a loop of their own on another thread."""
+    async def gather():
+        return await asyncio.gather(*coros)
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(gather())
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix='kube-gather') as pool:
+        return pool.submit(asyncio.run, gather()).result()
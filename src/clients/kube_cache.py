@@ -0,0 +1,228 @@
+import logging
+import threading
+import time
+from prometheus_client import Counter, Gauge
+from clients.kube_client import get_api
+from clients.kube_watcher import resumable_stream
+from config import config as switchover_config
+
+logger = logging.getLogger(__name__)
+
+# Informer-style list+watch caches.  One background thread per (kind,
+# namespace) keeps an in-memory copy of every object in the namespace, so
+# reads on the failover hot path are memory lookups and the API server sees
+# one long-lived watch per resource type instead of bursts of LISTs.
+
+LIST_CALLS = dict(
+    configmap=('core', 'list_namespaced_config_map'),
+    service=('core', 'list_namespaced_service'),
+    statefulset=('apps', 'list_namespaced_stateful_set'),
+    deployment=('apps', 'list_namespaced_deployment'),
+    pod=('core', 'list_namespaced_pod'),
+)
+
+READS = Counter('switchover_kube_cache_reads', 'Switchover Kube cache reads',
+                ['kind', 'result'])
+STALENESS = Gauge('switchover_kube_cache_age_seconds',
+                  'Seconds since the Kube cache last heard from the API server',
+                  ['kind', 'namespace'])
+SYNCED = Gauge('switchover_kube_cache_synced', 'Switchover Kube cache has completed its initial list',
+               ['kind', 'namespace'])
+
+_lock = threading.Lock()
+_informers = {}
+
+
+def parse_selector(label_selector: str):
+    """Parses an equality-based label selector into (key, op, value) terms."""
+    terms = []
+    for term in (label_selector or '').split(','):
+        term = term.strip()
+        if term == '':
+            continue
+        if '!=' in term:
+            key, value = term.split('!=', 1)
+            terms.append((key.strip(), '!=', value.strip()))
+        elif '=' in term:
+            key, value = term.replace('==', '=').split('=', 1)
+            terms.append((key.strip(), '=', value.strip()))
+        else:
+            terms.append((term, 'exists', None))
+    return tuple(terms)
+
+
+def matches(labels, terms):
+    labels = labels or {}
+    for key, op, value in terms:
+        if op == '=' and labels.get(key) != value:
+            return False
+        if op == '!=' and labels.get(key) == value:
+            return False
+        if op == 'exists' and key not in labels:
+            return False
+    return True
+
+
+class Informer:
+    def __init__(self, kind: str, namespace: str, py_env: str):
+        self.kind = kind
+        self.namespace = namespace
+        self.py_env = py_env
+        self.items = {}
+        self.index = {}
+        self.written = {}
+        self.synced = threading.Event()
+        self.changed = threading.Condition()
+        self.last_heard = None
+        self.listeners = []
+        self.thread = threading.Thread(target=self._run, daemon=True,
+                                       name="informer-%s-%s" % (kind, namespace))
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def _run(self):
+        api, call = LIST_CALLS[self.kind]
+        list_call = getattr(get_api(api, self.py_env), call)
+        for event in resumable_stream("%s/%s" % (self.kind, self.namespace),
+                                      list_call, namespace=self.namespace):
+            if event['type'] == 'SYNCED':
+                self._mark_synced()
+            elif event['type'] == 'DELETED':
+                self._delete(event['object'])
+            else:
+                self.apply(event['object'])
+            self._notify(event)
+
+    def add_listener(self, fn):
+        """fn(event) is called from the informer thread after each change has
+        been applied to the store."""
+        self.listeners.append(fn)
+
+    def _notify(self, event):
+        for fn in list(self.listeners):
+            try:
+                fn(event)
+            except Exception:
+                logger.exception("[%s/%s] listener failed", self.kind, self.namespace)
+
+    def _heard(self):
+        self.last_heard = time.monotonic()
+        STALENESS.labels(kind=self.kind, namespace=self.namespace).set(0)
+
+    def _mark_synced(self):
+        with self.changed:
+            # A fresh list is newer than anything we wrote before it
+            self.written.clear()
+            self._heard()
+            self.synced.set()
+            SYNCED.labels(kind=self.kind, namespace=self.namespace).set(1)
+            self.changed.notify_all()
+
+    def _reindex(self, terms):
+        self.index[terms] = set(name for name, obj in self.items.items()
+                                if matches(obj.metadata.labels, terms))
+
+    def _store(self, obj):
+        name = obj.metadata.name
+        self.items[name] = obj
+        for terms, names in self.index.items():
+            if matches(obj.metadata.labels, terms):
+                names.add(name)
+            else:
+                names.discard(name)
+
+    def apply(self, obj):
+        """Applies an object from the watch.  Watch events arrive in order, so
+        each replaces the stored object - except that one of our own writes is
+        kept until the watch catches up with it (resourceVersions are opaque,
+        so only equality is meaningful)."""
+        with self.changed:
+            name = obj.metadata.name
+            written = self.written.get(name)
+            if written is None or written == obj.metadata.resource_version:
+                self.written.pop(name, None)
+                self._store(obj)
+            self._heard()
+            self.changed.notify_all()
+
+    def write(self, obj):
+        """Read-your-writes: stores the API server's response to our own
+        patch, ahead of the watch event for it."""
+        with self.changed:
+            self.written[obj.metadata.name] = obj.metadata.resource_version
+            self._store(obj)
+            self.changed.notify_all()
+
+    def _delete(self, obj):
+        with self.changed:
+            name = obj.metadata.name
+            self.items.pop(name, None)
+            self.written.pop(name, None)
+            for names in self.index.values():
+                names.discard(name)
+            self._heard()
+            self.changed.notify_all()
+
+    def age(self):
+        if self.last_heard is None:
+            return None
+        age = time.monotonic() - self.last_heard
+        STALENESS.labels(kind=self.kind, namespace=self.namespace).set(age)
+        return age
+
+    def get(self, name: str):
+        with self.changed:
+            return self.items.get(name)
+
+    def list(self, label_selector: str):
+        terms = parse_selector(label_selector)
+        with self.changed:
+            if terms not in self.index:
+                self._reindex(terms)
+            return [self.items[name] for name in sorted(self.index[terms])]
+
+    def wait_until(self, predicate, timeout: float):
+        """Blocks until predicate(informer) is truthy or the timeout expires;
+        returns the last predicate result."""
+        deadline = time.monotonic() + timeout
+        with self.changed:
+            while True:
+                result = predicate(self)
+                remaining = deadline - time.monotonic()
+                if result or remaining <= 0:
+                    return result
+                self.changed.wait(remaining)
+
+
+def informer(kind: str, namespace: str, py_env: str, sync_timeout: float = None):
+    """Returns the synced informer for kind/namespace, starting it on first
+    use, or None if caching is disabled or the initial list has not finished
+    within the sync timeout (callers then fall back to the API)."""
+    if not switchover_config.get('kube_cache_enabled'):
+        return None
+    key = (kind, namespace)
+    with _lock:
+        inf = _informers.get(key)
+        if inf is None:
+            inf = Informer(kind, namespace, py_env).start()
+            _informers[key] = inf
+    if sync_timeout is None:
+        sync_timeout = switchover_config.get('kube_cache_sync_timeout_seconds')
+    if not inf.synced.wait(sync_timeout):
+        logger.warning("[%s/%s] cache not synced - reading from API", kind, namespace)
+        READS.labels(kind=kind, result='unsynced').inc()
+        return None
+    inf.age()
+    READS.labels(kind=kind, result='hit').inc()
+    return inf
+
+
+def cached(kind: str, namespace: str):
+    """Returns an already running, synced informer without starting one."""
+    with _lock:
+        inf = _informers.get((kind, namespace))
+    if inf is None or not inf.synced.is_set():
+        return None
+    return inf
@@ -0,0 +1,101 @@
+import functools
+import logging
+import threading
+import time
+from kubernetes import client, config
+from kubernetes.client.rest import ApiException
+from prometheus_client import Counter, Histogram
+from config import config as switchover_config
+
+logger = logging.getLogger(__name__)
+
+# Process-wide Kubernetes API clients.  The kube config is loaded once and
+# each API group keeps a single pooled ApiClient, so back-to-back calls during
+# a transition reuse TLS connections instead of re-reading config files and
+# handshaking every time.
+
+API_CLASSES = dict(
+    core=client.CoreV1Api,
+    apps=client.AppsV1Api,
+    policy=client.PolicyV1Api,
+    custom=client.CustomObjectsApi,
+)
+
+POOL = Counter('switchover_kube_client_pool', 'Switchover Kube API client cache lookups',
+               ['api', 'result'])
+CALL_LATENCY = Histogram('switchover_kube_call_seconds', 'Switchover Kube API call latency',
+                         ['call'])
+
+_lock = threading.Lock()
+_cache = dict(py_env=None, loaded_at=None, configuration=None, apis={})
+
+
+class _TimedApi:
+    """Wraps a generated *Api class so every call is timed.  functools.wraps
+    keeps the signature visible to kubernetes.watch, which inspects it."""
+
+    def __init__(self, api):
+        self._api = api
+
+    def __getattr__(self, name):
+        attr = getattr(self._api, name)
+        if name.startswith('_') or not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        def timed(*args, **kwargs):
+            started = time.monotonic()
+            try:
+                return attr(*args, **kwargs)
+            except ApiException as e:
+                if e.status == 401:
+                    logger.warning("Kube API rejected credentials - reloading config")
+                    invalidate()
+                raise
+            finally:
+                CALL_LATENCY.labels(call=name).observe(time.monotonic() - started)
+        return timed
+
+
+def _load_configuration(py_env: str):
+    configuration = client.Configuration()
+    if py_env == 'production':
+        # Installs a refresh hook that re-reads the projected service
+        # account token when it is about to expire.
+        config.load_incluster_config(client_configuration=configuration)
+    else:
+        config.load_kube_config(client_configuration=configuration)
+    configuration.connection_pool_maxsize = switchover_config.get(
+        'kube_client_pool_maxsize')
+    return configuration
+
+
+def _is_stale(py_env: str):
+    if _cache['configuration'] is None or _cache['py_env'] != py_env:
+        return True
+    max_age = switchover_config.get('kube_client_refresh_seconds')
+    return time.monotonic() - _cache['loaded_at'] >= max_age
+
+
+def get_api(api: str, py_env: str):
+    with _lock:
+        if _is_stale(py_env):
+            logger.debug("Loading kube config (%s)", py_env)
+            _cache.update(py_env=py_env, loaded_at=time.monotonic(),
+                          configuration=_load_configuration(py_env), apis={})
+
+        cached = _cache['apis'].get(api)
+        if cached is not None:
+            POOL.labels(api=api, result='hit').inc()
+            return cached
+
+        POOL.labels(api=api, result='miss').inc()
+        api_client = client.ApiClient(configuration=_cache['configuration'])
+        cached = _TimedApi(API_CLASSES[api](api_client))
+        _cache['apis'][api] = cached
+        return cached
+
+
+def invalidate():
+    with _lock:
+        _cache['configuration'] = None
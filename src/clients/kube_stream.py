@@ -8,6 +8,9 @@ import traceback
 import sys
 import time
 import datetime
+from clients.kube_client import get_api
+from clients.kube_watcher import async_resumable_stream
+from event_bus import stamped
 
 logger = logging.getLogger(__name__)
 
@@ -24,54 +27,29 @@ def kube_stream_watch(namespace: str, kind: str, label_selector: str, py_env: st
 
 async def watch_stream(namespace: str, kind: str, label_selector: str, py_env: str, logic_q):
 
-    # Configs can be set in Configuration class directly or using helper utility
     v1 = init_client(py_env)
-    v1_app = init_apps_client(py_env)
 
-    w = watch.Watch()
-
-    last_result = "unknown"
-
-    while True:
-        logger.info("Watching for %s matching %s..." % (kind, label_selector))
-        try:
-            if kind == 'tekton':
-              crds = client.CustomObjectsApi()
-              list = crds.list_namespaced_custom_object
-              stream = w.stream(list, 'tekton.dev', 'v1beta1', namespace, 'pipelineruns', label_selector=label_selector, watch=True, timeout_seconds=600)
-            if kind == 'configmap':
-              list = v1.list_namespaced_config_map
-              stream = w.stream(list, namespace=namespace, label_selector=label_selector, watch=True, timeout_seconds=600)
-            if kind == 'statefulset':
-              list = v1.list_namespaced_pod
-              stream = w.stream(list, namespace=namespace, label_selector=label_selector, watch=True, timeout_seconds=600)
-            for event in stream:
-                logger.debug("Event: %s %s %s" % (
-                    event['type'], event['object']['kind'], event['object']['metadata']['name']))
-                logic_q.put(
-                    {"event": "kube_stream", "kind": kind, "data": event})
-
-        except ReadTimeoutError:
-            logger.warning("There was a timeout error accessing the Kube API. "
-                           "Retrying request.", exc_info=True)
-            time.sleep(1)
-        except Exception:
-            logger.error('Unknown error in KubernetesJobWatcher. Failing')
-            traceback.print_exc(file=sys.stdout)
-            time.sleep(5)
-        else:
-            logger.debug('Watch died gracefully, starting back up')
+    logger.info("Watching for %s matching %s..." % (kind, label_selector))
+    if kind == 'tekton':
+      crds = get_api('custom', py_env)
+      list = crds.list_namespaced_custom_object
+      stream = async_resumable_stream(kind, list, 'tekton.dev', 'v1beta1', namespace, 'pipelineruns', label_selector=label_selector)
+    if kind == 'configmap':
+      list = v1.list_namespaced_config_map
+      stream = async_resumable_stream(kind, list, namespace=namespace, label_selector=label_selector)
+    if kind == 'statefulset':
+      list = v1.list_namespaced_pod
+      stream = async_resumable_stream(kind, list, namespace=namespace, label_selector=label_selector)
+    async for event in stream:
+        if event['type'] == 'SYNCED':
+            continue
+        logger.debug("Event: %s %s %s" % (
+            event['type'], event['object']['kind'], event['object']['metadata']['name']))
+        logic_q.put(stamped(
+            {"event": "kube_stream", "kind": kind, "data": event}))
 
 def init_client(py_env: str):
-    if py_env == 'production':
-        config.load_incluster_config()
-    else:
-        config.load_kube_config()
-    return client.CoreV1Api()
+    return get_api('core', py_env)
 
 def init_apps_client(py_env: str):
-    if py_env == 'production':
-        config.load_incluster_config()
-    else:
-        config.load_kube_config()
-    return client.AppsV1Api()
\ No newline at end of file
+    return get_api('apps', py_env)
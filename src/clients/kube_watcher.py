@@ -0,0 +1,168 @@
+import asyncio
+import concurrent.futures
+import logging
+import threading
+import time
+from kubernetes import watch
+from kubernetes.client.rest import ApiException
+from prometheus_client import Counter, Gauge
+from config import config as switchover_config
+
+logger = logging.getLogger(__name__)
+
+# Watches that survive timeouts and reconnects without relisting.  The last
+# seen resourceVersion (including bookmarks) is carried across reconnects, and
+# a full LIST only happens at start-up or when the server answers 410 Gone.
+# After a relist only the objects that actually changed are re-delivered.
+
+RELISTS = Counter('switchover_kube_watch_relists', 'Switchover Kube watch relists',
+                  ['watch', 'reason'])
+RECONNECTS = Counter('switchover_kube_watch_reconnects', 'Switchover Kube watch reconnects',
+                     ['watch', 'reason'])
+LAST_EVENT = Gauge('switchover_kube_watch_last_event_timestamp',
+                   'Unix time of the last event or bookmark seen by a Kube watch',
+                   ['watch'])
+
+HTTP_GONE = 410
+
+# Events an async watch buffers before its pump thread waits for the loop
+ASYNC_QUEUE_DEPTH = 100
+
+
+def _meta(obj):
+    if isinstance(obj, dict):
+        metadata = obj.get('metadata') or {}
+        return metadata.get('name'), metadata.get('resourceVersion')
+    return obj.metadata.name, obj.metadata.resource_version
+
+
+def _list_meta(listing):
+    if isinstance(listing, dict):
+        return (listing.get('metadata') or {}).get('resourceVersion'), listing.get('items', [])
+    return listing.metadata.resource_version, listing.items
+
+
+def resumable_stream(name: str, list_call, *args, watcher=None, stop=None, **kwargs):
+    """Yields watch events for list_call until stop (a threading.Event) is
+    set; set it and call watcher.stop() to end a stream blocked on a quiet
+    resource.
+
+    Besides the regular ADDED/MODIFIED/DELETED events, a {'type': 'SYNCED'}
+    event is yielded after every (re)list once the differences against the
+    previously delivered state have been emitted."""
+    w = watcher or watch.Watch()
+    stop = stop or threading.Event()
+    known = {}
+    resource_version = None
+    relist_reason = 'start'
+
+    while not stop.is_set():
+        try:
+            if relist_reason is not None:
+                RELISTS.labels(watch=name, reason=relist_reason).inc()
+                resource_version, items = _list_meta(list_call(*args, **kwargs))
+                logger.info("[%s] listed %d items at %s (%s)", name, len(items),
+                            resource_version, relist_reason)
+                listed = {}
+                for obj in items:
+                    obj_name, obj_version = _meta(obj)
+                    listed[obj_name] = obj
+                    if obj_name not in known:
+                        yield {'type': 'ADDED', 'object': obj}
+                    elif known[obj_name][0] != obj_version:
+                        yield {'type': 'MODIFIED', 'object': obj}
+                    known[obj_name] = (obj_version, obj)
+                for obj_name in [n for n in known.keys() if n not in listed]:
+                    yield {'type': 'DELETED', 'object': known.pop(obj_name)[1]}
+                yield {'type': 'SYNCED'}
+                relist_reason = None
+                LAST_EVENT.labels(watch=name).set_to_current_time()
+
+            stream_kwargs = dict(
+                kwargs,
+                allow_watch_bookmarks=True,
+                timeout_seconds=switchover_config.get('kube_watch_timeout_seconds'),
+                _request_timeout=(10, switchover_config.get('kube_watch_stall_seconds')))
+            if resource_version is not None:
+                stream_kwargs['resource_version'] = resource_version
+
+            for event in w.stream(list_call, *args, **stream_kwargs):
+                if stop.is_set():
+                    return
+                LAST_EVENT.labels(watch=name).set_to_current_time()
+                obj_name, obj_version = _meta(event['raw_object'])
+                if obj_version is not None:
+                    resource_version = obj_version
+                if event['type'] == 'BOOKMARK':
+                    continue
+                if event['type'] == 'DELETED':
+                    known.pop(obj_name, None)
+                else:
+                    known[obj_name] = (obj_version, event['object'])
+                yield event
+
+            if stop.is_set():
+                return
+            # Server-side timeout; resume from where we left off
+            RECONNECTS.labels(watch=name, reason='timeout').inc()
+
+        except ApiException as e:
+            if stop.is_set():
+                return
+            if e.status == HTTP_GONE:
+                logger.warning("[%s] resourceVersion %s expired - relisting", name, resource_version)
+                relist_reason = 'gone'
+            else:
+                logger.error("[%s] watch failed - %s", name, e)
+                RECONNECTS.labels(watch=name, reason='error').inc()
+                time.sleep(5)
+        except Exception as e:
+            if stop.is_set():
+                return
+            # Includes the read timeout that fires when nothing, not even a
+            # bookmark, has arrived within kube_watch_stall_seconds.
+            logger.warning("[%s] watch interrupted (%s) - resuming from %s",
+                           name, type(e).__name__, resource_version)
+            RECONNECTS.labels(watch=name, reason=type(e).__name__).inc()
+            time.sleep(1)
+
+
+async def async_resumable_stream(name: str, list_call, *args, **kwargs):
+    """resumable_stream as an async iterator.  The blocking stream is consumed
+    on a dedicated daemon thread and handed to the event loop through a
+    bounded queue, so several watches can share one loop.  Closing or
+    cancelling the iterator stops the watch and its thread."""
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(ASYNC_QUEUE_DEPTH)
+    stop = threading.Event()
+    w = watch.Watch()
+
+    def pump():
+        for event in resumable_stream(name, list_call, *args, watcher=w, stop=stop, **kwargs):
+            try:
+                put = asyncio.run_coroutine_threadsafe(queue.put(event), loop)
+            except RuntimeError:
+                # Event loop closed
+                return
+            while not stop.is_set():
+                try:
+                    put.result(1)
+                    break
+                except concurrent.futures.TimeoutError:
+                    continue
+                except concurrent.futures.CancelledError:
+                    # The loop shut down with the put pending
+                    return
+            if stop.is_set():
+                put.cancel()
+                return
+
+    thread = threading.Thread(target=pump, daemon=True, name="watch-%s" % name)
+    thread.start()
+    try:
+        while True:
+            yield await queue.get()
+    finally:
+        stop.set()
+        # Unblocks a read on a quiet resource so the thread can exit
+        w.stop()
@@ -1,72 +1,128 @@
 import requests
+from requests.adapters import HTTPAdapter
 from requests.structures import CaseInsensitiveDict
 import logging
 import asyncio
-import time
 import json
+import threading
 import urllib3
 from prometheus_client import Gauge
+from clients.patroni_lag import LagTracker
+from clients.patroni_kube import check_kube_source, patroni_kube_watch
+from config import config
+from event_bus import stamped
 
 logger = logging.getLogger(__name__)
 
 
+# One pooled session for the poller, so each poll reuses the open
+# connection to the Patroni REST API instead of reconnecting.
+_session = None
+
+
+def session():
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        _session.mount('http://', HTTPAdapter(pool_maxsize=2))
+        _session.mount('https://', HTTPAdapter(pool_maxsize=2))
+    return _session
+
+
 def patroni_worker(patroni_url: str, logic_q):
+    new_loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(new_loop)
+    new_loop.run_until_complete(patroni_run(patroni_url, logic_q))
+
+
+async def patroni_run(patroni_url: str, logic_q):
 
     GAUGE = Gauge('switchover_patroni', 'Switchover Patroni Status',
                   ['state']).labels(state="active")
 
-    new_loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(new_loop)
-    new_loop.create_task(patroni_query(patroni_url, logic_q, GAUGE))
-    new_loop.run_forever()
+    if config.get('patroni_source') == 'kube':
+        check_kube_source()
+        # The Kube watch blocks on informer events; keep it off the loop
+        thread = threading.Thread(target=patroni_kube_watch, daemon=True, name="patroni-kube", args=(
+            config.get('solution_namespace'), logic_q, GAUGE, config.get('py_env')))
+        thread.start()
+        while thread.is_alive():
+            await asyncio.sleep(5)
+    else:
+        await patroni_query(patroni_url, logic_q, GAUGE)
+
+
+def changed_keys(previous: dict, current: dict):
+    if previous is None:
+        return sorted(current.keys())
+    return sorted(k for k in set(previous.keys()) | set(current.keys())
+                  if previous.get(k) != current.get(k))
+
+
+async def fetch_state(patroni_url: str):
+    """Fetches /config and /cluster concurrently and merges the result."""
+    loop = asyncio.get_running_loop()
+    state, cluster = await asyncio.gather(
+        loop.run_in_executor(None, inspect_config, patroni_url, session()),
+        loop.run_in_executor(None, inspect_cluster, patroni_url, session()))
+    state.update(cluster)
+    return state
 
 
 async def patroni_query(patroni_url: str, logic_q, GAUGE):
     logger.info("Patroni Query %s" % patroni_url)
-    last_result = "unknown"
+    last_state = None
+    down = False
+    tracker = LagTracker(stall_seconds=config.get('patroni_catchup_stall_seconds'))
     while True:
         try:
-            config = inspect_config(patroni_url)
-            config.update(inspect_cluster(patroni_url))
-            config_str = json.dumps(config)
-            if last_result != config_str:
-                logger.debug("New information %s", config_str)
+            state = await fetch_state(patroni_url)
+            # Lag moves on every poll; catch-up progress is reported through
+            # the lag metrics and log rather than in the state sent to Logic
+            track_lag(tracker, state.pop('lag', {}))
+            if down or state != last_state:
+                logger.debug("New information %s (changed %s)", state, changed_keys(last_state, state))
                 message = dict(event="patroni", control="up")
-                message.update(config)
-                logic_q.put(message)
-                last_result = config_str
+                message.update(state)
+                logic_q.put(stamped(message))
+                last_state = state
+                down = False
             GAUGE.set(1)
 
-        except urllib3.exceptions.ReadTimeoutError:
-            logger.error(
-                'Read timeout in patroni query. Failing.')
-            GAUGE.set(0)
-
-            message = dict(event="patroni", control="down")
-            logic_q.put(message)
-            last_result = json.dumps(message)
-
-        except requests.exceptions.ConnectionError:
-            logger.error(
-                'Failed to connect to Patroni Controller API')
-            GAUGE.set(0)
-
-            message = dict(event="patroni", control="down")
-            logic_q.put(message)
-            last_result = json.dumps(message)
         except Exception as ex:
-            logger.error(
-                'Unknown error in patroni query. Failing.')
+            if isinstance(ex, urllib3.exceptions.ReadTimeoutError) or isinstance(ex, requests.exceptions.Timeout):
+                logger.error('Read timeout in patroni query. Failing.')
+            elif isinstance(ex, requests.exceptions.ConnectionError):
+                logger.error('Failed to connect to Patroni Controller API')
+            else:
+                logger.error('Unknown error in patroni query. Failing. %s', repr(ex))
             GAUGE.set(0)
 
-            message = dict(event="patroni", control="down")
-            logic_q.put(message)
-            last_result = json.dumps(message)
-        time.sleep(5)
-
-
-def inspect_config(patroni_url: str):
-    r = requests.get("%s/config" % patroni_url, timeout=2)
+            # Only the transition to down is reported; Logic already knows
+            # while Patroni stays unreachable.
+            if not down:
+                logic_q.put(stamped(dict(event="patroni", control="down")))
+                down = True
+        await asyncio.sleep(config.get('patroni_poll_interval_seconds'))
+
+
+def track_lag(tracker, lag: dict):
+    for member, entry in lag.items():
+        tracker.observe(member, entry['lag'], entry['timeline'])
+    tracker.forget(lag.keys())
+    catchup = tracker.summary()
+    for member, entry in catchup.items():
+        if entry['stalled']:
+            logger.warning("Member %s is %s bytes behind and not catching up", member, entry['lag'])
+        elif entry['lag'] > 0:
+            logger.info("Member %s is %s bytes behind (%s bytes/s, eta %ss)", member, entry['lag'],
+                        "?" if entry['rate'] is None else round(entry['rate']),
+                        "?" if entry['eta'] is None else round(entry['eta']))
+    return catchup
+
+
+def inspect_config(patroni_url: str, http=requests):
+    r = http.get("%s/config" % patroni_url, timeout=2)
     if r.status_code != 200:
         raise Exception('Failed communication with Patroni %d' % r.status_code)
     data = r.json()
@@ -75,14 +131,17 @@ def inspect_config(patroni_url: str):
     )
 
 
-def inspect_cluster(patroni_url: str):
-    r = requests.get("%s/cluster" % patroni_url, timeout=2)
+def inspect_cluster(patroni_url: str, http=requests):
+    r = http.get("%s/cluster" % patroni_url, timeout=2)
     if r.status_code != 200:
         raise Exception('Failed communication with Patroni %d' % r.status_code)
     data = r.json()
     concerns = []
     leader = None
+    lag = {}
     for member in data['members']:
+        if 'lag' in member:
+            lag[member['name']] = dict(lag=member['lag'], timeline=member.get('timeline'))
         if member['state'] != 'running':
             concerns.append(
                 dict(member=member['name'], role=member['role'], state=member['state']))
@@ -92,7 +151,8 @@ def inspect_cluster(patroni_url: str):
     return dict(
         member_count=len(data['members']),
         concerns=concerns,
-        leader=leader
+        leader=leader,
+        lag=lag
     )
 
 
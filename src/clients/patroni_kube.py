@@ -0,0 +1,107 @@
+import json
+import logging
+import threading
+import time
+from prometheus_client import Gauge
+from clients.kube_cache import informer
+from config import config
+from event_bus import stamped
+
+logger = logging.getLogger(__name__)
+
+# Patroni on Kubernetes (Spilo) keeps its cluster state in Kube objects:
+#   <cluster>-config  configmap, annotation 'config' - the dynamic configuration
+#   <cluster>-leader  configmap, annotation 'leader' - the current leader
+#   pods              annotation 'status' - each member's state and role
+# Watching those through the informer caches gives the same 'patroni' events
+# as polling the REST API, as soon as the cluster changes.
+
+# Patroni publishes 'master' (older) or 'primary' in pod status, but the REST
+# API reports 'leader'
+ROLES = dict(master='leader', primary='leader')
+
+
+def _annotation(obj, key: str):
+    if obj is None:
+        return None
+    return (obj.metadata.annotations or {}).get(key)
+
+
+def _json_annotation(obj, key: str):
+    value = _annotation(obj, key)
+    if value is None:
+        return {}
+    try:
+        return json.loads(value)
+    except ValueError:
+        logger.warning("Unparseable %s annotation on %s", key, obj.metadata.name)
+        return {}
+
+
+def state_from_objects(config_cm, leader_cm, pods):
+    """Builds the same state as inspect_config + inspect_cluster from the
+    Patroni configmaps and member pods."""
+    leader_name = _annotation(leader_cm, 'leader')
+    concerns = []
+    leader = None
+    for pod in pods:
+        status = _json_annotation(pod, 'status')
+        role = ROLES.get(status.get('role'), status.get('role'))
+        state = status.get('state')
+        if state != 'running':
+            concerns.append(dict(member=pod.metadata.name, role=role, state=state))
+        if pod.metadata.name == leader_name or role in ('leader', 'standby_leader'):
+            leader = dict(member=pod.metadata.name, role=role)
+
+    return dict(
+        is_standby_configured="standby_cluster" in _json_annotation(config_cm, 'config'),
+        member_count=len(pods),
+        concerns=concerns,
+        leader=leader
+    )
+
+
+def check_kube_source():
+    """PATRONI_SOURCE=kube reads only from the informer caches."""
+    if config.get('patroni_source') == 'kube' and not config.get('kube_cache_enabled'):
+        raise ValueError("PATRONI_SOURCE=kube requires KUBE_CACHE_ENABLED=true")
+
+
+def patroni_kube_watch(namespace: str, logic_q, GAUGE, py_env: str):
+    check_kube_source()
+    cluster = config.get('statefulset_patroni')
+    selector = config.get('patroni_pod_label_selector')
+
+    configmaps = None
+    pods = None
+    while configmaps is None or pods is None:
+        configmaps = informer('configmap', namespace, py_env)
+        pods = informer('pod', namespace, py_env)
+        if configmaps is None or pods is None:
+            logger.error("Patroni Kube caches not synced - retrying")
+            GAUGE.set(0)
+            time.sleep(5)
+
+    changed = threading.Event()
+
+    def listener(event):
+        changed.set()
+
+    configmaps.add_listener(listener)
+    pods.add_listener(listener)
+
+    logger.info("Patroni Kube watch %s/%s", namespace, cluster)
+    last_state = None
+    while True:
+        changed.clear()
+        state = state_from_objects(configmaps.get("%s-config" % cluster),
+                                   configmaps.get("%s-leader" % cluster),
+                                   pods.list(selector))
+        if state != last_state:
+            logger.debug("New information %s", state)
+            message = dict(event="patroni", control="up")
+            message.update(state)
+            logic_q.put(stamped(message))
+            last_state = state
+        GAUGE.set(1)
+        changed.wait()
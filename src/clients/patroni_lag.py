@@ -0,0 +1,107 @@
+import logging
+import time
+from collections import deque
+from prometheus_client import Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+# Tracks how far each replica is behind the leader over the last
+# stall_seconds (samples are kept by age, whatever the poll interval), so a rebuilding standby's catch-up rate and ETA can be estimated and a
+# catch-up that has stopped making progress can be alerted on.
+
+LAG = Gauge('switchover_patroni_lag_bytes', 'Switchover Patroni replication lag per member',
+            ['member'])
+ETA = Gauge('switchover_patroni_catchup_eta_seconds', 'Switchover Patroni estimated seconds until a member has caught up',
+            ['member'])
+STALLED = Gauge('switchover_patroni_catchup_stalled', 'Switchover Patroni member is lagging and not catching up',
+                ['member'])
+REDUCTION = Histogram('switchover_patroni_lag_reduction_bytes', 'Switchover Patroni lag reduction between polls',
+                      ['member'], buckets=(0, 1024, 16384, 131072, 1048576, 8388608, 67108864, 536870912))
+
+
+def parse_lag(value):
+    """Patroni reports lag in bytes, or 'unknown' when it cannot tell."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return value
+    return None
+
+
+class LagTracker:
+    def __init__(self, stall_seconds: float = 60, now_fn=time.monotonic):
+        self.stall_seconds = stall_seconds
+        self._now_fn = now_fn
+        self.samples = {}
+
+    def observe(self, member: str, lag, timeline=None):
+        lag = parse_lag(lag)
+        samples = self.samples.setdefault(member, deque())
+        if lag is None:
+            return
+        if len(samples) > 0 and samples[-1][2] != timeline:
+            # A new timeline means a new base; earlier samples are not comparable
+            samples.clear()
+        if len(samples) > 0 and samples[-1][1] > lag:
+            REDUCTION.labels(member=member).observe(samples[-1][1] - lag)
+        now = self._now_fn()
+        samples.append((now, lag, timeline))
+        # Keep just enough history to span stall_seconds
+        while len(samples) > 2 and now - samples[1][0] >= self.stall_seconds:
+            samples.popleft()
+        LAG.labels(member=member).set(lag)
+
+    def forget(self, members):
+        """Drops members that are no longer part of the cluster."""
+        for member in [m for m in self.samples.keys() if m not in members]:
+            del self.samples[member]
+            # Removed rather than zeroed - an ETA of 0 reads as caught up
+            for metric in (LAG, ETA, STALLED, REDUCTION):
+                try:
+                    metric.remove(member)
+                except KeyError:
+                    pass
+
+    def rate(self, member: str):
+        """Bytes of lag removed per second over the window; negative when the
+        member is falling further behind."""
+        samples = self.samples.get(member)
+        if samples is None or len(samples) < 2:
+            return None
+        elapsed = samples[-1][0] - samples[0][0]
+        if elapsed <= 0:
+            return None
+        return (samples[0][1] - samples[-1][1]) / elapsed
+
+    def eta(self, member: str):
+        samples = self.samples.get(member)
+        if not samples:
+            return None
+        lag = samples[-1][1]
+        if lag == 0:
+            return 0
+        rate = self.rate(member)
+        if rate is None or rate <= 0:
+            return None
+        return lag / rate
+
+    def stalled(self, member: str):
+        samples = self.samples.get(member)
+        if not samples or samples[-1][1] == 0:
+            return False
+        if samples[-1][0] - samples[0][0] < self.stall_seconds:
+            return False
+        rate = self.rate(member)
+        return rate is not None and rate <= 0
+
+    def summary(self):
+        summary = {}
+        for member, samples in self.samples.items():
+            if len(samples) == 0:
+                continue
+            entry = dict(lag=samples[-1][1], rate=self.rate(member),
+                         eta=self.eta(member), stalled=self.stalled(member))
+            ETA.labels(member=member).set(entry['eta'] if entry['eta'] is not None else -1)
+            STALLED.labels(member=member).set(1 if entry['stalled'] else 0)
+            summary[member] = entry
+        return summary
@@ -0,0 +1,112 @@
+import logging
+import threading
+import time
+from collections import namedtuple
+from prometheus_client import Gauge, Histogram
+from clients.kube_cache import informer
+
+logger = logging.getLogger(__name__)
+
+# Waits for several workloads to reach their target replica counts at once,
+# over the shared informer streams, with one deadline for the whole set.
+
+RolloutGoal = namedtuple('RolloutGoal', ['kind', 'name', 'label_selector', 'replicas'])
+
+PODS = Gauge('switchover_rollout_pods', 'Switchover rollout pod progress per workload',
+             ['workload', 'phase'])
+DURATION = Histogram('switchover_rollout_seconds', 'Switchover time for a workload to reach its target',
+                     ['workload'], buckets=(1, 5, 10, 20, 30, 60, 90, 120, 180, 300))
+
+
+def scaled_to(workload, replicas: int):
+    if workload.spec.replicas != replicas:
+        # Right after scale() the cache can still hold the previous object,
+        # whose status already matches its own (old) spec
+        return False
+    status = workload.status
+    generation = workload.metadata.generation
+    if (generation is not None and status.observed_generation is not None
+            and status.observed_generation < generation):
+        # Controller has not caught up with the latest scale yet
+        return False
+    if status.replicas == 0 and replicas == 0:
+        return True
+    if status.ready_replicas is None and replicas == 0:
+        return True
+    return status.ready_replicas == replicas
+
+
+def _pod_ready(pod):
+    for condition in (pod.status.conditions or []):
+        if condition.type == 'Ready':
+            return condition.status == 'True'
+    return False
+
+
+def pod_progress(pods):
+    return dict(
+        pods=len(pods),
+        scheduled=len([p for p in pods if p.spec.node_name]),
+        ready=len([p for p in pods if _pod_ready(p) and p.metadata.deletion_timestamp is None]),
+        terminating=len([p for p in pods if p.metadata.deletion_timestamp is not None]),
+    )
+
+
+def wait_for_rollout(namespace: str, goals, timeout: float, py_env: str):
+    """Blocks until every goal is met or the shared deadline expires.
+
+    Returns the progress per (kind, name), or None when the informer caches are
+    unavailable (callers then fall back to wait_for_scale).  Raises if the
+    deadline expires with goals outstanding."""
+    workloads = {}
+    for kind in set(goal.kind for goal in goals):
+        workloads[kind] = informer(kind, namespace, py_env)
+        if workloads[kind] is None:
+            return None
+    # Pod progress is informational only; do not hold the wait up for it
+    pods = informer('pod', namespace, py_env, sync_timeout=1)
+    watched = list(workloads.values()) + ([pods] if pods is not None else [])
+
+    changed = threading.Event()
+
+    def listener(event):
+        changed.set()
+
+    for inf in watched:
+        inf.add_listener(listener)
+
+    started = time.monotonic()
+    deadline = started + timeout
+    progress = dict(((goal.kind, goal.name), dict(target=goal.replicas, met=False)) for goal in goals)
+    try:
+        while True:
+            changed.clear()
+            for goal in goals:
+                entry = progress[(goal.kind, goal.name)]
+                workload = workloads[goal.kind].get(goal.name)
+                if pods is not None:
+                    snapshot = pod_progress(pods.list(goal.label_selector))
+                    if snapshot != dict((k, entry.get(k)) for k in snapshot.keys()):
+                        logger.debug("rollout %s %s -> %d : %s", goal.kind, goal.name, goal.replicas, snapshot)
+                    entry.update(snapshot)
+                    for phase in ('scheduled', 'ready', 'terminating'):
+                        PODS.labels(workload=goal.name, phase=phase).set(snapshot[phase])
+
+                if not entry['met'] and workload is not None and scaled_to(workload, goal.replicas):
+                    entry['met'] = True
+                    entry['seconds'] = time.monotonic() - started
+                    DURATION.labels(workload=goal.name).observe(entry['seconds'])
+                    logger.info("rollout done - %s %s scaled to %d in %.1fs",
+                                goal.kind, goal.name, goal.replicas, entry['seconds'])
+
+            if all(entry['met'] for entry in progress.values()):
+                return progress
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                pending = dict(("%s/%s" % key, entry) for key, entry in progress.items() if not entry['met'])
+                raise Exception("Giving up waiting for rollout %s" % pending)
+            changed.wait(remaining)
+    finally:
+        for inf in watched:
+            inf.listeners.remove(listener)
@@ -6,8 +6,8 @@ import asyncio
 import time
 import json
 import urllib3
-from kubernetes import client, config as k8s_config
 from kubernetes.client.rest import ApiException
+from clients.kube_client import get_api
 from config import config
 
 logger = logging.getLogger(__name__)
@@ -48,12 +48,7 @@ def sign_request(key, bytedata):
 
 def cancel_pipeline_run(name: str, py_env: str):
     """Gracefully cancel a hung PipelineRun (runs finally tasks, then terminates as Cancelled)."""
-    if py_env == 'production':
-        k8s_config.load_incluster_config()
-    else:
-        k8s_config.load_kube_config()
-
-    api = client.CustomObjectsApi()
+    api = get_api('custom', py_env)
     namespace = config.get('tekton_namespace')
     body = {"spec": {"status": "CancelledRunFinally"}}
 
@@ -70,3 +65,15 @@ def cancel_pipeline_run(name: str, py_env: str):
     except ApiException as e:
         logger.error("Failed to cancel PipelineRun %s: %s", name, e)
         raise
+
+
+def list_pipeline_runs(label_selector: str, py_env: str):
+    api = get_api('custom', py_env)
+    result = api.list_namespaced_custom_object(
+        group="tekton.dev",
+        version="v1beta1",
+        namespace=config.get('tekton_namespace'),
+        plural="pipelineruns",
+        label_selector=label_selector,
+    )
+    return result.get('items', [])
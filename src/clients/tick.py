@@ -1,4 +1,6 @@
+import asyncio
 import time
+from event_bus import stamped
 
 TICK_INTERVAL_SECONDS = 30
 
@@ -9,4 +11,10 @@ def tick_producer(logic_q):
     events from other watchers."""
     while True:
         time.sleep(TICK_INTERVAL_SECONDS)
-        logic_q.put({"event": "tick"})
+        logic_q.put(stamped({"event": "tick"}))
+
+
+async def tick(logic_q):
+    while True:
+        await asyncio.sleep(TICK_INTERVAL_SECONDS)
+        logic_q.put(stamped({"event": "tick"}))
@@ -8,6 +8,13 @@ def _int_env(name: str, default: int) -> int:
         return default
 
 
+def _float_env(name: str, default: float) -> float:
+    try:
+        return float(os.environ[name])
+    except (KeyError, ValueError):
+        return default
+
+
 config = dict(
     wss_server_host='0.0.0.0',
     wss_server_port=8765,
@@ -52,4 +59,39 @@ config = dict(
     pipeline_max_retries=_int_env("PIPELINE_MAX_RETRIES", 2),
     pipeline_retry_total_cap_seconds=_int_env("PIPELINE_RETRY_TOTAL_CAP_SECONDS", 900),
     pipeline_attempt_timeout_seconds=_int_env("PIPELINE_ATTEMPT_TIMEOUT_SECONDS", 360),
+    kube_client_refresh_seconds=_int_env("KUBE_CLIENT_REFRESH_SECONDS", 300),
+    kube_client_pool_maxsize=_int_env("KUBE_CLIENT_POOL_MAXSIZE", 4),
+    kube_cache_enabled=os.environ.get('KUBE_CACHE_ENABLED', 'true') == 'true',
+    kube_cache_sync_timeout_seconds=_float_env("KUBE_CACHE_SYNC_TIMEOUT_SECONDS", 5),
+    kube_watch_timeout_seconds=_int_env("KUBE_WATCH_TIMEOUT_SECONDS", 600),
+    kube_watch_stall_seconds=_int_env("KUBE_WATCH_STALL_SECONDS", 120),
+    kube_async_threads=_int_env("KUBE_ASYNC_THREADS", 8),
+    rollout_timeout_seconds=_int_env("ROLLOUT_TIMEOUT_SECONDS", 120),
+    transition_step_timeout_seconds=_int_env("TRANSITION_STEP_TIMEOUT_SECONDS", 120),
+    patroni_source=os.environ.get("PATRONI_SOURCE", "http"),
+    patroni_pod_label_selector=os.environ.get("PATRONI_POD_LABEL_SELECTOR", "app=patroni-spilo"),
+    patroni_catchup_stall_seconds=_int_env("PATRONI_CATCHUP_STALL_SECONDS", 60),
+    patroni_poll_interval_seconds=_float_env("PATRONI_POLL_INTERVAL_SECONDS", 5),
+    peer_heartbeat_interval_seconds=_float_env("PEER_HEARTBEAT_INTERVAL_SECONDS", 0.5),
+    peer_heartbeat_missed_beats=_int_env("PEER_HEARTBEAT_MISSED_BEATS", 3),
+    peer_outbox_ttl_seconds=_int_env("PEER_OUTBOX_TTL_SECONDS", 120),
+    peer_outbox_max_depth=_int_env("PEER_OUTBOX_MAX_DEPTH", 100),
+    peer_digest_max_age_seconds=_int_env("PEER_DIGEST_MAX_AGE_SECONDS", 60),
+    runtime_mode=os.environ.get("RUNTIME_MODE", "process"),
+    runtime_threads=_int_env("RUNTIME_THREADS", 16),
+    worker_status_file=os.environ.get("WORKER_STATUS_FILE", "/tmp/switchover-workers.json"),
+    worker_down_grace_seconds=_int_env("WORKER_DOWN_GRACE_SECONDS", 30),
+    slow_event_seconds=_float_env("SLOW_EVENT_SECONDS", 1),
+    standby_trigger_timeout_seconds=_int_env("STANDBY_TRIGGER_TIMEOUT_SECONDS", 0),
+    trigger_retry_interval_seconds=_int_env("TRIGGER_RETRY_INTERVAL_SECONDS", 30),
+    record_file=os.environ.get("RECORD_FILE", ""),
+    checkpoint_file=os.environ.get("CHECKPOINT_FILE", "/tmp/switchover-logic-state.json"),
+    dns_nameserver=os.environ.get("DNS_NAMESERVER"),
+    dns_nameservers=os.environ.get("DNS_NAMESERVERS"),
+    dns_quorum=_int_env("DNS_QUORUM", 0),
+    dns_probe_timeout_seconds=_float_env("DNS_PROBE_TIMEOUT_SECONDS", 2),
+    dns_probe_attempts=_int_env("DNS_PROBE_ATTEMPTS", 2),
+    dns_error_probes=_int_env("DNS_ERROR_PROBES", 3),
+    dns_probe_min_interval_seconds=_float_env("DNS_PROBE_MIN_INTERVAL_SECONDS", 1),
+    dns_probe_max_interval_seconds=_float_env("DNS_PROBE_MAX_INTERVAL_SECONDS", 5),
 )
@@ -0,0 +1,156 @@
+import logging
+import threading
+import time
+from collections import deque
+from prometheus_client import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+# Priority lanes in front of Logic.handler.  Producers keep putting plain
+# dicts on logic_q; a pump thread moves them onto the bus as Events, so a DNS
+# change or a peer message is handled ahead of a backlog of PipelineRun
+# updates.  An event that supersedes one still waiting in its lane (the
+# latest Patroni snapshot, the latest DNS answer) replaces it in place.
+
+HIGH = 'high'
+NORMAL = 'normal'
+LOW = 'low'
+LANES = (HIGH, NORMAL, LOW)
+
+PRIORITIES = dict(
+    dns=HIGH,
+    peer=HIGH,
+    from_peer=HIGH,
+    switchover_state=HIGH,
+    transition_job=HIGH,
+    patroni=NORMAL,
+    kube_stream=LOW,
+    tick=LOW,
+)
+
+QUEUED = Counter('switchover_event_bus', 'Switchover events entering the Logic event bus',
+                 ['lane', 'result'])
+DEPTH = Gauge('switchover_event_bus_depth', 'Switchover events waiting in a Logic event bus lane',
+              ['lane'])
+
+
+def stamped(message: dict):
+    """Records when the producer created the event, so Logic can measure how
+    long it waited before being handled."""
+    message['ts'] = time.time()
+    return message
+
+
+def coalesce_key(item: dict):
+    """Events with the same key supersede each other; None never coalesces."""
+    event = item.get('event')
+    if event in ('dns', 'patroni', 'peer', 'tick'):
+        return event
+    if event == 'from_peer' and (item.get('message') or {}).get('event') == 'peer_digest':
+        return 'peer_digest'
+    if event == 'kube_stream':
+        # Only updates of the same type supersede each other; Logic handles
+        # ADDED and DELETED differently from MODIFIED
+        data = item.get('data') or {}
+        obj = data.get('object') or {}
+        return ('kube_stream', item.get('kind'), (obj.get('metadata') or {}).get('name'), data.get('type'))
+    return None
+
+
+class Event:
+    """One event for Logic.handler: its name, lane and coalescing key, around
+    the fields of the dict the producer sent.  Supports the same item['key']
+    access as those dicts, so handler code works on either."""
+    __slots__ = ('event', 'fields', 'lane', 'key')
+
+    def __init__(self, event: str, fields: dict, lane: str = NORMAL, key=None):
+        self.event = event
+        self.fields = fields
+        self.lane = lane
+        self.key = key
+
+    @classmethod
+    def from_dict(cls, item: dict):
+        fields = dict(item)
+        event = fields.pop('event')
+        return cls(event, fields, PRIORITIES.get(event, NORMAL), coalesce_key(item))
+
+    def to_dict(self):
+        return dict(self.fields, event=self.event)
+
+    def __getitem__(self, name):
+        if name == 'event':
+            return self.event
+        return self.fields[name]
+
+    def __setitem__(self, name, value):
+        if name == 'event':
+            self.event = value
+        else:
+            self.fields[name] = value
+
+    def __contains__(self, name):
+        return name == 'event' or name in self.fields
+
+    def get(self, name, default=None):
+        return self[name] if name in self else default
+
+    def __repr__(self):
+        return "Event(%s, %s)" % (self.event, self.fields)
+
+
+def as_dict(item):
+    """Plain dict for anything leaving the process (e.g. forwarded to the peer)."""
+    return item.to_dict() if isinstance(item, Event) else item
+
+
+class EventBus:
+    def __init__(self):
+        self.lanes = dict((lane, deque()) for lane in LANES)
+        self.pending = {}
+        self.ready = threading.Condition()
+
+    def put(self, item):
+        event = item if isinstance(item, Event) else Event.from_dict(item)
+        with self.ready:
+            waiting = self.pending.get(event.key) if event.key is not None else None
+            if waiting is not None:
+                # Keep the waiting event's place in line, with the newer content
+                waiting.fields = event.fields
+                QUEUED.labels(lane=event.lane, result='coalesced').inc()
+                return
+            self.lanes[event.lane].append(event)
+            if event.key is not None:
+                self.pending[event.key] = event
+            QUEUED.labels(lane=event.lane, result='queued').inc()
+            DEPTH.labels(lane=event.lane).set(len(self.lanes[event.lane]))
+            self.ready.notify()
+
+    def get(self, timeout: float = None):
+        """Returns the next event from the highest priority non-empty lane,
+        or None if the timeout expires."""
+        with self.ready:
+            while True:
+                for lane in LANES:
+                    if len(self.lanes[lane]) > 0:
+                        event = self.lanes[lane].popleft()
+                        if event.key is not None:
+                            self.pending.pop(event.key, None)
+                        DEPTH.labels(lane=lane).set(len(self.lanes[lane]))
+                        return event
+                if not self.ready.wait(timeout):
+                    return None
+
+    def qsize(self):
+        with self.ready:
+            return sum(len(lane) for lane in self.lanes.values())
+
+    def pump(self, source):
+        """Moves items from a Queue (multiprocessing or in-memory) onto the bus
+        on a daemon thread."""
+        def run():
+            while True:
+                self.put(source.get())
+        thread = threading.Thread(target=run, daemon=True, name="event-bus-pump")
+        thread.start()
+        return thread
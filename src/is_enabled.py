@@ -1,6 +1,6 @@
 import os
 
-default = 'logic_handler,peer_server,peer_client,peer_client_fwd,dns_watch,tick_producer'
+default = 'logic_handler,peer_server,peer_channel,dns_watch,tick_producer'
 
 def is_enabled (a):
   processes = os.environ.get('PROCESS_LIST', default).split(',')
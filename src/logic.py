@@ -3,24 +3,37 @@ import datetime
 import traceback
 import sys
 import time
+import uuid
+from collections import namedtuple
 from typing import Any
-from clients.tekton import trigger_tekton_build
+from clients.tekton import trigger_tekton_build, list_pipeline_runs
 from clients.kube import scale, scale_and_wait, delete_pvc, delete_configmap
 from clients.kube import get_configmap, update_configmap, restart_deployment, patch_secret
 from clients.patroni import set_readonly_cluster, set_primary_cluster
 from clients.maintenance import set_maintenance
 from clients.keycloak import keycloak_service_block, keycloak_service_flow
 from transitions.wait_for import WaitFor
+from transitions.conditions import ConditionEngine
+from transitions.jobs import TransitionJob, SUCCEEDED, FAILED, current_job
 from transitions.shared import maintenance_on, maintenance_off
-from transitions.initiate_down import initiate_active_down
-from transitions.initiate_maintenance import initiate_passive_maintenance
-from transitions.initiate_primary import initiate_active_primary, initiate_passive_primary
-from transitions.initiate_standby import initiate_active_standby, initiate_passive_standby
+from transitions.table import TABLE, ACTIVE, PASSIVE
+from peers.digest import build_digest, newer, peer_confirms
+from event_bus import EventBus, as_dict, stamped
+from checkpoint import Journal, snapshot, restore, trigger_state
+from recorder import Recorder, Tapped
+from scheduler import DeadlineScheduler
 from config import config
-from prometheus_client import Gauge, Counter, Enum
+from prometheus_client import Gauge, Counter, Enum, Histogram
 
 logger = logging.getLogger(__name__)
 
+# What the event handlers need from Logic.handler's arguments
+HandlerContext = namedtuple('HandlerContext', ['cluster', 'namespace', 'patroni_local_url', 'py_env',
+                                               'fwd_to_peer_q', 'bus', 'logic_q'], defaults=(None,))
+
+# Longest wait before a trigger whose action keeps failing is run again
+TRIGGER_MAX_BACKOFF_SECONDS = 600
+
 
 class Logic:
     peer = "unknown"
@@ -31,8 +44,26 @@ class Logic:
     retry_state = None
     transition_failed = False
     failed_transition_maintenance = None
-
-    triggers = []
+    dns = None
+    digest_session = uuid.uuid4().hex
+    digest_version = 0
+    peer_digest = None
+    job = None
+    running_trigger = None
+    deferred = None
+    requeued = None
+    deadlines = None
+    journal = None
+    recorder = None
+    handlers = None
+    # Stand-ins, by name, for the calls Logic makes to Kubernetes, Tekton and
+    # the maintenance page ('job' maps a transition job's name to the function
+    # to run instead); replay.py sets these
+    stubs = None
+    background_jobs = True
+    trace = []
+
+    triggers = ConditionEngine()
     PIPELINE = Counter('switchover_pipeline', 'Switchover Tekton Pipelines',
                        ['release', 'state'])
     METRIC = Counter('switchover_logic', 'Switchover Logic',
@@ -45,390 +76,410 @@ class Logic:
     TRANSITION_GAUGE = Gauge('switchover_transition',
                              'Switchover transition state per release',
                              ['release'])
+    EVENT_WAIT = Histogram('switchover_event_wait_seconds',
+                           'Switchover time from an event being produced to Logic picking it up',
+                           ['event'])
+    EVENT_HANDLE = Histogram('switchover_event_handle_seconds',
+                             'Switchover time Logic spends handling an event',
+                             ['event'], buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 120, 300))
+    QUEUE_DEPTH = Gauge('switchover_logic_queue_depth', 'Switchover events waiting for Logic')
+    DEADLINE_LATE = Histogram('switchover_deadline_late_seconds',
+                              'Switchover time between a retry, timeout or cap deadline and Logic acting on it',
+                              ['deadline'], buckets=(0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60))
 
     def handler(self, cluster: str, namespace: str, label_selector: str, patroni_local_url: str, py_env: str, _q, fwd_to_peer_q):
+        if config.get('record_file'):
+            self.recorder = Recorder(config.get('record_file'))
+        bus = EventBus()
+        bus.pump(_q)
+        ctx = self.context(cluster, namespace, patroni_local_url, py_env, fwd_to_peer_q, bus, _q)
+        self.journal = Journal(config.get('checkpoint_file'))
+        self._restore(bus, py_env)
+        self._schedule_deadlines()
         while True:
-            try:
-                item = _q.get()
-                logger.info(f'logic {item["event"]}')
-                self.METRIC.labels(resource="logic", state="info").inc()
-
-                if item['event'] == 'tick':
-                    self._maybe_retry()
-                    continue
-
-                if item['event'] == 'kube_stream':
-                    spec = item['data']['object']
-                    kind = spec['kind']
-
-                    if kind == 'PipelineRun':
-
-                        mdnm = spec['metadata']['name']
-                        event_id = spec['metadata']['labels']['triggers.tekton.dev/triggers-eventid']
-
-                        params = self.pick_params(spec['spec']['params'], [
-                            "git-release-branch", "release-namespace"])
-
-                        if self.retry_state is not None and 'release-namespace' in params:
-                            self.retry_state['release'] = params['release-namespace']
-
-                        if item['data']['type'] != "ADDED":
-                            logger.debug("   (track %s)" %
-                                         self.pipeline['event_id'])
-                            logger.debug("   name  = %s" % mdnm)
-                            logger.debug(
-                                "   event = %s" % event_id)
-                            for key in params.keys():
-                                logger.debug("   param  %-20s = %s" %
-                                             (key, params[key]))
-
-                            if (self.pipeline['event_id'] == event_id
-                                    and self.pipeline.get('name') is None):
-                                self.pipeline['name'] = mdnm
-
-                        status_reason = "Undefined"
-                        if 'status' in spec and 'conditions' in spec['status']:
-                            status_reason = spec['status']['conditions'][0]['reason']
-                            if item['data']['type'] != "ADDED":
-                                logger.debug("   reason = %s" %
-                                             spec['status']['conditions'][0]['reason'])
-                                logger.debug("   status = %s" %
-                                             spec['status']['conditions'][0]['status'])
-                                logger.debug("   messag = %s" %
-                                             spec['status']['conditions'][0]['message'])
-
-                            if self.pipeline['event_id'] == event_id and (status_reason == "Completed" or status_reason == "Succeeded" or status_reason == "Failed" or status_reason == "Cancelled" or status_reason == "PipelineRunCancelled"):
-
-                                logger.info("End State for Pipeline - %s" 
-                                            % status_reason)
-                                logger.info("Tekton Start: %s" %
-                                            self.pipeline['start_ts'])
-                                logger.info("Tekton   End: %s" %
-                                            self._now())
-
-                                if status_reason in ("Completed", "Succeeded"):
-                                    self._on_pipeline_success(py_env)
-                                else:
-                                    self._on_pipeline_failure(py_env)
-
-                            elif (status_reason in ("Completed", "Succeeded")
-                                    and params.get('release-namespace') == config.get('solution_namespace')
-                                    and self.transition_failed):
-                                self._on_untracked_env_success(py_env)
-
-                        if item['data']['type'] != "ADDED" and item['data']['type'] != "DELETED":
-                            if self.retry_state is not None and self.retry_state['event_id'] == event_id:
-                                self.PIPELINE.labels(
-                                    release=params['release-namespace'], state=status_reason).inc()
-
-                        # Status Reason/Status : Running, Unknown
-                        # Status Reason/Status : Succeeded, True
-                        # Status Reason/Status : Failed, False
-                    else:
-                        logger.debug("kind  = %s" % kind)
-
-                if item['event'] == 'patroni':
-                    self.patroni = item
-                    logger.debug("[patroni] %s", item)
-                    if item['control'] == 'up':
-                        self.METRIC.labels(
-                            resource="patroni", state=("IsStandby=%s" % item['is_standby_configured'])).inc()
-                        self.METRIC.labels(
-                            resource="patroni-leader", state="%s-%s" % (item['leader']['member'], item['leader']['role'])).inc()
-                        for concern in item['concerns']:
-                            self.METRIC.labels(
-                                resource="patroni-members", state="%s-%s" % (concern['member'], concern['state'])).inc()
-
-                    if item['control'] == 'up' and item['leader']['role'] == 'leader':
-                        self.GAUGE.labels(resource="patroni").set(1)
-                    elif item['control'] == 'up' and item['leader']['role'] == 'standby_leader':
-                        self.GAUGE.labels(resource="patroni").set(2)
+            self.handle_next(bus, ctx)
+
+    def handle_next(self, bus, ctx):
+        """Fires any deadline already due, then handles the next event.
+        Deadlines go first so a backlog on the bus (e.g. Tekton events) can
+        not hold back a retry, timeout or cap; with nothing queued, the wait
+        ends when the next one is due."""
+        if self.deadlines.timeout() == 0:
+            self.handle(None, ctx)
+        item = bus.get(self.deadlines.timeout())
+        self._record_event(item)
+        self.handle(item, ctx)
+
+    def context(self, cluster: str, namespace: str, patroni_local_url: str, py_env: str, fwd_to_peer_q, bus, _q=None):
+        if self.recorder is not None:
+            fwd_to_peer_q = Tapped(fwd_to_peer_q, self._record_peer)
+        return HandlerContext(cluster, namespace, patroni_local_url, py_env, fwd_to_peer_q, bus, _q)
+
+    def handle(self, item, ctx):
+        """Handles one event, or the deadlines that are due when item is None."""
+        if self.handlers is None:
+            self.handlers = dict(
+                tick=self._on_tick,
+                transition_job=self._on_job_finished,
+                kube_stream=self._on_kube_stream,
+                patroni=self._on_patroni,
+                peer=self._on_peer,
+                dns=self._on_dns,
+                from_peer=self._on_from_peer,
+                switchover_state=self._on_switchover_state,
+            )
+        try:
+            if item is None:
+                self._on_deadlines(ctx)
+                return
+            started = time.monotonic()
+            self.trace = []
+            self._observe_queue(item, ctx)
+            logger.info(f'logic {item["event"]}')
+            self.METRIC.labels(resource="logic", state="info").inc()
+
+            handle = self.handlers.get(item['event'])
+            if handle is not None:
+                handle(item, ctx)
+
+        except Exception as ex:
+            logger.error(
+                'Unknown error in logic. %s' % ex)
+            traceback.print_exc(file=sys.stdout)
+            self.METRIC.labels(resource="logic", state="error").inc()
+            self.trace.append("error %s" % repr(ex))
+        finally:
+            if item is not None:
+                self._observe_handled(item, started)
+            self._schedule_deadlines()
+            self._checkpoint()
+
+    def _on_tick(self, item, ctx):
+        self._maybe_retry()
+        self._publish_digest(ctx.fwd_to_peer_q)
+        if self.job is not None:
+            logger.info("Transition job %s", self.job.status())
+
+    def _on_kube_stream(self, item, ctx):
+        spec = item['data']['object']
+        kind = spec['kind']
+
+        if kind == 'PipelineRun':
+
+            named = False
+            mdnm = spec['metadata']['name']
+            event_id = spec['metadata']['labels']['triggers.tekton.dev/triggers-eventid']
+
+            params = self.pick_params(spec['spec']['params'], [
+                "git-release-branch", "release-namespace"])
+
+            if self.retry_state is not None and 'release-namespace' in params:
+                self.retry_state['release'] = params['release-namespace']
+
+            if item['data']['type'] != "ADDED":
+                logger.debug("   (track %s)" %
+                             self.pipeline['event_id'])
+                logger.debug("   name  = %s" % mdnm)
+                logger.debug(
+                    "   event = %s" % event_id)
+                for key in params.keys():
+                    logger.debug("   param  %-20s = %s" %
+                                 (key, params[key]))
+
+                if (self.pipeline['event_id'] == event_id
+                        and self.pipeline.get('name') is None):
+                    self.pipeline['name'] = mdnm
+                    named = True
+
+            status_reason = "Undefined"
+            if 'status' in spec and 'conditions' in spec['status']:
+                status_reason = spec['status']['conditions'][0]['reason']
+                if item['data']['type'] != "ADDED":
+                    logger.debug("   reason = %s" %
+                                 spec['status']['conditions'][0]['reason'])
+                    logger.debug("   status = %s" %
+                                 spec['status']['conditions'][0]['status'])
+                    logger.debug("   messag = %s" %
+                                 spec['status']['conditions'][0]['message'])
+
+                if self.pipeline['event_id'] == event_id and (status_reason == "Completed" or status_reason == "Succeeded" or status_reason == "Failed" or status_reason == "Cancelled" or status_reason == "PipelineRunCancelled"):
+
+                    logger.info("End State for Pipeline - %s" 
+                                % status_reason)
+                    self.trace.append("pipeline %s" % status_reason)
+                    logger.info("Tekton Start: %s" %
+                                self.pipeline['start_ts'])
+                    logger.info("Tekton   End: %s" %
+                                self._now())
+
+                    if status_reason in ("Completed", "Succeeded"):
+                        self._on_pipeline_success(ctx.py_env)
                     else:
-                        self.GAUGE.labels(resource="patroni").set(0)
+                        self._on_pipeline_failure(ctx.py_env)
+
+                elif (status_reason in ("Completed", "Succeeded")
+                        and params.get('release-namespace') == config.get('solution_namespace')
+                        and self.transition_failed):
+                    self._on_untracked_env_success(ctx.py_env)
+
+            if item['data']['type'] != "ADDED" and item['data']['type'] != "DELETED":
+                if self.retry_state is not None and self.retry_state['event_id'] == event_id:
+                    self.PIPELINE.labels(
+                        release=params['release-namespace'], state=status_reason).inc()
+
+            if named and self.pipeline['event_id'] == event_id:
+                # A cancel deferred for want of the run's name can go now;
+                # its attempt_timeout deadline has already fired
+                self._maybe_retry()
+
+            # Status Reason/Status : Running, Unknown
+            # Status Reason/Status : Succeeded, True
+            # Status Reason/Status : Failed, False
+        else:
+            logger.debug("kind  = %s" % kind)
+
+    def _on_patroni(self, item, ctx):
+        self.patroni = item
+        logger.debug("[patroni] %s", item)
+        self._publish_digest(ctx.fwd_to_peer_q)
+        if item['control'] == 'up':
+            self.METRIC.labels(
+                resource="patroni", state=("IsStandby=%s" % item['is_standby_configured'])).inc()
+            self.METRIC.labels(
+                resource="patroni-leader", state="%s-%s" % (item['leader']['member'], item['leader']['role'])).inc()
+            for concern in item['concerns']:
+                self.METRIC.labels(
+                    resource="patroni-members", state="%s-%s" % (concern['member'], concern['state'])).inc()
+
+        if item['control'] == 'up' and item['leader']['role'] == 'leader':
+            self.GAUGE.labels(resource="patroni").set(1)
+        elif item['control'] == 'up' and item['leader']['role'] == 'standby_leader':
+            self.GAUGE.labels(resource="patroni").set(2)
+        else:
+            self.GAUGE.labels(resource="patroni").set(0)
 
-                    for trigger in self.triggers:
-                        trigger.eval()
+        self._state_changed('patroni', ctx)
 
-                if item['event'] == 'peer':
-                    self.peer = item['state']
-                    self.METRIC.labels(resource="peer", state=self.peer).inc()
+    def _on_peer(self, item, ctx):
+        previous, self.peer = self.peer, item['state']
+        if self.peer != previous:
+            self._state_changed('peer', ctx)
+        self.METRIC.labels(resource="peer", state=self.peer).inc()
 
-                    if self.peer == 'ok':
-                        self.GAUGE.labels(resource="peer").set(1)
-                    else:
-                        self.GAUGE.labels(resource="peer").set(0)
-
-                if item['event'] == 'dns':
-                    dns = item['result']
-                    logger.debug("DNS resolution: %s", dns)
-                    if dns == config.get('active_ip'):
-                        self.METRIC.labels(
-                            resource="dns", state="active/%s" % dns).inc()
-                        self.GAUGE.labels(resource="dns").set(1)
-
-                    elif dns == config.get('passive_ip'):
-                        self.METRIC.labels(
-                            resource="dns", state="passive/%s" % dns).inc()
-                        self.GAUGE.labels(resource="dns").set(2)
-                    else:
-                        self.METRIC.labels(
-                            resource="dns", state="%s" % dns).inc()
-                        self.GAUGE.labels(resource="dns").set(0)
-
-                    # Trigger golddr-primary IF:
-                    #   Automation is enabled
-                    #   This is the Active site but DNS is not going to the Active site
-                    #   This is the Passive site and DNS is going to the Passive site
-                    if config.get('automation_enabled'):
-                        self.GAUGE.labels(resource="automation").set(1)
-
-                        check_active_site = (cluster == config.get('active_site')
-                                             and dns != config.get('active_ip'))
-
-                        check_passive_site = (cluster == config.get(
-                            'passive_site') and dns == config.get('passive_ip'))
-
-                        if check_active_site or check_passive_site:
-                            ns = config['switchover_namespace']
-
-                            cmConfig = get_configmap(ns, config['switchover_state_label_selector'], py_env)
-                            currentConfig = cmConfig.data
-                            if currentConfig['last_stable_state'] == 'active-passive':
-                              logger.warn("Transitioning to golddr-primary from active-passive")
-                              self.update_switchover_state(
-                                  None, 'golddr-primary', None, py_env)
-                            elif currentConfig['transition'] == 'golddr-primary':
-                              logger.info("Already transitioning to golddr-primary from %s" % currentConfig['last_stable_state'])
-                            elif currentConfig['last_stable_state'] == 'golddr-primary' or currentConfig['last_stable_state'] == 'gold-standby':
-                              logger.info("Already in desired state %s" % currentConfig['last_stable_state'])
-                            else:
-                              logger.warn("Ignoring auto failover %s" % currentConfig['last_stable_state'])
-                    else:
-                        self.GAUGE.labels(resource="automation").set(0)
-
-                    fwd_to_peer_q.put({"event": "from_peer", "message": item})
-
-                if item['event'] == 'from_peer':
-                    # messages from the peer will be for the following:
-                    # - item.message.event == dns
-                    # - item.message.event == transition_to (state = active-passive and gold-standby)
-                    if item['message']['event'] == 'transition_to':
-                        self.update_switchover_state(
-                            None, item['message']['state'], None, py_env)
-
-                    if item['message']['event'] == 'confirm_happy_to_proceed':
-                        logger.debug(
-                            "From peer - confirm_happy_to_proceed")
-                        
-                        # Only provide a positive confirmation if there is no transition and matches the required_state
-                        # requested by the Peer
-                        if self.last_switchover_state is not None and self.last_switchover_state['transition'] == '' and self.last_switchover_state['last_stable_state'] == item['message']['required_state']:
-                          fwd_to_peer_q.put({"event": "from_peer", "message": {
-                                "event": "yes_happy_to_proceed", "item": item['message']['item']}})
-                        else:
-                          logger.warn("From peer - confirmation FAILED - not in %s (%s)", item['message']['required_state'], self.last_switchover_state)
-
-                    if item['message']['event'] == 'yes_happy_to_proceed':
-                        logger.debug(
-                            "From peer - yes_happy_to_proceed")
-                        item = item['message']['item']
-                        item['peer_ok'] = True
-
-                if item['event'] == 'switchover_state':
-                    self.last_switchover_state = item['data']
-                    transition = item['data']['transition']
-                    self.METRIC.labels(
-                        resource="switchover_state", state=transition).inc()
-
-                    if item['data']['last_stable_state'] == "":
-                        self.update_switchover_state(
-                            'independent', None, None, py_env)
-                        continue
-
-                    if transition == '':
-                        logger.debug(
-                            "Configmap update - no transition requested")
-                        self.GAUGE.labels(resource="transition").set(0)
-
-                    elif transition != item['data']['last_stable_state']:
-                        logger.info("transitioning to %s", transition)
-                        
-                        self.GAUGE.labels(resource="transition").set(1)
-
-                        last_stable_state = item['data']['last_stable_state']
-                        # initiate a transition
-                        next_state = last_stable_state
-                        if transition == 'active-passive':
-                            if self.peer == 'error':
-                                logger.warn(
-                                    "Aborting active-passive transition - peer not reachable")
-                                self.METRIC.labels(
-                                    resource="logic", state="warning").inc()
-
-                            elif last_stable_state != 'independent' and last_stable_state != 'golddr-maintenance' and last_stable_state != 'gold-standby':
-                                logger.warn(
-                                    "Aborting active-passive transition - can not transition from %s" % last_stable_state)
-                                self.METRIC.labels(
-                                    resource="logic", state="warning").inc()
-
-                            elif cluster != config.get('active_site') and cluster != config.get('passive_site'):
-                                logger.warn(
-                                    "Aborting active-passive transition - invalid cluster config" % cluster)
-                                self.METRIC.labels(
-                                    resource="logic", state="warning").inc()
-                            elif cluster == config.get('active_site'):
-                                # is_peer_happy_to_proceed()
-                                if 'peer_ok' not in item:
-                                  fwd_to_peer_q.put({"event": "from_peer", "message": {
-                                      "event": "confirm_happy_to_proceed", "required_state": "gold-standby", "item": item}})
-                                else:
-                                  initiate_active_primary(self,
-                                                          patroni_local_url, py_env)
-
-                                  # Let the Passive peer know active-passive should happen
-                                  fwd_to_peer_q.put({"event": "from_peer", "message": {
-                                                    "event": "transition_to", "state": transition}})
-
-                                  next_state = transition
-
-                            elif cluster == config.get('passive_site'):
-
-                                work = initiate_passive_standby(self,
-                                                                py_env)
-                                if work is None:
-                                    next_state = transition
-                                else:
-                                    self.triggers.append(work)
-                                    next_state = "%s-partial" % transition
-
-                            self.update_switchover_state(
-                                next_state, '', None, py_env)
-
-                        elif transition == 'active-passive-force':
-                            if cluster == config.get('active_site'):
-                                initiate_active_primary(self,
-                                                        patroni_local_url, py_env)
-
-                                # Let the Passive peer know active-passive should happen
-                                fwd_to_peer_q.put({"event": "from_peer", "message": {
-                                                  "event": "transition_to", "state": transition}})
-
-                                next_state = 'active-passive'
-
-                            self.update_switchover_state(
-                                next_state, '', None, py_env)
-
-                        elif transition == 'gold-standby':
-
-                            if self.peer == 'error':
-                                logger.warn(
-                                    "Aborting gold-standby transition - peer not reachable")
-                                self.METRIC.labels(
-                                    resource="logic", state="warning").inc()
-
-                            elif last_stable_state != 'golddr-primary':
-                                logger.warn(
-                                    "Aborting gold-standby transition - can only transition from golddr-primary")
-                                self.METRIC.labels(
-                                    resource="logic", state="warning").inc()
-
-                            elif cluster == config.get('active_site'):
-                                # is_peer_happy_to_proceed()
-                                if 'peer_ok' not in item:
-                                  fwd_to_peer_q.put({"event": "from_peer", "message": {
-                                      "event": "confirm_happy_to_proceed", "required_state": "golddr-primary", "item": item}})
-                                else:
-                                  work = initiate_active_standby(
-                                      self, py_env)
-                                  if work is None:
-                                      next_state = transition
-                                  else:
-                                      self.triggers.append(work)
-                                      next_state = "%s-partial" % transition
-
-                                  # Let the Passive peer know gold-standby should happen
-                                  fwd_to_peer_q.put({"event": "from_peer", "message": {
-                                                    "event": "transition_to", "state": transition}})
-
-                            elif cluster == config.get('passive_site'):
-                                # do nothing - passive site is already primary
-                                # initiate_passive_primary(
-                                #     namespace, patroni_local_url, py_env)
-                                next_state = transition
-
-                            self.update_switchover_state(
-                                next_state, '', None, py_env)
-
-                        elif transition == 'golddr-primary':
-
-                            if cluster == config.get('active_site'):
-
-                                initiate_active_down(py_env)
-
-                                # Let the Passive peer know golddr-primary should happen
-                                # : if AUTOMATION_ENABLED, then GSLB should trigger this anyway on peer
-                                fwd_to_peer_q.put({"event": "from_peer", "message": {
-                                                  "event": "transition_to", "state": transition}})
-
-                                next_state = transition
-
-                            elif cluster == config.get('passive_site'):
-
-                                initiate_passive_primary(self,
-                                                         patroni_local_url, py_env)
-
-                                next_state = transition
-
-                            self.update_switchover_state(
-                                next_state, '', None, py_env)
-
-                        elif transition == 'golddr-maintenance':
+        if self.peer == 'ok':
+            self.GAUGE.labels(resource="peer").set(1)
+        else:
+            self.GAUGE.labels(resource="peer").set(0)
+
+    def _on_dns(self, item, ctx):
+        dns = item['result']
+        logger.debug("DNS resolution: %s", dns)
+        previous, self.dns = self.dns, dns
+        self._publish_digest(ctx.fwd_to_peer_q)
+        if dns != previous:
+            self._state_changed('dns', ctx)
+        if dns == config.get('active_ip'):
+            self.METRIC.labels(
+                resource="dns", state="active/%s" % dns).inc()
+            self.GAUGE.labels(resource="dns").set(1)
+
+        elif dns == config.get('passive_ip'):
+            self.METRIC.labels(
+                resource="dns", state="passive/%s" % dns).inc()
+            self.GAUGE.labels(resource="dns").set(2)
+        else:
+            self.METRIC.labels(
+                resource="dns", state="%s" % dns).inc()
+            self.GAUGE.labels(resource="dns").set(0)
+
+        # Trigger golddr-primary IF:
+        #   Automation is enabled
+        #   This is the Active site but DNS is not going to the Active site
+        #   This is the Passive site and DNS is going to the Passive site
+        if config.get('automation_enabled'):
+            self.GAUGE.labels(resource="automation").set(1)
+
+            check_active_site = (ctx.cluster == config.get('active_site')
+                                 and dns != config.get('active_ip'))
+
+            check_passive_site = (ctx.cluster == config.get(
+                'passive_site') and dns == config.get('passive_ip'))
+
+            if check_active_site or check_passive_site:
+                ns = config['switchover_namespace']
+
+                cmConfig = self._client('get_configmap')(ns, config['switchover_state_label_selector'], ctx.py_env)
+                currentConfig = cmConfig.data
+                self.trace.append("dns failover check from %s" % currentConfig['last_stable_state'])
+                if currentConfig['last_stable_state'] == 'active-passive':
+                  logger.warn("Transitioning to golddr-primary from active-passive")
+                  self.update_switchover_state(
+                      None, 'golddr-primary', None, ctx.py_env)
+                elif currentConfig['transition'] == 'golddr-primary':
+                  logger.info("Already transitioning to golddr-primary from %s" % currentConfig['last_stable_state'])
+                elif currentConfig['last_stable_state'] == 'golddr-primary' or currentConfig['last_stable_state'] == 'gold-standby':
+                  logger.info("Already in desired state %s" % currentConfig['last_stable_state'])
+                else:
+                  logger.warn("Ignoring auto failover %s" % currentConfig['last_stable_state'])
+        else:
+            self.GAUGE.labels(resource="automation").set(0)
+
+        ctx.fwd_to_peer_q.put({"event": "from_peer", "message": as_dict(item)})
+
+    def _on_from_peer(self, item, ctx):
+        # messages from the peer will be for the following:
+        # - item.message.event == dns
+        # - item.message.event == transition_to (state = active-passive and gold-standby)
+        self.trace.append("from_peer %s" % item['message']['event'])
+        if item['message']['event'] == 'peer_digest':
+            if newer(self.peer_digest, item['message']):
+                self.peer_digest = item['message']
+                self._state_changed('peer_digest', ctx)
+
+        elif item['message']['event'] == 'transition_to':
+            self.update_switchover_state(
+                None, item['message']['state'], None, ctx.py_env)
+
+        elif item['message']['event'] == 'confirm_happy_to_proceed':
+            logger.debug(
+                "From peer - confirm_happy_to_proceed")
+
+            # Only provide a positive confirmation if there is no transition and matches the required_state
+            # requested by the Peer
+            if self.last_switchover_state is not None and self.last_switchover_state['transition'] == '' and self.last_switchover_state['last_stable_state'] == item['message']['required_state']:
+              ctx.fwd_to_peer_q.put({"event": "from_peer", "message": {
+                    "event": "yes_happy_to_proceed", "item": item['message']['item']}})
+            else:
+              logger.warn("From peer - confirmation FAILED - not in %s (%s)", item['message']['required_state'], self.last_switchover_state)
+
+        elif item['message']['event'] == 'yes_happy_to_proceed':
+            logger.debug(
+                "From peer - yes_happy_to_proceed")
+            item = item['message']['item']
+            item['peer_ok'] = True
+            self._on_switchover_state(item, ctx)
+
+    def _on_switchover_state(self, item, ctx):
+        previous, self.last_switchover_state = self.last_switchover_state, item['data']
+        self._publish_digest(ctx.fwd_to_peer_q)
+        if self.last_switchover_state != previous:
+            self._state_changed('switchover_state', ctx)
+        transition = item['data']['transition']
+        self.METRIC.labels(
+            resource="switchover_state", state=transition).inc()
+
+        if item['data']['last_stable_state'] == "":
+            self.update_switchover_state(
+                'independent', None, None, ctx.py_env)
+            return
 
-                            if self.peer == 'error':
-                                logger.warn(
-                                    "Aborting golddr-maintenance transition - peer not reachable")
-                                self.METRIC.labels(
-                                    resource="logic", state="warning").inc()
-
-                            elif last_stable_state != 'active-passive':
-                                logger.warn(
-                                    "Aborting golddr-maintenance transition - can only transition from active-passive")
-                                self.METRIC.labels(
-                                    resource="logic", state="warning").inc()
-
-                            elif cluster == config.get('active_site'):
-                                # Do nothing - maintenance not currently tested for Active site
-                                next_state = transition
+        if self.job is not None and transition not in ('', self.job.transition):
+            logger.warn("Transition changed to %s - cancelling %s job %s",
+                        transition, self.job.transition, self.job.id)
+            self.trace.append("cancel job %s for %s" % (self.job.transition, transition))
+            self.job.cancel()
+            self.deferred = item
+            return
+
+        if self.job is not None:
+            logger.info("Transition job still running - %s", self.job.status())
+            return
 
-                            elif cluster == config.get('passive_site'):
-
-                                initiate_passive_maintenance(self,
-                                                              patroni_local_url, py_env)
-                                next_state = transition
-
-                            self.update_switchover_state(
-                                next_state, '', None, py_env)
+        if transition == '':
+            logger.debug(
+                "Configmap update - no transition requested")
+            self.GAUGE.labels(resource="transition").set(0)
 
-                        elif transition == 'test-ping-pong':
-                            if 'peer_ok' not in item:
-                              fwd_to_peer_q.put({"event": "from_peer", "message": {
-                                  "event": "confirm_happy_to_proceed", "required_state": "independent", "item": item}})
-                            else:
-                              logger.debug("OK, LETS DO IT!")
-                        else:
-                            logger.error(
-                                "Unsupported transition '%s'" % transition)
-                    else:
-                        logger.debug(
-                            "Configmap update - last state is already same as transition - no work to do")
-                        self.update_switchover_state(
-                            None, '', None, py_env)
+        elif transition != item['data']['last_stable_state']:
+            logger.info("transitioning to %s", transition)
+            self.trace.append("transition %s from %s" % (transition, item['data']['last_stable_state']))
+
+            self.GAUGE.labels(resource="transition").set(1)
+            self._apply_transition(item, transition, item['data']['last_stable_state'], ctx)
+        else:
+            logger.debug(
+                "Configmap update - last state is already same as transition - no work to do")
+            self.update_switchover_state(
+                None, '', None, ctx.py_env)
+
+    def _site(self, cluster: str):
+        if cluster == config.get('active_site'):
+            return ACTIVE
+        if cluster == config.get('passive_site'):
+            return PASSIVE
+        return None
+
+    def _apply_transition(self, item, transition: str, last_stable_state: str, ctx):
+        """Looks up the rule for transition at this site and, if its guards
+        pass, starts its action.  Otherwise the transition is dropped and the
+        last stable state kept."""
+        if not TABLE.supports(transition):
+            logger.error(
+                "Unsupported transition '%s'" % transition)
+            return
+
+        rule = TABLE.lookup(transition, self._site(ctx.cluster))
+        if rule is None:
+            logger.warn(
+                "Aborting %s transition - nothing to do for cluster %s" % (transition, ctx.cluster))
+            self.update_switchover_state(
+                last_stable_state, '', None, ctx.py_env)
+            return
+
+        if not self._rule_allows(rule, item, last_stable_state, ctx):
+            self.update_switchover_state(
+                last_stable_state, '', None, ctx.py_env)
+            return
+
+        if rule.action is not None:
+            values = dict(logic=self, patroni_local_url=ctx.patroni_local_url, py_env=ctx.py_env)
+            self._start_transition(ctx.bus, transition, rule.next_state, rule.action,
+                                   tuple(values[name] for name in rule.args), ctx.py_env,
+                                   ctx.fwd_to_peer_q if rule.notify_peer else None)
+        elif rule.next_state is not None:
+            self.update_switchover_state(
+                rule.next_state, '', None, ctx.py_env)
+        else:
+            logger.debug("OK, LETS DO IT!")
+
+    def _rule_allows(self, rule, item, last_stable_state: str, ctx):
+        if rule.from_states is not None and last_stable_state not in rule.from_states:
+            logger.warn(
+                "Aborting %s transition - can not transition from %s" % (rule.transition, last_stable_state))
+            self.METRIC.labels(
+                resource="logic", state="warning").inc()
+            return False
+        for guard in rule.guards:
+            if guard.name == 'peer_reachable' and self.peer == 'error':
+                logger.warn(
+                    "Aborting %s transition - peer not reachable" % rule.transition)
+                self.METRIC.labels(
+                    resource="logic", state="warning").inc()
+                return False
+            if guard.name == 'peer_state' and not self.peer_happy_to_proceed(item, guard.arg, ctx.fwd_to_peer_q):
+                return False
+        return True
+
+    def _record_event(self, item):
+        """Records an event as Logic handles it, i.e. after the bus coalesced
+        it.  Job outcomes and requeued requests are Logic's own, and replay
+        produces them itself."""
+        if item is None or self.recorder is None or item['event'] == 'transition_job':
+            return
+        if item is self.requeued:
+            self.requeued = None
+            return
+        self.recorder.event(as_dict(item))
 
-            except Exception as ex:
-                logger.error(
-                    'Unknown error in logic. %s' % ex)
-                traceback.print_exc(file=sys.stdout)
-                self.METRIC.labels(resource="logic", state="error").inc()
+    def _client(self, name: str):
+        """The function Logic calls for name, or its stand-in from stubs."""
+        if self.stubs is not None and name in self.stubs:
+            return self.stubs[name]
+        from clients.tekton import cancel_pipeline_run
+        from transitions.retry import retry_deploy
+        return dict(get_configmap=get_configmap, update_configmap=update_configmap,
+                    maintenance_on=maintenance_on, maintenance_off=maintenance_off,
+                    cancel_pipeline_run=cancel_pipeline_run, retry_deploy=retry_deploy)[name]
 
     def _now(self):
         fn = getattr(self, '_now_fn', None)
@@ -438,9 +489,9 @@ class Logic:
 
     def _on_pipeline_success(self, py_env: str):
         if self.pipeline['maintenance']:
-            maintenance_on()
+            self._client('maintenance_on')()
         else:
-            maintenance_off(py_env)
+            self._client('maintenance_off')(py_env)
         self.pipeline = self._empty_pipeline()
         release = self._transition_release()
         self.retry_state = None
@@ -491,9 +542,9 @@ class Logic:
         logger.warning(
             "Untracked pipeline succeeded for env %s — applying post-success maintenance", release)
         if self.failed_transition_maintenance:
-            maintenance_on()
+            self._client('maintenance_on')()
         else:
-            maintenance_off(py_env)
+            self._client('maintenance_off')(py_env)
         self.transition_failed = False
         self.failed_transition_maintenance = None
         self.GAUGE.labels(resource="transition").set(0)
@@ -535,23 +586,115 @@ class Logic:
         if now >= rs['retry_at']:
             self._fire_retry(rs)
 
+    def _record(self, effect: str, data: dict, job: str = None):
+        if self.recorder is not None:
+            if job is None and current_job() is not None:
+                job = current_job().id
+            self.recorder.effect(effect, self._now().timestamp(), data, job)
+
+    def _record_peer(self, message: dict):
+        # Digests only mirror state already recorded as events
+        if (message.get('message') or {}).get('event') != 'peer_digest':
+            self._record('peer', message)
+
+    def _checkpoint(self):
+        if self.journal is not None:
+            self.journal.save(snapshot(self))
+
+    def _restore(self, bus, py_env: str):
+        state = self.journal.load()
+        if state is None:
+            return
+        restore(self, state)
+        logger.warning("Restored Logic state - pipeline %s, retry %s, %d triggers",
+                       self.pipeline['event_id'], self.retry_state is not None, len(self.triggers))
+        if self.pipeline['event_id'] is not None:
+            self._reconcile_pipeline(bus, py_env)
+
+    def _reconcile_pipeline(self, bus, py_env: str):
+        """Replays the tracked PipelineRun as it is now, in case it finished
+        or got its name while Logic was down."""
+        event_id = self.pipeline['event_id']
+        try:
+            runs = list_pipeline_runs("triggers.tekton.dev/triggers-eventid=%s" % event_id, py_env)
+        except Exception as ex:
+            logger.error("Unable to reconcile PipelineRun for event %s - %s", event_id, ex)
+            return
+        logger.info("Reconciling %d PipelineRuns for event %s", len(runs), event_id)
+        for run in runs:
+            run.setdefault('kind', 'PipelineRun')
+            bus.put(stamped({"event": "kube_stream", "kind": "tekton",
+                             "data": {"type": "MODIFIED", "object": run}}))
+
+    def _schedule_deadlines(self):
+        """Registers when the pending retry, the in-flight attempt's timeout
+        and the retry cap are due, as checked by _maybe_retry, and when the
+        next trigger expires or may be retried."""
+        if self.deadlines is None:
+            self.deadlines = DeadlineScheduler(self._now)
+        rs = self.retry_state
+        pipeline = self.pipeline
+
+        if (pipeline['event_id'] is not None
+                and not pipeline.get('cancelling')
+                and pipeline.get('start_ts') is not None):
+            self.deadlines.schedule('attempt_timeout', pipeline['start_ts'] + datetime.timedelta(
+                seconds=config.get('pipeline_attempt_timeout_seconds')))
+        else:
+            self.deadlines.cancel('attempt_timeout')
+
+        if rs is not None and rs.get('retry_at') is not None:
+            self.deadlines.schedule('retry', rs['retry_at'])
+        else:
+            self.deadlines.cancel('retry')
+
+        if len(self.triggers) > 0 and self.triggers.next_deadline() is not None:
+            self.deadlines.schedule('trigger', self.triggers.next_deadline())
+        else:
+            self.deadlines.cancel('trigger')
+
+        retry_at = self.triggers.next_retry(self._now())
+        if retry_at is not None:
+            self.deadlines.schedule('trigger_retry', retry_at)
+        else:
+            self.deadlines.cancel('trigger_retry')
+
+        if rs is not None:
+            self.deadlines.schedule('retry_cap', rs['transition_started_ts'] + datetime.timedelta(
+                seconds=config.get('pipeline_retry_total_cap_seconds')))
+        else:
+            self.deadlines.cancel('retry_cap')
+
+    def _on_deadlines(self, ctx):
+        fired = self.deadlines.due()
+        now = self._now()
+        for key, when in fired:
+            logger.debug("Deadline %s due at %s", key, when)
+            self.DEADLINE_LATE.labels(deadline=key).observe(max((now - when).total_seconds(), 0))
+        if any(key == 'trigger' for key, _ in fired):
+            self._on_trigger_deadlines()
+        if any(key == 'trigger_retry' for key, _ in fired):
+            self._state_changed(None, ctx)
+        if any(key not in ('trigger', 'trigger_retry') for key, _ in fired):
+            self._maybe_retry()
+
     def _cancel_timed_out_pipeline(self):
-        from clients.tekton import cancel_pipeline_run
         name = self.pipeline['name']
         release = self._transition_release()
         logger.warning("Pipeline attempt timed out after %ss — cancelling %s",
                        config.get('pipeline_attempt_timeout_seconds'), name)
         self.PIPELINE.labels(release=release, state="Timeout").inc()
-        cancel_pipeline_run(name, config.get('py_env'))
+        self._record('cancel_pipeline', dict(name=name))
+        self._client('cancel_pipeline_run')(name, config.get('py_env'))
         self.pipeline['cancelling'] = True
 
     def _fire_retry(self, rs: dict):
-        from transitions.retry import retry_deploy
         rs['attempts_made'] += 1
         rs['retry_at'] = None
         logger.warning("Firing retry attempt %d for release %s", rs['attempts_made'], rs['release'])
         self.PIPELINE.labels(release=rs['release'], state="Retry").inc()
-        new_event_id = retry_deploy()
+        new_event_id = self._client('retry_deploy')()
+        self._record('retry', dict(event_id=new_event_id))
         rs['event_id'] = new_event_id
         self.pipeline = dict(event_id=new_event_id,
                              start_ts=self._now(),
@@ -564,10 +707,157 @@ class Logic:
             return self.retry_state['release']
         return config.get('solution_namespace') or 'unknown'
 
+    def _observe_queue(self, item, ctx):
+        if item.get('ts') is not None:
+            self.EVENT_WAIT.labels(event=item['event']).observe(max(time.time() - item['ts'], 0))
+        try:
+            self.QUEUE_DEPTH.set((0 if ctx.logic_q is None else ctx.logic_q.qsize()) + ctx.bus.qsize())
+        except NotImplementedError:
+            # multiprocessing.Queue.qsize is not available on macOS
+            self.QUEUE_DEPTH.set(ctx.bus.qsize())
+
+    def _observe_handled(self, item, started):
+        elapsed = time.monotonic() - started
+        self.EVENT_HANDLE.labels(event=item['event']).observe(elapsed)
+        if elapsed > config.get('slow_event_seconds'):
+            waited = time.time() - item['ts'] - elapsed if item.get('ts') is not None else None
+            logger.warning("Slow event %s - handled in %.2fs after waiting %s - %s", item['event'], elapsed,
+                           "?" if waited is None else "%.2fs" % waited, self.trace or "no branch recorded")
+
+    def _publish_digest(self, fwd_to_peer_q):
+        self.digest_version += 1
+        fwd_to_peer_q.put({"event": "from_peer", "message": build_digest(
+            self.digest_session, self.digest_version, self._now().timestamp(),
+            self.last_switchover_state, self.patroni, self.dns)})
+
+    def peer_happy_to_proceed(self, item: dict, required_state: str, fwd_to_peer_q):
+        """True if the peer has confirmed it is in required_state, either by
+        returning the item (peer_ok) or through a fresh peer digest.  Otherwise
+        asks the peer with confirm_happy_to_proceed - also when the digest
+        shows another state, as the peer may have moved on since."""
+        if 'peer_ok' in item:
+            return True
+        verdict = peer_confirms(self.peer_digest, self._now(),
+                                config.get('peer_digest_max_age_seconds'), required_state)
+        self.trace.append("peer digest %s" % {True: 'confirms', False: 'refuses - asking peer',
+                                              None: 'stale - asking peer'}[verdict])
+        if verdict is True:
+            logger.info("Peer digest confirms %s", required_state)
+            return True
+        if verdict is False:
+            logger.warning("Peer digest - not in %s (%s) - asking peer", required_state, self.peer_digest)
+        fwd_to_peer_q.put({"event": "from_peer", "message": {
+            "event": "confirm_happy_to_proceed", "required_state": required_state, "item": as_dict(item)}})
+        return False
+
+    def _start_job(self, bus, name: str, fn, args, on_done=None):
+        """Runs fn on a background thread; on_done(result) runs on the
+        handler thread once the job's 'transition_job' event comes back."""
+        if self.stubs is not None and 'job' in self.stubs:
+            fn = self.stubs['job'](name)
+        self.job = TransitionJob(name, fn, args, bus.put, on_done)
+        self.trace.append("job %s %s started" % (name, self.job.id))
+        self._record('job', dict(name=name), self.job.id)
+        self.job.start(background=self.background_jobs)
+        return self.job
+
+    def _start_transition(self, bus, transition: str, next_state: str, fn, args, py_env: str, fwd_to_peer_q=None):
+        """Starts fn as the job for transition.  Once it succeeds the switchover
+        state moves to next_state (or '<transition>-partial' when fn left
+        follow-up work) and, given fwd_to_peer_q, the peer is told to follow."""
+        def done(work):
+            state = next_state
+            if isinstance(work, WaitFor):
+                # Follow-up work from this transition replaces any earlier
+                self.clear_triggers()
+                self.triggers.add(work)
+                state = "%s-partial" % transition
+            if fwd_to_peer_q is not None:
+                fwd_to_peer_q.put({"event": "from_peer", "message": {
+                                  "event": "transition_to", "state": transition}})
+            self.update_switchover_state(state, '', None, py_env)
+        return self._start_job(bus, transition, fn, args, done)
+
+    def _on_job_finished(self, item, ctx):
+        job = self.job
+        if job is None or job.id != item['id']:
+            logger.debug("Ignoring event for job %s - no longer tracked", item['id'])
+            return
+        self.job = None
+        trigger, self.running_trigger = self.running_trigger, None
+        self.trace.append("job %s %s" % (job.transition, job.state))
+        partial = isinstance(job.result, WaitFor)
+        self._record('job_done', dict(state=job.state, partial=partial,
+                                      trigger=trigger_state(job.result) if partial else None,
+                                      final_state=job.result.get('state') if isinstance(job.result, dict) else None),
+                     job.id)
+        if job.state == SUCCEEDED:
+            # Jobs hand back the pipeline they started rather than setting it
+            # from their own thread
+            if isinstance(job.result, dict) and job.result.get('pipeline') is not None:
+                self.set_pipeline(job.result['pipeline'], job.id)
+            if job.on_done is not None:
+                job.on_done(job.result)
+        elif job.state == FAILED:
+            self.METRIC.labels(resource="logic", state="error").inc()
+            if trigger is not None:
+                self._retry_trigger(trigger)
+
+        # Triggers were on hold while the job ran
+        self._state_changed(None, ctx)
+
+        # A transition requested while the job ran starts now
+        if self.deferred is not None:
+            deferred, self.deferred = self.deferred, None
+            self.requeued = deferred
+            ctx.bus.put(deferred)
+
+    def _state_changed(self, key, ctx):
+        """Starts the first trigger watching key (any trigger when key is
+        None) whose condition now holds."""
+        if len(self.triggers) == 0:
+            return
+        if self.job is not None:
+            self.trace.append("triggers wait for job %s" % self.job.transition)
+            return
+        ready = self.triggers.ready(key, self._now())
+        self.trace.append("%s - %d of %d triggers ready" % (key or "any", len(ready), len(self.triggers)))
+        if len(ready) > 0:
+            trigger = ready[0]
+            # Out of the engine while it runs; it only comes back, after a
+            # backoff, if the action fails
+            self.triggers.cancel(trigger)
+            self.running_trigger = trigger
+            self._start_job(ctx.bus, trigger.action.__name__, trigger.action, trigger.args,
+                            lambda result: self._on_trigger_done(result, ctx.py_env))
+
+    def _on_trigger_done(self, result, py_env: str):
+        """A trigger's action finished the transition it was left for."""
+        self.clear_triggers()
+        if isinstance(result, dict) and result.get('state') is not None:
+            self.update_switchover_state(result['state'], '', None, py_env)
+
+    def _retry_trigger(self, trigger):
+        trigger.failures += 1
+        delay = min(config.get('trigger_retry_interval_seconds') * 2 ** (trigger.failures - 1),
+                    TRIGGER_MAX_BACKOFF_SECONDS)
+        trigger.not_before = self._now() + datetime.timedelta(seconds=delay)
+        logger.warning("Trigger %s failed (%d times) - retrying in %ds",
+                       trigger.action.__name__, trigger.failures, delay)
+        self.triggers.add(trigger)
+
+    def _on_trigger_deadlines(self):
+        for trigger in self.triggers.expired(self._now()):
+            logger.warning("Trigger %s expired at %s", trigger.action.__name__, trigger.deadline)
+            self.METRIC.labels(resource="logic", state="warning").inc()
+            if trigger.on_timeout is not None:
+                trigger.on_timeout(*trigger.timeout_args)
+
     def clear_triggers(self):
         self.triggers.clear()
+        self.running_trigger = None
 
-    def set_pipeline(self, pipeline: dict):
+    def set_pipeline(self, pipeline: dict, job: str = None):
         self.pipeline = dict[str, Any | None](
             event_id=pipeline['event_id'],
             start_ts=pipeline['start_ts'],
@@ -583,6 +873,8 @@ class Logic:
             maintenance=pipeline['maintenance'],
             release=pipeline.get('release') or config.get('solution_namespace'),
         )
+        self._record('pipeline', dict(event_id=pipeline['event_id'], maintenance=pipeline['maintenance']), job)
+        self._checkpoint()
 
     def update_switchover_state(self, last_stable_state: str, transition: str, maintenance: str, py_env: str):
         name = config['switchover_state_configmap']
@@ -594,7 +886,9 @@ class Logic:
         if transition is not None:
             data['transition'] = transition
         data['maintenance'] = maintenance
-        update_configmap(ns, name, py_env, dict(data=data))
+        self._record('switchover_state', dict(last_stable_state=last_stable_state, transition=transition,
+                                              maintenance=maintenance))
+        self._client('update_configmap')(ns, name, py_env, dict(data=data))
 
     def pick_params(self, list, keys):
         pairs = {}
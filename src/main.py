@@ -11,27 +11,30 @@ import ssl
 import pathlib
 import uvicorn
 
-from multiprocessing import Process, Queue
-
 import random
 
 from config import config
 from is_enabled import is_enabled
 from logic import Logic
-from clients.dns import dns_watch
+from clients.dns import dns_watch, dns_lookup, dns_quorum, build_resolvers
 from clients.kube import patch_secret
 from clients.kube_stream import kube_stream_watch
+from clients.kube_stream import watch_stream as tekton_watch_stream
 from clients.kube import kube_watch, restart_deployment, get_configmap
+from clients.kube import watch_stream as kube_watch_stream
 from clients.kube import scale, scale_and_wait, delete_pvc, delete_configmap
 from clients.keycloak import keycloak_service_block, keycloak_service_flow
 from clients.prom import prom_server
-from clients.tick import tick_producer
-from clients.patroni import patroni_worker, set_readonly_cluster, set_primary_cluster, set_standby_cluster
+from clients.tick import tick_producer, tick
+from clients.patroni_kube import check_kube_source
+from clients.patroni import patroni_worker, patroni_run, set_readonly_cluster, set_primary_cluster, set_standby_cluster
 from transitions.initiate_down import rollback_active_down
 from transitions.shared import maintenance_off, maintenance_on
-from peers.server import peer_server
+from peers.server import peer_server, serve_peers
 from peers.client import peer_client
 from peers.client_fwd import peer_client_fwd
+from peers.channel import peer_channel, run_peer_channel
+from runtime import Worker, queues, read_status, run_asyncio, run_processes
 
 from dotenv import dotenv_values
 
@@ -50,8 +53,12 @@ def prom_metrics():
 
 
 @app.get("/health")
-def check_health():
-    return {"status": "up"}
+def check_health(response: Response):
+    healthy, workers = read_status()
+    degraded = [name for name, worker in workers.items() if not worker['up']]
+    if not healthy:
+        response.status_code = 503
+    return {"status": "degraded" if len(degraded) > 0 else "up", "degraded": degraded, "workers": workers}
 
 
 @app.put("/rollback-active-down")
@@ -170,20 +177,12 @@ for level in log_level.split(','):
 
 logger = logging.getLogger(__name__)
 
-if __name__ == '__main__':
-
-    fastapi_proc = Process(target=fastapi)
-    fastapi_proc.start()
-
-if __name__ == '__main__':
-
-    processes = []
-    logic_q = Queue()
-    fwd_to_peer_q = Queue()
+def workers(logic_q, fwd_to_peer_q):
+    selected = []
 
     if is_enabled('logic_handler'):
         logic = Logic()
-        t = Process(target=logic.handler, args=(
+        selected.append(Worker('logic_handler', logic.handler, (
             os.environ.get("KUBE_CLUSTER"),
             os.environ.get("KUBE_NAMESPACE"),
             config.get('switchover_state_label_selector'),
@@ -191,95 +190,96 @@ if __name__ == '__main__':
             os.environ.get("PY_ENV"),
             logic_q,
             fwd_to_peer_q
-        ))
-        processes.append(t)
-
-    #t = Process(target=prom_server)
-    # processes.append(t)
+        ), None))
 
     if is_enabled('dns_watch'):
-        t = Process(target=dns_watch, args=(
+        # Fail at startup rather than never reaching a quorum
+        dns_quorum(build_resolvers(os.environ.get("DNS_SERVICE_URL", '')))
+        selected.append(Worker('dns_watch', dns_watch, (
             os.environ.get("DNS_SERVICE_URL", ''),
             os.environ.get("GSLB_DOMAIN"),
             logic_q
-        ))
-        processes.append(t)
+        ), dns_lookup))
 
     if is_enabled('kube_watch'):
-        t = Process(target=kube_watch, args=(
+        selected.append(Worker('kube_watch', kube_watch, (
             os.environ.get("KUBE_HEALTH_NAMESPACE"),
             'configmap',
             config.get("switchover_state_label_selector"),
             os.environ.get("PY_ENV"),
             logic_q
-        ))
-        processes.append(t)
+        ), kube_watch_stream))
 
     if is_enabled('tekton_watch'):
-        t = Process(target=kube_stream_watch, args=(
+        selected.append(Worker('tekton_watch', kube_stream_watch, (
             os.environ.get("KUBE_TEKTON_NAMESPACE"),
             'tekton',
             config.get('tekton_label_selector'),
             os.environ.get("PY_ENV"),
             logic_q
-        ))
-        processes.append(t)
+        ), tekton_watch_stream))
 
     if is_enabled('peer_server'):
-        t = Process(target=peer_server, args=(
+        selected.append(Worker('peer_server', peer_server, (
             os.environ.get("TLS_CA"),
             os.environ.get("TLS_LOCAL_CRT"),
             os.environ.get("TLS_LOCAL_KEY"),
             config.get('wss_server_host'),
             config.get('wss_server_port'),
-            logic_q))
-        processes.append(t)
+            logic_q), serve_peers))
 
     if is_enabled('peer_client'):
-        t = Process(target=peer_client, args=(
+        selected.append(Worker('peer_client', peer_client, (
             os.environ.get("TLS_CA"),
             os.environ.get("TLS_LOCAL_CRT"),
             os.environ.get("TLS_LOCAL_KEY"),
             os.environ.get("PEER_HOST"),
             os.environ.get("PEER_PORT"),
             logic_q
-        ))
-        processes.append(t)
+        ), None))
 
     if is_enabled('peer_client_fwd'):
-        t = Process(target=peer_client_fwd, args=(
+        selected.append(Worker('peer_client_fwd', peer_client_fwd, (
+            os.environ.get("TLS_CA"),
+            os.environ.get("TLS_LOCAL_CRT"),
+            os.environ.get("TLS_LOCAL_KEY"),
+            os.environ.get("PEER_HOST"),
+            os.environ.get("PEER_PORT"),
+            fwd_to_peer_q
+        ), None))
+
+    if is_enabled('peer_channel'):
+        selected.append(Worker('peer_channel', peer_channel, (
             os.environ.get("TLS_CA"),
             os.environ.get("TLS_LOCAL_CRT"),
             os.environ.get("TLS_LOCAL_KEY"),
             os.environ.get("PEER_HOST"),
             os.environ.get("PEER_PORT"),
+            logic_q,
             fwd_to_peer_q
-        ))
-        processes.append(t)
+        ), run_peer_channel))
 
     if is_enabled('patroni_worker'):
-        t = Process(target=patroni_worker, args=(
+        check_kube_source()
+        selected.append(Worker('patroni_worker', patroni_worker, (
             os.environ.get("PATRONI_LOCAL_API"),
             logic_q
-        ))
-        processes.append(t)
+        ), patroni_run))
 
     if is_enabled('tick_producer'):
-        t = Process(target=tick_producer, args=(logic_q,))
-        processes.append(t)
-
-    try:
-        for process in processes:
-            process.start()
-        for process in processes:
-            process.join()
-    except KeyboardInterrupt:
-        logger.error("Keyboard Exit")
-    except:
-        logger.error("Unknown error.  Exiting")
-
-    for process in processes:
-        process.terminate()
-    fastapi_proc.terminate()
+        selected.append(Worker('tick_producer', tick_producer, (logic_q,), tick))
+
+    return selected
+
+
+if __name__ == '__main__':
+
+    logic_q, fwd_to_peer_q = queues()
+
+    if config.get('runtime_mode') == 'asyncio':
+        server = uvicorn.Server(uvicorn.Config(app, host="0.0.0.0", port=8000, log_level='warning'))
+        run_asyncio(workers(logic_q, fwd_to_peer_q), server)
+    else:
+        run_processes(workers(logic_q, fwd_to_peer_q), fastapi)
 
     logger.error("All terminated.")
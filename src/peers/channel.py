@@ -0,0 +1,233 @@
+import json
+import time
+import asyncio
+import functools
+import itertools
+import logging
+import queue
+import ssl
+from prometheus_client import Counter, Gauge
+
+import websockets
+
+from peers import heartbeat
+from peers.outbox import Outbox
+from config import config
+from event_bus import stamped
+
+logger = logging.getLogger(__name__)
+
+# One long-lived websocket to the peer that carries both the heartbeat and the
+# forwarded messages.  Every request carries an 'id' that the peer echoes on
+# its reply, so several requests can be in flight on the connection at once.
+# Replies without an 'id' (older peers) are matched in order, which the peer
+# server preserves.  Forwarded messages go through an Outbox and are resent
+# until the peer acks them.
+
+RECONNECTS = Counter('switchover_peer_channel_reconnects', 'Switchover peer channel reconnects',
+                     ['reason'])
+IN_FLIGHT = Gauge('switchover_peer_channel_in_flight', 'Switchover peer channel requests awaiting a reply')
+
+REQUEST_TIMEOUT = 10
+
+
+def client_ssl_context(bundle_pem, self_crt, self_key):
+    ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    ssl_context.check_hostname = True
+    ssl_context.verify_mode = ssl.CERT_REQUIRED
+
+    ssl_context.load_cert_chain(self_crt, self_key)
+    ssl_context.load_verify_locations(bundle_pem)
+    return ssl_context
+
+
+class PeerChannel:
+    def __init__(self, uri: str, ssl_context, on_state=None):
+        self.uri = uri
+        self.ssl_context = ssl_context
+        self.on_state = on_state
+        self.websocket = None
+        self.connected = asyncio.Event()
+        self.pending = {}
+        self._ids = itertools.count(1)
+        self.state = "unknown"
+        self.last_measure = None
+
+    def _set_state(self, state: str):
+        if state != self.state:
+            self.state = state
+            if self.on_state is not None:
+                self.on_state(state)
+
+    async def send(self, message: dict):
+        """Sends message once connected and returns a future for the reply."""
+        await self.connected.wait()
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self.pending[request_id] = future
+        IN_FLIGHT.set(len(self.pending))
+        try:
+            await self.websocket.send(json.dumps(dict(message, id=request_id)))
+        except Exception:
+            self._resolve(request_id, None)
+            raise
+        logger.debug("(CHANNEL) > %s %s", request_id, message)
+        return future
+
+    async def request(self, message: dict, timeout: float = REQUEST_TIMEOUT):
+        future = await self.send(message)
+        try:
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            # A request that timed out must not be left to match a later reply
+            for request_id in [i for i, f in self.pending.items() if f is future]:
+                self._resolve(request_id, None)
+
+    def _resolve(self, request_id, reply):
+        future = self.pending.pop(request_id, None)
+        IN_FLIGHT.set(len(self.pending))
+        if future is not None and not future.done() and reply is not None:
+            future.set_result(reply)
+
+    def _on_reply(self, reply: dict):
+        request_id = reply.get('id')
+        if request_id is None and len(self.pending) > 0:
+            request_id = min(self.pending.keys())
+        self._resolve(request_id, reply)
+
+    def _fail_pending(self, error):
+        for future in self.pending.values():
+            if not future.done():
+                future.set_exception(error)
+        self.pending.clear()
+        IN_FLIGHT.set(0)
+
+    async def _read(self, websocket):
+        async for frame in websocket:
+            received = time.time()
+            reply = json.loads(frame)
+            logger.debug("(CHANNEL) < %s", reply)
+            if reply.get('event') == 'pong':
+                self.last_measure = heartbeat.measure(reply, received) or self.last_measure
+            self._on_reply(reply)
+
+    async def _heartbeat(self):
+        """Pings every interval; the peer is lost after missed_beats pings in
+        a row go unanswered within an interval."""
+        interval = config.get('peer_heartbeat_interval_seconds')
+        missed_beats = config.get('peer_heartbeat_missed_beats')
+        missed = 0
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            try:
+                await self.request(heartbeat.ping(self.last_measure), interval)
+                missed = 0
+                self._set_state("connected")
+            except asyncio.TimeoutError:
+                missed += 1
+                heartbeat.MISSED.inc()
+                logger.warning("Missed heartbeat %d of %d", missed, missed_beats)
+                if missed >= missed_beats:
+                    self._set_state("error")
+                    raise ConnectionError("%d heartbeats missed" % missed)
+            await asyncio.sleep(max(interval - (loop.time() - started), 0))
+
+    async def run(self):
+        """Keeps the connection up, reconnecting with backoff."""
+        backoff = 1
+        while True:
+            try:
+                async with websockets.connect(self.uri, ssl=self.ssl_context) as websocket:
+                    logger.info("Connected to %s", self.uri)
+                    self.websocket = websocket
+                    self.connected.set()
+                    backoff = 1
+                    reader = asyncio.ensure_future(self._read(websocket))
+                    beats = asyncio.ensure_future(self._heartbeat())
+                    done, _ = await asyncio.wait([reader, beats], return_when=asyncio.FIRST_COMPLETED)
+                    reader.cancel()
+                    beats.cancel()
+                    for task in done:
+                        task.result()
+                RECONNECTS.labels(reason='closed').inc()
+            except asyncio.CancelledError:
+                raise
+            except Exception as ex:
+                logger.error("Peer channel failure - %s", repr(ex))
+                RECONNECTS.labels(reason=type(ex).__name__).inc()
+                self._set_state("error")
+            finally:
+                self.connected.clear()
+                self.websocket = None
+                self._fail_pending(ConnectionError("peer channel closed"))
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+
+
+async def forward(channel: PeerChannel, fwd_to_peer_q, outbox: Outbox):
+    """Delivers queued messages through the outbox.  Messages are pipelined
+    without waiting for each ack, and anything not acknowledged is resent
+    once the channel is back."""
+    loop = asyncio.get_running_loop()
+    wake = asyncio.Event()
+
+    async def pump():
+        while True:
+            try:
+                # Bounded so the executor thread is released once cancelled
+                msg = await loop.run_in_executor(None, functools.partial(fwd_to_peer_q.get, timeout=1))
+            except queue.Empty:
+                continue
+            if msg is not None:
+                outbox.put(msg)
+                wake.set()
+
+    def on_reply(seq, future):
+        if not future.cancelled() and future.exception() is None and future.result().get('ack', seq) == seq:
+            outbox.ack(seq)
+        else:
+            outbox.resend(seq)
+            wake.set()
+
+    loop.create_task(pump())
+    while True:
+        await channel.connected.wait()
+        wake.clear()
+        outbox.expire()
+        for entry in outbox.unsent():
+            try:
+                future = await channel.send(outbox.envelope(entry))
+            except Exception as ex:
+                logger.warning("Forwarding %s failed (%s) - will resend", entry.seq, repr(ex))
+                break
+            outbox.mark_sent(entry.seq)
+            future.add_done_callback(functools.partial(on_reply, entry.seq))
+        try:
+            await asyncio.wait_for(wake.wait(), 1)
+        except asyncio.TimeoutError:
+            pass
+
+
+def peer_channel(bundle_pem, self_crt, self_key, peer_host, peer_port, logic_q, fwd_to_peer_q):
+    new_loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(new_loop)
+    new_loop.run_until_complete(run_peer_channel(
+        bundle_pem, self_crt, self_key, peer_host, peer_port, logic_q, fwd_to_peer_q))
+
+
+async def run_peer_channel(bundle_pem, self_crt, self_key, peer_host, peer_port, logic_q, fwd_to_peer_q):
+
+    GAUGE = Gauge('switchover_peer', 'Switchover Peer Status',
+                  ['state']).labels(state="active")
+
+    def on_state(state):
+        GAUGE.set(1 if state == 'connected' else 0)
+        logic_q.put(stamped({"event": "peer", "state": "ok" if state == 'connected' else "error"}))
+
+    ssl_context = client_ssl_context(bundle_pem, self_crt, self_key)
+
+    logger.info("Starting WS Channel to %s:%s" % (peer_host, peer_port))
+    channel = PeerChannel('wss://%s:%s' % (peer_host, peer_port), ssl_context, on_state)
+    outbox = Outbox(config.get('peer_outbox_ttl_seconds'), config.get('peer_outbox_max_depth'))
+    await asyncio.gather(channel.run(), forward(channel, fwd_to_peer_q, outbox))
@@ -14,6 +14,7 @@ import websockets
 import threading
 
 import random
+from event_bus import stamped
 
 logger = logging.getLogger(__name__)
 
@@ -38,10 +39,10 @@ async def hello_client(ssl_context, peer_host, peer_port, logic_q, GAUGE):
                     logger.debug("(CLIENT) < {}".format(greeting))
 
                     if last_state != 'connected':
-                        logic_q.put({"event": "peer", "state": "ok"})
+                        logic_q.put(stamped({"event": "peer", "state": "ok"}))
                         last_state = 'connected'
 
-                    time.sleep(5)
+                    await asyncio.sleep(5)
 
         except websockets.exceptions.ConnectionClosedOK:
             logger.info("WS Closed")
@@ -49,24 +50,24 @@ async def hello_client(ssl_context, peer_host, peer_port, logic_q, GAUGE):
             logger.error("Connection closing error")
             GAUGE.set(0)
             if last_state != 'error':
-                logic_q.put({"event": "peer", "state": "error"})
+                logic_q.put(stamped({"event": "peer", "state": "error"}))
                 last_state = 'error'
-            time.sleep(2)
+            await asyncio.sleep(2)
         except ConnectionRefusedError:
             logger.error("Connection refused")
             GAUGE.set(0)
             if last_state != 'error':
-                logic_q.put({"event": "peer", "state": "error"})
+                logic_q.put(stamped({"event": "peer", "state": "error"}))
                 last_state = 'error'
-            time.sleep(2)
+            await asyncio.sleep(2)
         except:
             traceback.print_exc(file=sys.stdout)
             logger.error("Unknown failure")
             GAUGE.set(0)
             if last_state != 'error':
-                logic_q.put({"event": "peer", "state": "error"})
+                logic_q.put(stamped({"event": "peer", "state": "error"}))
                 last_state = 'error'
-            time.sleep(2)
+            await asyncio.sleep(2)
 
 
 def peer_client(bundle_pem, self_crt, self_key, peer_host, peer_port, logic_q):
@@ -0,0 +1,42 @@
+import datetime
+
+# A compact snapshot of this agent's state that is pushed to the peer whenever
+# it changes (and on every tick), so the peer can check preconditions against
+# a recent local copy instead of a confirm_happy_to_proceed round trip.
+#
+#   {"event": "peer_digest", "session": "..", "version": 12, "ts": 1767225600.0,
+#    "last_stable_state": "gold-standby", "transition": "",
+#    "patroni_role": "standby_leader", "dns": "142.34.1.1"}
+#
+# 'ts' is when the digest was built, so one that sat in the outbox is aged
+# from then rather than from when it finally arrived.
+
+
+def build_digest(session: str, version: int, ts: float, switchover_state: dict, patroni: dict, dns: str):
+    switchover_state = switchover_state or {}
+    return dict(
+        event="peer_digest",
+        session=session,
+        version=version,
+        ts=ts,
+        last_stable_state=switchover_state.get('last_stable_state'),
+        transition=switchover_state.get('transition'),
+        patroni_role=(patroni.get('leader') or {}).get('role') if patroni.get('control') == 'up' else None,
+        dns=dns,
+    )
+
+
+def newer(current: dict, candidate: dict):
+    """Digests can arrive out of order after a reconnect; a new session means
+    the peer restarted and starts counting again."""
+    if current is None or current['session'] != candidate['session']:
+        return True
+    return candidate['version'] > current['version']
+
+
+def peer_confirms(digest: dict, now: datetime.datetime, max_age: float, required_state: str):
+    """True or False when a fresh digest answers whether the peer is settled in
+    required_state, None when there is no fresh digest to go by."""
+    if digest is None or digest.get('ts') is None or now.timestamp() - digest['ts'] > max_age:
+        return None
+    return digest['transition'] == '' and digest['last_stable_state'] == required_state
@@ -0,0 +1,46 @@
+import time
+from prometheus_client import Counter, Gauge, Histogram
+
+# Heartbeat timestamps, NTP style:
+#   t0 - client sends the ping      t1 - peer receives it
+#   t2 - peer sends the pong        t3 - client receives the pong
+# rtt is the time on the wire, excluding the peer's processing time, and
+# offset is how far the peer's clock is ahead of ours.  The client includes
+# its latest measurement on the next ping so the peer can export it too.
+
+RTT = Histogram('switchover_peer_rtt_seconds', 'Switchover peer heartbeat round-trip time',
+                ['observer'],
+                buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5))
+SKEW = Gauge('switchover_peer_clock_skew_seconds', 'Switchover estimated peer clock offset',
+             ['observer'])
+MISSED = Counter('switchover_peer_missed_heartbeats', 'Switchover peer heartbeats without a timely reply')
+
+
+def ping(last=None):
+    message = {"event": "ping", "t0": time.time()}
+    if last is not None:
+        message['rtt'], message['offset'] = last
+    return message
+
+
+def pong(ping_message: dict, received: float):
+    reply = {"event": "pong"}
+    if 't0' in ping_message:
+        reply.update(t0=ping_message['t0'], t1=received, t2=time.time())
+    if 'rtt' in ping_message:
+        # The client's view; its offset is the inverse of ours
+        RTT.labels(observer='peer').observe(ping_message['rtt'])
+        SKEW.labels(observer='peer').set(-ping_message['offset'])
+    return reply
+
+
+def measure(reply: dict, received: float):
+    """Returns (rtt, offset) for a pong, or None if it carries no timestamps."""
+    if 't2' not in reply:
+        return None
+    t0, t1, t2, t3 = reply['t0'], reply['t1'], reply['t2'], received
+    rtt = max((t3 - t0) - (t2 - t1), 0)
+    offset = ((t1 - t0) + (t2 - t3)) / 2
+    RTT.labels(observer='self').observe(rtt)
+    SKEW.labels(observer='self').set(offset)
+    return rtt, offset
@@ -0,0 +1,128 @@
+import time
+import uuid
+import logging
+from collections import OrderedDict, deque
+from prometheus_client import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+# Messages waiting to be delivered to the peer.  Each message gets a sequence
+# number and stays in the outbox until the peer acknowledges it, so nothing is
+# lost across reconnects.  Messages that supersede an earlier one (only the
+# latest DNS result or peer digest matters) replace it, and messages older than the TTL are
+# dropped rather than replayed to a peer that has moved on.
+
+DEPTH = Gauge('switchover_peer_outbox_depth', 'Switchover peer outbox messages awaiting an ack')
+AGE = Gauge('switchover_peer_outbox_oldest_age_seconds', 'Switchover age of the oldest message in the peer outbox')
+MESSAGES = Counter('switchover_peer_outbox_messages', 'Switchover peer outbox message outcomes',
+                   ['event', 'result'])
+
+COALESCED = ('dns', 'peer_digest')
+
+
+def coalesce_key(msg: dict):
+    """Messages with the same key supersede each other; None never coalesces."""
+    inner = msg.get('message') or {}
+    if msg.get('event') == 'from_peer' and inner.get('event') in COALESCED:
+        return inner['event']
+    return None
+
+
+def _event(msg: dict):
+    return (msg.get('message') or {}).get('event', msg.get('event'))
+
+
+class Entry:
+    __slots__ = ('seq', 'msg', 'key', 'enqueued', 'sent')
+
+    def __init__(self, seq: int, msg: dict, key, enqueued: float):
+        self.seq = seq
+        self.msg = msg
+        self.key = key
+        self.enqueued = enqueued
+        self.sent = False
+
+
+class Outbox:
+    def __init__(self, ttl: float, max_depth: int, now_fn=time.monotonic):
+        self.ttl = ttl
+        self.max_depth = max_depth
+        self._now_fn = now_fn
+        # Lets the peer tell a restarted agent's sequence numbers apart
+        self.session = uuid.uuid4().hex
+        self.entries = OrderedDict()
+        self._seq = 0
+
+    def put(self, msg: dict):
+        key = coalesce_key(msg)
+        if key is not None:
+            for entry in [e for e in self.entries.values() if e.key == key]:
+                del self.entries[entry.seq]
+                MESSAGES.labels(event=_event(entry.msg), result='coalesced').inc()
+        self._seq += 1
+        self.entries[self._seq] = Entry(self._seq, msg, key, self._now_fn())
+        while len(self.entries) > self.max_depth:
+            _, entry = self.entries.popitem(last=False)
+            logger.warning("Outbox full - dropping %s %d", _event(entry.msg), entry.seq)
+            MESSAGES.labels(event=_event(entry.msg), result='dropped').inc()
+        self._update_metrics()
+        return self._seq
+
+    def expire(self):
+        now = self._now_fn()
+        for entry in [e for e in self.entries.values() if now - e.enqueued > self.ttl]:
+            del self.entries[entry.seq]
+            logger.warning("Outbox expired %s %d", _event(entry.msg), entry.seq)
+            MESSAGES.labels(event=_event(entry.msg), result='expired').inc()
+        self._update_metrics()
+
+    def unsent(self):
+        return [entry for entry in self.entries.values() if not entry.sent]
+
+    def envelope(self, entry: Entry):
+        return dict(entry.msg, seq=entry.seq, session=self.session)
+
+    def mark_sent(self, seq: int):
+        if seq in self.entries:
+            self.entries[seq].sent = True
+            MESSAGES.labels(event=_event(self.entries[seq].msg), result='sent').inc()
+
+    def ack(self, seq: int):
+        entry = self.entries.pop(seq, None)
+        if entry is not None:
+            MESSAGES.labels(event=_event(entry.msg), result='acked').inc()
+        self._update_metrics()
+
+    def resend(self, seq: int):
+        """Queues an unacknowledged message to be sent again."""
+        if seq in self.entries:
+            self.entries[seq].sent = False
+
+    def _update_metrics(self):
+        DEPTH.set(len(self.entries))
+        if len(self.entries) == 0:
+            AGE.set(0)
+        else:
+            AGE.set(self._now_fn() - next(iter(self.entries.values())).enqueued)
+
+
+class Deduplicator:
+    """Peer side: remembers recently delivered (session, seq) pairs so a
+    message resent after a lost ack is only acted on once."""
+
+    def __init__(self, size: int = 1000):
+        self.seen = set()
+        self.order = deque()
+        self.size = size
+
+    def first_time(self, session: str, seq: int):
+        if seq is None:
+            return True
+        key = (session, seq)
+        if key in self.seen:
+            return False
+        self.seen.add(key)
+        self.order.append(key)
+        if len(self.order) > self.size:
+            self.seen.discard(self.order.popleft())
+        return True
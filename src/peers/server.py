@@ -11,41 +11,62 @@ import functools
 
 import websockets
 
+from peers import heartbeat
+from peers.outbox import Deduplicator
+
 import threading
 
 import random
+from event_bus import stamped
 
 logger = logging.getLogger(__name__)
 
 
-async def hello(websocket, path, q):
+async def hello(websocket, path, q, dedup=None):
     while True:
         try:
             message_str = await websocket.recv()
+            received = time.time()
         except websockets.ConnectionClosed:
             logger.warn(f"Terminated")
             break
         logger.debug("(SERVER) < {}".format(message_str))
 
         message = json.loads(message_str)
+        # Echo the request id so a peer channel can match replies to
+        # pipelined requests
+        request_id = message.pop('id', None)
+        seq = message.pop('seq', None)
+        session = message.pop('session', None)
         if message['event'] == 'from_peer':
-            q.put(message)
-        greeting = {"event": "pong"}
+            if dedup is None or dedup.first_time(session, seq):
+                q.put(stamped(message))
+            else:
+                logger.info("Ignoring redelivered message %s", seq)
+        greeting = heartbeat.pong(message, received)
+        if request_id is not None:
+            greeting['id'] = request_id
+        if seq is not None:
+            # Acknowledge only once the message has been handed to Logic
+            greeting['ack'] = seq
         await websocket.send(json.dumps(greeting))
         logger.debug("(SERVER) > {}".format(greeting))
 
 
 def peer_server(bundle_pem, self_crt, self_key, listen_host, listen_port, q):
+    new_loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(new_loop)
+    new_loop.run_until_complete(serve_peers(
+        bundle_pem, self_crt, self_key, listen_host, listen_port, q))
+
+
+async def serve_peers(bundle_pem, self_crt, self_key, listen_host, listen_port, q):
     logger.info("Starting WS Server on %s:%s" % (listen_host, listen_port))
     ssl_context = ssl.SSLContext(
         ssl.PROTOCOL_TLS_SERVER, verify_mode=ssl.CERT_REQUIRED)
     ssl_context.load_cert_chain(self_crt, self_key)
     ssl_context.load_verify_locations(bundle_pem)
 
-    new_loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(new_loop)
-    start_server = websockets.serve(
-        functools.partial(hello, q=q), listen_host, listen_port, ssl=ssl_context)
-
-    new_loop.run_until_complete(start_server)
-    new_loop.run_forever()
+    async with websockets.serve(
+            functools.partial(hello, q=q, dedup=Deduplicator()), listen_host, listen_port, ssl=ssl_context):
+        await asyncio.Future()
@@ -0,0 +1,76 @@
+import json
+import logging
+import threading
+import time
+from prometheus_client import Counter
+
+logger = logging.getLogger(__name__)
+
+# An append-only JSON lines recording of what Logic saw and did, for
+# replaying a production incident through Logic.handler (see replay.py).
+#
+#   {"kind": "event", "t": 1767225600.1, "item": {"event": "dns", "result": "..", "ts": ..}}
+#   {"kind": "effect", "t": 1767225600.2, "effect": "switchover_state",
+#    "data": {"last_stable_state": null, "transition": "golddr-primary", "maintenance": null}, "job": null}
+#
+# Events are recorded as Logic takes them off its bus, so superseded events
+# the bus coalesced away are not.  't' is when Logic took the event (producers'
+# own timestamps stay in the item as 'ts') or, for effects, Logic's clock when it acted.  'job' is the
+# transition job an effect happened in, if any.
+#
+# Effects: switchover_state, peer, job, job_done, pipeline, retry,
+# cancel_pipeline.
+
+RECORDED = Counter('switchover_recorded', 'Switchover events and effects recorded', ['kind'])
+
+
+class Recorder:
+    """Appends to path, or keeps entries in memory when path is None."""
+
+    def __init__(self, path: str = None):
+        self.path = path
+        self.entries = []
+        self._lock = threading.Lock()
+        self._file = open(path, 'a', buffering=1) if path else None
+
+    def _write(self, entry: dict):
+        with self._lock:
+            if self._file is None:
+                self.entries.append(entry)
+                return
+            try:
+                self._file.write(json.dumps(entry, default=str) + "\n")
+            except (OSError, TypeError, ValueError) as ex:
+                logger.warning("Unable to record %s - %s", entry.get('kind'), ex)
+                return
+        RECORDED.labels(kind=entry['kind']).inc()
+
+    def event(self, item: dict):
+        self._write(dict(kind="event", t=time.time(), item=item))
+
+    def effect(self, name: str, t: float, data, job: str = None):
+        self._write(dict(kind="effect", t=t, effect=name, data=data, job=job))
+
+
+class Tapped:
+    """A queue whose puts are also passed to tap, e.g. to record messages
+    forwarded to the peer."""
+
+    def __init__(self, q, tap):
+        self.q = q
+        self.tap = tap
+
+    def put(self, item, *args, **kwargs):
+        self.tap(item)
+        return self.q.put(item, *args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.q, name)
+
+
+def load(path: str):
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
@@ -0,0 +1,212 @@
+import argparse
+import copy
+import datetime
+import json
+import logging
+import os
+import queue
+import sys
+import time
+from collections import defaultdict, deque
+from types import SimpleNamespace
+from event_bus import Event, EventBus
+from logic import Logic
+from recorder import Recorder, load
+from checkpoint import restore_trigger
+from config import config
+from transitions.initiate_standby import complete_standby, initiate_active_standby, initiate_passive_standby
+from transitions.jobs import Cancelled, CANCELLED, FAILED, SUCCEEDED
+from transitions.table import TRANSITIONS
+from transitions.wait_for import WaitFor
+
+logger = logging.getLogger(__name__)
+
+# Replays a recording made with RECORD_FILE through Logic, to check decision
+# logic against a real incident's timing:
+#
+#   python src/replay.py switchover-recording.jsonl --cluster gold
+#
+# Events are handled in the order Logic took them, with Logic's clock
+# (_now_fn) set to when each was taken, and deadlines fire at their exact due
+# time in between.  Nothing waits unless --speed is given, so hours of
+# recording replay in seconds.
+#
+# Kubernetes, Tekton, Patroni and the peer are stubbed through Logic.stubs.
+# Transition jobs run inline and repeat what the recorded job at the same
+# position did (the pipeline it started, the state it finished in, whether
+# it failed or left the transition partial, and with what trigger), and retries get the Tekton
+# event ids that were recorded.  The effects Logic
+# produces are compared with the recorded ones.
+
+
+class ReplayClock:
+    def __init__(self, t: float):
+        self.t = t
+
+    def __call__(self):
+        return datetime.datetime.fromtimestamp(self.t)
+
+    def set(self, t: float):
+        # Producers' clocks can be slightly out of step; time never goes back
+        self.t = max(self.t, t)
+
+
+class RecordedJobs:
+    """Stands in for transition jobs, the n-th replayed job repeating the
+    n-th recorded one."""
+
+    def __init__(self, recorded, logic, py_env: str):
+        self.logic = logic
+        self.py_env = py_env
+        self.ids = deque(e['job'] for e in recorded if e['effect'] == 'job')
+        self.pipelines = defaultdict(list)
+        self.outcomes = {}
+        for e in recorded:
+            if e['effect'] == 'pipeline' and e['job'] is not None:
+                self.pipelines[e['job']].append(e['data'])
+            if e['effect'] == 'job_done':
+                self.outcomes[e['job']] = e['data']
+
+    def stub(self, name: str):
+        job_id = self.ids.popleft() if len(self.ids) > 0 else None
+        outcome = self.outcomes.get(job_id, dict(state=SUCCEEDED, partial=False))
+
+        def run(*args):
+            if outcome['state'] == CANCELLED:
+                raise Cancelled()
+            if outcome['state'] == FAILED:
+                raise Exception("recorded %s job failed" % name)
+            if outcome.get('trigger') is not None:
+                return restore_trigger(self.logic, outcome['trigger'])
+            if outcome['partial']:
+                return self._standby_trigger(name)
+            pipelines = self.pipelines[job_id]
+            if len(pipelines) == 0 and outcome.get('final_state') is None:
+                return None
+            return dict(pipeline=dict(pipelines[-1], start_ts=self.logic._now()) if len(pipelines) > 0 else None,
+                        state=outcome.get('final_state'))
+        run.__name__ = name
+        return run
+
+    def _standby_trigger(self, name: str):
+        """Recordings made before job_done carried the trigger only say the
+        standby transition was left partial; rebuild the trigger
+        initiate_standby leaves, without its deadline."""
+        final_state = next((r.next_state for r in TRANSITIONS if r.transition == name and
+                            r.action in (initiate_active_standby, initiate_passive_standby)), name)
+        logger.warning("No trigger recorded for partial %s job - replaying it without a deadline", name)
+        return WaitFor().watching('patroni').wait_until(self.logic.patroni_has_no_standby_concerns).then_trigger(
+            complete_standby, self.logic, config.get('solution_namespace'), self.py_env, final_state)
+
+
+def _retry_ids(recorded):
+    ids = deque(e['data']['event_id'] for e in recorded if e['effect'] == 'retry')
+    return lambda: ids.popleft() if len(ids) > 0 else "replay-retry"
+
+
+def _ignore(*args):
+    return None
+
+
+def _drain(logic, bus, ctx):
+    """Handles what Logic queued for itself, e.g. finished jobs."""
+    item = bus.get(0)
+    while item is not None:
+        logic.handle(item, ctx)
+        item = bus.get(0)
+
+
+def replay(entries, cluster: str, namespace: str = None, patroni_local_url: str = None,
+           py_env: str = "replay", speed: float = 0):
+    events = [e for e in entries if e['kind'] == 'event']
+    recorded = [e for e in entries if e['kind'] == 'effect']
+
+    clock = ReplayClock(events[0]['t'] if len(events) > 0 else time.time())
+    logic = Logic()
+    logic._now_fn = clock
+    logic.recorder = Recorder()
+    logic.clear_triggers()
+    bus = EventBus()
+    ctx = logic.context(cluster, namespace, patroni_local_url, py_env, queue.Queue(), bus)
+    jobs = RecordedJobs(recorded, logic, py_env)
+
+    logic.stubs = dict(
+        job=jobs.stub,
+        get_configmap=lambda *args: SimpleNamespace(data=logic.last_switchover_state or {}),
+        update_configmap=_ignore,
+        maintenance_on=_ignore,
+        maintenance_off=_ignore,
+        cancel_pipeline_run=_ignore,
+        retry_deploy=_retry_ids(recorded),
+    )
+    logic.background_jobs = False
+
+    started = time.monotonic()
+    logic._schedule_deadlines()
+    previous = clock.t
+    for entry in events:
+        while True:
+            when = logic.deadlines.next_deadline()
+            if when is None or when.timestamp() > entry['t']:
+                break
+            clock.set(when.timestamp())
+            logic.handle(None, ctx)
+            _drain(logic, bus, ctx)
+
+        if speed > 0:
+            time.sleep(max(entry['t'] - previous, 0) / speed)
+        previous = entry['t']
+        clock.set(entry['t'])
+        logic.handle(Event.from_dict(copy.deepcopy(entry['item'])), ctx)
+        _drain(logic, bus, ctx)
+
+    return dict(
+        logic=logic,
+        events=len(events),
+        recorded=recorded,
+        replayed=logic.recorder.entries,
+        wall_seconds=time.monotonic() - started,
+        recorded_seconds=events[-1]['t'] - events[0]['t'] if len(events) > 0 else 0,
+    )
+
+
+def _comparable(effect: dict):
+    return (effect['effect'], json.loads(json.dumps(effect['data'], default=str)))
+
+
+def first_difference(recorded, replayed):
+    """Index of the first effect that differs, or None if they all match."""
+    for i in range(max(len(recorded), len(replayed))):
+        if i >= len(recorded) or i >= len(replayed) or _comparable(recorded[i]) != _comparable(replayed[i]):
+            return i
+    return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a RECORD_FILE recording through Logic")
+    parser.add_argument('recording')
+    parser.add_argument('--cluster', default=os.environ.get("KUBE_CLUSTER"),
+                        help="site to replay as (default: KUBE_CLUSTER)")
+    parser.add_argument('--speed', type=float, default=0,
+                        help="pace events at this multiple of real time (default: 0, no waiting)")
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.WARNING)
+    result = replay(list(load(args.recording)), args.cluster, speed=args.speed)
+
+    recorded, replayed = result['recorded'], result['replayed']
+    print("%d events covering %.1fs replayed in %.3fs - %d effects recorded, %d replayed" % (
+        result['events'], result['recorded_seconds'], result['wall_seconds'], len(recorded), len(replayed)))
+    i = first_difference(recorded, replayed)
+    if i is None:
+        print("Replay matches the recording")
+        return 0
+    print("First difference at effect %d" % i)
+    print("  recorded: %s" % (recorded[i] if i < len(recorded) else "-"))
+    print("  replayed: %s" % (replayed[i] if i < len(replayed) else "-"))
+    return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,218 @@
+import asyncio
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import Process
+from prometheus_client import Counter, Gauge
+from config import config
+
+logger = logging.getLogger(__name__)
+
+# How the workers selected by PROCESS_LIST are run.
+#
+#   process - one OS process per worker, talking over multiprocessing Queues
+#   asyncio - every worker on one event loop in a single process, talking over
+#             in-memory queues (no pickling); workers that only exist as
+#             blocking functions get a thread each, and blocking calls made
+#             from the loop share a bounded default executor
+#
+# A Worker names the blocking entrypoint and, where there is one, the
+# coroutine that does the same work on an existing loop.
+
+Worker = namedtuple('Worker', ['name', 'target', 'args', 'coroutine'])
+
+# Every worker is supervised: when it exits it is restarted after an
+# exponential backoff, which resets once the worker has stayed up for
+# STABLE_SECONDS.  Worker status is written to a small JSON file that /health
+# reads, since in process mode FastAPI runs in a process of its own.
+
+RESTARTS = Counter('switchover_worker_restarts', 'Switchover worker restarts', ['worker'])
+UP = Gauge('switchover_worker_up', 'Switchover worker is running', ['worker'])
+
+STABLE_SECONDS = 60
+MAX_BACKOFF_SECONDS = 60
+STATUS_INTERVAL_SECONDS = 1
+# A status file not rewritten for this many intervals means the supervisor
+# itself has died or hung
+STATUS_STALE_INTERVALS = 5
+
+_started = time.time()
+
+
+class Supervised:
+    def __init__(self, worker: Worker, now_fn=time.monotonic):
+        self.worker = worker
+        self._now_fn = now_fn
+        self.restarts = 0
+        self.failures = 0
+        self.started = None
+        self.down_since = None
+        self.last_exit = None
+
+    def mark_started(self):
+        self.started = self._now_fn()
+        self.down_since = None
+        UP.labels(worker=self.worker.name).set(1)
+
+    def mark_exited(self, reason: str):
+        """Records the exit and returns how long to wait before restarting."""
+        now = self._now_fn()
+        if self.started is not None and now - self.started >= STABLE_SECONDS:
+            self.failures = 0
+        self.failures += 1
+        self.restarts += 1
+        self.started = None
+        self.down_since = now
+        self.last_exit = reason
+        UP.labels(worker=self.worker.name).set(0)
+        RESTARTS.labels(worker=self.worker.name).inc()
+        backoff = min(2 ** (self.failures - 1), MAX_BACKOFF_SECONDS)
+        logger.error("Worker %s exited (%s) - restarting in %ds", self.worker.name, reason, backoff)
+        return backoff
+
+    def status(self):
+        now = self._now_fn()
+        return dict(
+            up=self.started is not None,
+            restarts=self.restarts,
+            uptime_seconds=None if self.started is None else round(now - self.started),
+            down_seconds=None if self.down_since is None else round(now - self.down_since),
+            last_exit=self.last_exit)
+
+
+def write_status(supervised, now_fn=time.time):
+    path = config.get('worker_status_file')
+    status = dict(written=now_fn(), workers=dict((sup.worker.name, sup.status()) for sup in supervised))
+    try:
+        with open(path + '.tmp', 'w') as f:
+            json.dump(status, f)
+        os.replace(path + '.tmp', path)
+    except OSError as ex:
+        logger.warning("Unable to write worker status - %s", ex)
+
+
+def read_status(now_fn=time.time):
+    """Returns (healthy, workers) for /health; healthy is False once any worker
+    has been down for longer than the grace period, or the supervisor has
+    stopped writing the status (or never wrote it) for that long."""
+    grace = config.get('worker_down_grace_seconds')
+    now = now_fn()
+    try:
+        with open(config.get('worker_status_file')) as f:
+            status = json.load(f)
+    except (OSError, ValueError):
+        return now - _started <= grace, {}
+    age = now - status['written']
+    if age > STATUS_INTERVAL_SECONDS * STATUS_STALE_INTERVALS:
+        logger.warning("Worker status last written %.0fs ago", age)
+        return False, status['workers']
+    workers = status['workers']
+    healthy = all(w['up'] or (w['down_seconds'] or 0) <= grace for w in workers.values())
+    return healthy, workers
+
+
+def queues():
+    if config.get('runtime_mode') == 'asyncio':
+        return queue.Queue(), queue.Queue()
+    from multiprocessing import Queue
+    return Queue(), Queue()
+
+
+def run_processes(workers, fastapi):
+    fastapi_proc = Process(target=fastapi)
+    fastapi_proc.start()
+
+    supervised = [Supervised(worker) for worker in workers]
+    processes = {}
+    restart_at = {}
+
+    def start(sup):
+        process = Process(target=sup.worker.target, args=sup.worker.args, name=sup.worker.name)
+        process.start()
+        processes[sup.worker.name] = process
+        sup.mark_started()
+
+    try:
+        for sup in supervised:
+            start(sup)
+        while True:
+            now = time.monotonic()
+            for sup in supervised:
+                name = sup.worker.name
+                if name in restart_at:
+                    if now >= restart_at[name]:
+                        del restart_at[name]
+                        start(sup)
+                elif not processes[name].is_alive():
+                    backoff = sup.mark_exited("exit code %s" % processes[name].exitcode)
+                    restart_at[name] = now + backoff
+            write_status(supervised)
+            time.sleep(STATUS_INTERVAL_SECONDS)
+    except KeyboardInterrupt:
+        logger.error("Keyboard Exit")
+    except:
+        logger.error("Unknown error.  Exiting")
+
+    for process in processes.values():
+        process.terminate()
+    fastapi_proc.terminate()
+
+
+async def _in_thread(worker: Worker):
+    thread = threading.Thread(target=worker.target, args=worker.args, daemon=True, name=worker.name)
+    thread.start()
+    while thread.is_alive():
+        await asyncio.sleep(1)
+    raise Exception("Worker %s exited" % worker.name)
+
+
+async def _supervise(sup: Supervised):
+    worker = sup.worker
+    while True:
+        sup.mark_started()
+        try:
+            if worker.coroutine is not None:
+                await worker.coroutine(*worker.args)
+            else:
+                await _in_thread(worker)
+            reason = "finished"
+        except asyncio.CancelledError:
+            raise
+        except Exception as ex:
+            reason = repr(ex)
+        await asyncio.sleep(sup.mark_exited(reason))
+
+
+async def _report(supervised):
+    while True:
+        write_status(supervised)
+        await asyncio.sleep(STATUS_INTERVAL_SECONDS)
+
+
+async def run_tasks(workers, server):
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(
+        max_workers=config.get('runtime_threads'), thread_name_prefix='runtime'))
+
+    supervised = [Supervised(worker) for worker in workers]
+    tasks = [loop.create_task(_supervise(sup), name=sup.worker.name) for sup in supervised]
+    tasks.append(loop.create_task(_report(supervised), name='status'))
+
+    logger.info("Running %s on one event loop", sorted(sup.worker.name for sup in supervised))
+    try:
+        await server.serve()
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def run_asyncio(workers, server):
+    try:
+        asyncio.run(run_tasks(workers, server))
+    except KeyboardInterrupt:
+        logger.error("Keyboard Exit")
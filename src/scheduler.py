@@ -0,0 +1,58 @@
+import heapq
+
+# Deadlines Logic.handler has to wake up for (a pipeline retry coming due, an
+# attempt timing out, the retry cap), kept in a heap so the handler can wait
+# on its event bus for exactly as long as the nearest one.
+#
+# The clock is injectable and returns datetimes, like Logic._now, so tests
+# drive deadlines with the same fake clock as the rest of Logic.
+
+
+class DeadlineScheduler:
+    def __init__(self, now_fn):
+        self._now_fn = now_fn
+        self.heap = []
+        self.deadlines = {}
+        self.fired = {}
+        self._seq = 0
+
+    def schedule(self, key, when):
+        """Sets (or moves) the deadline for key.  A deadline that has already
+        fired is not scheduled again."""
+        if self.deadlines.get(key) == when or self.fired.get(key) == when:
+            return
+        self.deadlines[key] = when
+        self._seq += 1
+        heapq.heappush(self.heap, (when, self._seq, key))
+
+    def cancel(self, key):
+        self.deadlines.pop(key, None)
+
+    def _prune(self):
+        # Entries for cancelled or moved deadlines are dropped lazily
+        while len(self.heap) > 0 and self.deadlines.get(self.heap[0][2]) != self.heap[0][0]:
+            heapq.heappop(self.heap)
+
+    def next_deadline(self):
+        self._prune()
+        return self.heap[0][0] if len(self.heap) > 0 else None
+
+    def timeout(self):
+        """Seconds until the next deadline, or None when nothing is scheduled."""
+        when = self.next_deadline()
+        if when is None:
+            return None
+        return max((when - self._now_fn()).total_seconds(), 0)
+
+    def due(self):
+        """Removes and returns (key, when) for every deadline that has passed."""
+        now = self._now_fn()
+        fired = []
+        while True:
+            self._prune()
+            if len(self.heap) == 0 or self.heap[0][0] > now:
+                return fired
+            when, _, key = heapq.heappop(self.heap)
+            del self.deadlines[key]
+            self.fired[key] = when
+            fired.append((key, when))
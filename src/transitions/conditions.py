@@ -0,0 +1,78 @@
+import threading
+
+# The WaitFor triggers Logic is holding, indexed by the state keys their
+# conditions read ('patroni', 'peer', 'dns', 'switchover_state',
+# 'peer_digest').  When Logic changes one of those keys only the triggers
+# watching it are evaluated, rather than every trigger on every event.
+#
+# Triggers are added and cleared from transition jobs as well as from the
+# handler, so the engine is locked; conditions are evaluated outside the lock.
+# A trigger whose action failed waits until its not_before before it can be
+# ready again.
+
+
+class ConditionEngine:
+    def __init__(self):
+        self.triggers = {}
+        self.index = {}
+        self._next_id = 0
+        self._lock = threading.RLock()
+
+    def add(self, trigger):
+        with self._lock:
+            self._next_id += 1
+            trigger.id = self._next_id
+            self.triggers[trigger.id] = trigger
+            for key in trigger.keys:
+                self.index.setdefault(key, {})[trigger.id] = trigger
+        return trigger
+
+    def cancel(self, trigger):
+        with self._lock:
+            if self.triggers.pop(trigger.id, None) is None:
+                return
+            for key in trigger.keys:
+                watching = self.index.get(key, {})
+                watching.pop(trigger.id, None)
+                if len(watching) == 0:
+                    self.index.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self.triggers.clear()
+            self.index.clear()
+
+    def ready(self, key=None, now=None):
+        """Triggers watching key (every trigger when key is None) whose
+        condition now holds, oldest first."""
+        with self._lock:
+            candidates = list((self.triggers if key is None else self.index.get(key, {})).values())
+        return [trigger for trigger in candidates
+                if (trigger.not_before is None or now is None or trigger.not_before <= now)
+                and trigger.condition()]
+
+    def next_deadline(self):
+        with self._lock:
+            deadlines = [t.deadline for t in self.triggers.values() if t.deadline is not None]
+        return min(deadlines) if len(deadlines) > 0 else None
+
+    def next_retry(self, now):
+        """When the next trigger backing off after a failure can run again."""
+        with self._lock:
+            retries = [t.not_before for t in self.triggers.values() if t.not_before is not None and t.not_before > now]
+        return min(retries) if len(retries) > 0 else None
+
+    def expired(self, now):
+        """Removes and returns the triggers whose deadline has passed."""
+        with self._lock:
+            gone = [t for t in self.triggers.values() if t.deadline is not None and t.deadline <= now]
+            for trigger in gone:
+                self.cancel(trigger)
+        return gone
+
+    def __len__(self):
+        return len(self.triggers)
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self.triggers.values()))
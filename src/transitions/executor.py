@@ -0,0 +1,135 @@
+import asyncio
+import logging
+import time
+from prometheus_client import Counter, Histogram
+from clients.kube_async import run
+from transitions.jobs import current_job, RUNNING, SUCCEEDED, FAILED
+from config import config
+
+logger = logging.getLogger(__name__)
+
+# Runs a transition as a graph of steps.  A step starts as soon as the steps
+# it depends on have finished, so independent API calls overlap instead of
+# running strictly one after another.
+#
+#   run_plan('initiate_active_primary', [
+#       Step('set_in_recovery', set_in_recovery, False, py_env, retries=2),
+#       Step('maintenance_on', maintenance_on),
+#       Step('trigger_deploy', trigger_deploy, ctx, after=['set_in_recovery', 'maintenance_on']),
+#   ])
+
+STEP_TIME = Histogram('switchover_transition_step_seconds', 'Switchover transition step duration',
+                      ['transition', 'step'])
+STEP_RESULT = Counter('switchover_transition_steps', 'Switchover transition step outcomes',
+                      ['transition', 'step', 'result'])
+PLAN_TIME = Histogram('switchover_transition_seconds', 'Switchover transition wall-clock duration',
+                      ['transition'])
+
+
+class Step:
+    def __init__(self, name: str, fn, *args, after=(), timeout: float = None, retries: int = 0):
+        self.name = name
+        self.fn = fn
+        self.args = args
+        self.after = tuple(after)
+        self.timeout = timeout
+        self.retries = retries
+
+
+def validate_plan(steps):
+    names = [step.name for step in steps]
+    if len(set(names)) != len(names):
+        raise ValueError("Duplicate step names in plan %s" % names)
+    for step in steps:
+        for dep in step.after:
+            if dep not in names:
+                raise ValueError("Step %s depends on unknown step %s" % (step.name, dep))
+
+    # Reject cycles; they would otherwise deadlock the plan
+    remaining = dict((step.name, set(step.after)) for step in steps)
+    while len(remaining) > 0:
+        ready = [name for name, deps in remaining.items() if len(deps) == 0]
+        if len(ready) == 0:
+            raise ValueError("Plan has a dependency cycle between %s" % sorted(remaining.keys()))
+        for name in ready:
+            del remaining[name]
+        for deps in remaining.values():
+            deps.difference_update(ready)
+
+
+def _backoff(attempt: int):
+    return min(2 ** (attempt - 1), 10)
+
+
+async def _call(step: Step):
+    if asyncio.iscoroutinefunction(step.fn):
+        return await step.fn(*step.args)
+    return await run(step.fn, *step.args)
+
+
+async def _run_step(transition: str, step: Step, tasks: dict):
+    for dep in step.after:
+        # Propagates the dependency's failure, so dependents never start
+        await tasks[dep]
+
+    # Inside a TransitionJob, report progress and stop here once cancelled
+    job = current_job()
+    if job is not None:
+        job.step(step.name, RUNNING)
+
+    timeout = step.timeout or config.get('transition_step_timeout_seconds')
+    attempt = 0
+    while True:
+        attempt += 1
+        started = time.monotonic()
+        try:
+            result = await asyncio.wait_for(_call(step), timeout)
+            STEP_TIME.labels(transition=transition, step=step.name).observe(time.monotonic() - started)
+            STEP_RESULT.labels(transition=transition, step=step.name, result='ok').inc()
+            logger.debug("[%s] step %s done in %.2fs", transition, step.name, time.monotonic() - started)
+            if job is not None:
+                job.step(step.name, SUCCEEDED)
+            return result
+        except asyncio.CancelledError:
+            raise
+        except Exception as ex:
+            STEP_TIME.labels(transition=transition, step=step.name).observe(time.monotonic() - started)
+            # Timing out only stops the wait; the call may still be running on
+            # its pool thread, so starting it again could run it twice at once
+            timed_out = isinstance(ex, asyncio.TimeoutError)
+            if timed_out and attempt <= step.retries:
+                logger.error("[%s] step %s timed out after %ss - not retried while it may still be running",
+                             transition, step.name, timeout)
+            if attempt > step.retries or timed_out:
+                STEP_RESULT.labels(transition=transition, step=step.name, result='failed').inc()
+                logger.error("[%s] step %s failed - %s", transition, step.name, repr(ex))
+                if job is not None:
+                    job.step(step.name, FAILED)
+                raise
+            STEP_RESULT.labels(transition=transition, step=step.name, result='retry').inc()
+            logger.warning("[%s] step %s failed (attempt %d) - retrying", transition, step.name, attempt)
+            await asyncio.sleep(_backoff(attempt))
+
+
+async def run_plan_async(transition: str, steps):
+    validate_plan(steps)
+    started = time.monotonic()
+    tasks = {}
+    for step in steps:
+        tasks[step.name] = asyncio.ensure_future(_run_step(transition, step, tasks))
+    try:
+        # Let in-flight steps finish even when one fails, then report the
+        # first failure in declaration order.
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+        for step in steps:
+            error = tasks[step.name].exception()
+            if error is not None:
+                raise error
+        return dict((name, task.result()) for name, task in tasks.items())
+    finally:
+        PLAN_TIME.labels(transition=transition).observe(time.monotonic() - started)
+        logger.info("[%s] plan finished in %.2fs", transition, time.monotonic() - started)
+
+
+def run_plan(transition: str, steps):
+    return asyncio.run(run_plan_async(transition, steps))
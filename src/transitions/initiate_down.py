@@ -1,6 +1,8 @@
 import logging
 from clients.kube import restart_deployment
+from clients.kube_async import run_concurrently
 from transitions.shared import maintenance_on, maintenance_off, scale_health_api, set_in_recovery
+from transitions.executor import Step, run_plan
 from config import config
 
 logger = logging.getLogger(__name__)
@@ -11,18 +13,19 @@ def initiate_active_down(py_env: str):
 
     logger.info("initiate_active_down - health down and in maintenance")
 
-    set_in_recovery(True, py_env)
-
-    scale_health_api(config.get('kube_health_namespace'), 
-                     config.get('deployment_health_api'), 
-                     0, py_env)
-
-    maintenance_on()
-
-    # cycle the kong control plane to force data planes to re-establish connections
-    restart_deployment(config.get('solution_namespace'),
-                       config.get('deployment_kong_control_plane'),
-                       config.get('py_env'))
+    run_plan('initiate_active_down', [
+        Step('set_in_recovery', set_in_recovery, True, py_env, retries=2),
+        Step('scale_health_api', scale_health_api,
+             config.get('kube_health_namespace'),
+             config.get('deployment_health_api'),
+             0, py_env, retries=2),
+        Step('maintenance_on', maintenance_on),
+        # cycle the kong control plane to force data planes to re-establish connections
+        Step('restart_kong', restart_deployment,
+             config.get('solution_namespace'),
+             config.get('deployment_kong_control_plane'),
+             config.get('py_env'), after=['scale_health_api', 'maintenance_on']),
+    ])
 
 # Be really careful with this one; make sure Passive site is not live!
 def rollback_active_down(py_env: str):
@@ -31,8 +34,8 @@ def rollback_active_down(py_env: str):
 
     maintenance_off(py_env)
 
-    scale_health_api(config.get('kube_health_namespace'), 
-                     config.get('deployment_health_api'), 
-                     2, py_env)
+    run_concurrently(scale_health_api(config.get('kube_health_namespace'),
+                                      config.get('deployment_health_api'),
+                                      2, py_env))
 
-    set_in_recovery(False, py_env)
+    run_concurrently(set_in_recovery(False, py_env))
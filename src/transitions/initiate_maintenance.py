@@ -1,7 +1,8 @@
 import logging
 import logging
 from transitions.shared import scale_health_api, set_in_maintenance
-from transitions.initiate_primary import deploy_primary
+from transitions.initiate_primary import promote_primary, trigger_deploy
+from transitions.executor import Step, run_plan
 from config import config
 
 logger = logging.getLogger(__name__)
@@ -14,8 +15,13 @@ logger = logging.getLogger(__name__)
 
 
 def initiate_passive_maintenance(logic_context, patroni_local_url: str, py_env: str):
-    set_in_maintenance(True, py_env)
-    scale_health_api(config.get('kube_health_namespace'), 
-                     config.get('deployment_health_api'), 
-                     0, py_env)
-    return deploy_primary(logic_context, patroni_local_url, py_env)
+    return run_plan('initiate_passive_maintenance', [
+        Step('set_in_maintenance', set_in_maintenance, True, py_env, retries=2),
+        Step('scale_health_api', scale_health_api,
+             config.get('kube_health_namespace'),
+             config.get('deployment_health_api'),
+             0, py_env, retries=2),
+        Step('promote_patroni', promote_primary, logic_context, patroni_local_url, py_env),
+        Step('trigger_deploy', trigger_deploy, logic_context, False,
+             after=['set_in_maintenance', 'scale_health_api', 'promote_patroni']),
+    ])['trigger_deploy']
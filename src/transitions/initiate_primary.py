@@ -1,8 +1,9 @@
 import logging
-import datetime
+from clients.kube_async import run
 from clients.patroni import set_primary_cluster
 from clients.tekton import trigger_tekton_build
 from transitions.shared import maintenance_on, scale_health_api, set_in_recovery, update_patroni_spilo_env_vars
+from transitions.executor import Step, run_plan
 from config import config
 
 logger = logging.getLogger(__name__)
@@ -19,30 +20,33 @@ logger = logging.getLogger(__name__)
 #   - then turn maintenance mode off
 
 def initiate_active_primary(logic_context, patroni_local_url: str, py_env: str):
-    set_in_recovery(False, py_env)
-
-    maintenance_on()
-
-    scale_health_api(config.get('kube_health_namespace'), 
-                     config.get('deployment_health_api'), 
-                     2, py_env)
-
-    return deploy_primary(logic_context, patroni_local_url, py_env)
+    return run_plan('initiate_active_primary',
+                    primary_steps(logic_context, patroni_local_url, py_env, False))['trigger_deploy']
 
 
 def initiate_passive_primary(logic_context, patroni_local_url: str, py_env: str):
-    set_in_recovery(True, py_env)
-
-    maintenance_on()
-
-    scale_health_api(config.get('kube_health_namespace'), 
-                     config.get('deployment_health_api'), 
-                     2, py_env)
-
-    return deploy_primary(logic_context, patroni_local_url, py_env)
-
-
-def deploy_primary(logic_context, patroni_local_url: str, py_env: str):
+    return run_plan('initiate_passive_primary',
+                    primary_steps(logic_context, patroni_local_url, py_env, True))['trigger_deploy']
+
+
+# set_in_recovery, maintenance and the Patroni promotion are independent of
+# each other; the health api only comes up once maintenance is on, and the
+# deployment is only triggered once everything it depends on is in place.
+def primary_steps(logic_context, patroni_local_url: str, py_env: str, in_recovery: bool):
+    return [
+        Step('set_in_recovery', set_in_recovery, in_recovery, py_env, retries=2),
+        Step('maintenance_on', maintenance_on),
+        Step('scale_health_api', scale_health_api,
+             config.get('kube_health_namespace'),
+             config.get('deployment_health_api'),
+             2, py_env, after=['maintenance_on'], retries=2),
+        Step('promote_patroni', promote_primary, logic_context, patroni_local_url, py_env),
+        Step('trigger_deploy', trigger_deploy, logic_context, False,
+             after=['set_in_recovery', 'maintenance_on', 'scale_health_api', 'promote_patroni']),
+    ]
+
+
+async def promote_primary(logic_context, patroni_local_url: str, py_env: str):
     logger.info("initiate_primary")
 
     patroni = logic_context.patroni
@@ -51,11 +55,15 @@ def deploy_primary(logic_context, patroni_local_url: str, py_env: str):
         logger.warn(
             "Patroni has no concerns and is already Primary, no further action")
     else:
-        set_primary_cluster(patroni_local_url)
+        await run(set_primary_cluster, patroni_local_url)
 
-        update_patroni_spilo_env_vars(
+        await update_patroni_spilo_env_vars(
             False, py_env)
 
+
+# Returns the pipeline for Logic to track; it is applied on the handler thread
+# once the job has finished
+def trigger_deploy(logic_context, maintenance: bool):
     pipeline_event = trigger_tekton_build(config.get("tekton_trigger_url"),
                                           config.get("tekton_github_repo"),
                                           config.get("tekton_github_ref"),
@@ -63,6 +71,6 @@ def deploy_primary(logic_context, patroni_local_url: str, py_env: str):
     logger.info("Triggered tekton event %s" % pipeline_event['eventID'])
 
     pipeline = dict(event_id=pipeline_event['eventID'],
-                    start_ts=datetime.datetime.now(), maintenance=False)
+                    start_ts=logic_context._now(), maintenance=maintenance)
 
-    logic_context.set_pipeline(pipeline)
+    return dict(pipeline=pipeline)
@@ -1,8 +1,11 @@
 import logging
 import datetime
-from clients.kube import scale_and_wait, delete_pvc, delete_configmap
+from clients.kube import scale_and_wait
+from clients import kube_async
+from clients.kube_async import run_concurrently
 from clients.tekton import trigger_tekton_build
 from transitions.wait_for import WaitFor
+from transitions.jobs import checkpoint
 from transitions.shared import maintenance_on, scale_health_api, set_in_recovery, update_patroni_spilo_env_vars
 from config import config
 
@@ -10,18 +13,19 @@ logger = logging.getLogger(__name__)
 
 
 def initiate_active_standby(logic_context, py_env: str):
-    scale_health_api(config.get('kube_health_namespace'), 
-                     config.get('deployment_health_api'), 
-                     0, py_env)
+    run_concurrently(scale_health_api(config.get('kube_health_namespace'),
+                                      config.get('deployment_health_api'),
+                                      0, py_env))
     return initiate_standby(logic_context,
                             py_env, 'gold-standby')
 
 
 def initiate_passive_standby(logic_context, py_env: str):
-    set_in_recovery(False, py_env)
-    scale_health_api(config.get('kube_health_namespace'), 
-                     config.get('deployment_health_api'), 
-                     2, py_env)
+    run_concurrently(
+        set_in_recovery(False, py_env),
+        scale_health_api(config.get('kube_health_namespace'),
+                         config.get('deployment_health_api'),
+                         2, py_env))
     return initiate_standby(logic_context,
                             py_env, 'active-passive')
 
@@ -49,36 +53,54 @@ def initiate_standby(logic_context, py_env: str, final_state: str):
             "Patroni has no concerns and is already a Standby Leader, no further action")
         return None
     else:
-        logic_context.clear_triggers()
-
-        update_patroni_spilo_env_vars(
-            True, py_env)
+        checkpoint('update_patroni_env')
+        run_concurrently(update_patroni_spilo_env_vars(
+            True, py_env))
 
+        checkpoint('scale_down_patroni')
         scale_and_wait(ns, 'statefulset',
                        config.get('statefulset_patroni'),
                        "app=%s" % config.get('statefulset_patroni'),
                        0, py_env)
 
-        delete_pvc(ns, 'storage-volume-patroni-spilo-0', py_env)
-        delete_configmap(ns, 'patroni-spilo-config', py_env)
+        checkpoint('reset_patroni_storage')
+        run_concurrently(
+            kube_async.delete_pvc(ns, 'storage-volume-patroni-spilo-0', py_env),
+            kube_async.delete_configmap(ns, 'patroni-spilo-config', py_env))
+        checkpoint('scale_up_patroni_leader')
         scale_and_wait(ns, 'statefulset',
                        'patroni-spilo', "app=patroni-spilo", 1, py_env)
 
         logger.debug("Adding Future work to be triggered later...")
-        return WaitFor().wait_until(logic_context.patroni_has_no_standby_concerns).then_trigger(
+        work = WaitFor().watching('patroni').wait_until(logic_context.patroni_has_no_standby_concerns).then_trigger(
             complete_standby, logic_context, ns, py_env, final_state)
+        timeout = config.get('standby_trigger_timeout_seconds')
+        if timeout > 0:
+            work.expire_at(logic_context._now() + datetime.timedelta(seconds=timeout),
+                           standby_not_ready, final_state)
+        return work
+
+
+def standby_not_ready(final_state: str):
+    logger.error("Patroni did not become a healthy Standby Leader in time - %s not completed, "
+                 "transition stays partial", final_state)
 
 
+# The pipeline and final state are returned for Logic to apply on the handler
+# thread; the trigger stays Logic's running trigger until then, so it is
+# retried if anything here fails
 def complete_standby(logic_context, ns: str, py_env: str, final_state: str):
     logger.info("complete_standby starting")
 
-    delete_pvc(ns, 'storage-volume-patroni-spilo-1', py_env)
-    delete_pvc(ns, 'storage-volume-patroni-spilo-2', py_env)
+    checkpoint('reset_replica_storage')
+    run_concurrently(
+        kube_async.delete_pvc(ns, 'storage-volume-patroni-spilo-1', py_env),
+        kube_async.delete_pvc(ns, 'storage-volume-patroni-spilo-2', py_env))
+    checkpoint('scale_up_patroni_replicas')
     scale_and_wait(ns, 'statefulset',
                    'patroni-spilo', "app=patroni-spilo", 3, py_env)
 
-    logic_context.clear_triggers()
-
+    checkpoint('trigger_deploy')
     pipeline_event = trigger_tekton_build(config.get("tekton_trigger_url"),
                                           config.get("tekton_github_repo"),
                                           config.get("tekton_github_ref"),
@@ -86,9 +108,6 @@ def complete_standby(logic_context, ns: str, py_env: str, final_state: str):
     logger.info("Triggered tekton event %s" % pipeline_event['eventID'])
 
     pipeline = dict(event_id=pipeline_event['eventID'],
-                    start_ts=datetime.datetime.now(), maintenance=True)
-
-    logic_context.set_pipeline(pipeline)
+                    start_ts=logic_context._now(), maintenance=True)
 
-    logic_context.update_switchover_state(
-        final_state, '', None, py_env)
+    return dict(pipeline=pipeline, state=final_state)
@@ -0,0 +1,133 @@
+import logging
+import threading
+import time
+import traceback
+import sys
+import uuid
+from prometheus_client import Counter, Gauge
+from event_bus import stamped
+
+logger = logging.getLogger(__name__)
+
+# A transition running on a background thread, so Logic.handler keeps
+# handling peer, DNS and tick events while Patroni is scaled and pipelines
+# are triggered.  The job records which step it is on and, when it ends,
+# posts a 'transition_job' event so Logic can finish the transition (update
+# the switchover state, tell the peer) back on the handler thread.
+#
+# Cancelling is cooperative: a job stops at its next checkpoint, i.e. before
+# the next plan step starts.  A step already in flight (a scale_and_wait
+# watch, an HTTP call) runs to completion or to its own timeout.
+
+PENDING = 'pending'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+JOBS = Counter('switchover_transition_jobs', 'Switchover transition job outcomes',
+               ['transition', 'state'])
+ACTIVE = Gauge('switchover_transition_job_active', 'Switchover transition job is running')
+
+_local = threading.local()
+
+
+class Cancelled(Exception):
+    pass
+
+
+def current_job():
+    """The job running on this thread, if any."""
+    return getattr(_local, 'job', None)
+
+
+def checkpoint(name: str):
+    """Records progress for the current job and stops it if it has been
+    cancelled.  Does nothing outside of a job."""
+    job = current_job()
+    if job is not None:
+        job.step(name, RUNNING)
+
+
+class TransitionJob:
+    def __init__(self, transition: str, fn, args, notify, on_done=None, now_fn=time.monotonic):
+        self.id = uuid.uuid4().hex[:8]
+        self.transition = transition
+        self.fn = fn
+        self.args = args
+        self.notify = notify
+        self.on_done = on_done
+        self._now_fn = now_fn
+        self.state = PENDING
+        self.steps = {}
+        self.result = None
+        self.error = None
+        self.started = None
+        self.finished = None
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self, background: bool = True):
+        """Runs the job on its own thread, or to completion on this one when
+        background is False (as replay.py does)."""
+        self.started = self._now_fn()
+        self.state = RUNNING
+        ACTIVE.set(1)
+        if not background:
+            self._run()
+            return None
+        thread = threading.Thread(target=self._run, daemon=True, name="job-%s" % self.transition)
+        thread.start()
+        return thread
+
+    def _run(self):
+        _local.job = self
+        try:
+            self.result = self.fn(*self.args)
+            self.state = SUCCEEDED
+        except Cancelled:
+            logger.warning("[%s] job %s cancelled", self.transition, self.id)
+            self.state = CANCELLED
+        except Exception as ex:
+            logger.error("[%s] job %s failed - %s", self.transition, self.id, repr(ex))
+            traceback.print_exc(file=sys.stdout)
+            self.error = repr(ex)
+            self.state = FAILED
+        finally:
+            _local.job = None
+            self.finished = self._now_fn()
+            ACTIVE.set(0)
+            JOBS.labels(transition=self.transition, state=self.state).inc()
+            logger.info("[%s] job %s %s in %.2fs", self.transition, self.id, self.state,
+                        self.finished - self.started)
+            self.notify(stamped(dict(event="transition_job", id=self.id, state=self.state)))
+
+    def cancel(self):
+        self._cancel.set()
+
+    def cancelling(self):
+        return self._cancel.is_set()
+
+    def running(self):
+        return self.state in (PENDING, RUNNING)
+
+    def step(self, name: str, state: str):
+        """Records a step's state; a step can not start once the job has been
+        cancelled."""
+        if state == RUNNING and self._cancel.is_set():
+            raise Cancelled()
+        with self._lock:
+            self.steps[name] = state
+
+    def status(self):
+        with self._lock:
+            steps = dict(self.steps)
+        end = self.finished if self.finished is not None else self._now_fn()
+        return dict(
+            id=self.id,
+            transition=self.transition,
+            state=self.state,
+            cancelling=self._cancel.is_set(),
+            steps=steps,
+            elapsed_seconds=None if self.started is None else round(end - self.started, 1),
+            error=self.error)
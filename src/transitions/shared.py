@@ -1,7 +1,8 @@
 import logging
 from config import config
-from clients.kube import scale, update_configmap, update_pdb
-from clients.kube import restart_deployment, patch_secret
+import asyncio
+from clients import kube_async
+from clients.kube import restart_deployment
 from clients.keycloak import keycloak_service_block, keycloak_service_flow
 from clients.maintenance import set_maintenance
 from prometheus_client import Gauge, Counter, Enum
@@ -50,34 +51,35 @@ def maintenance_off(py_env_ignored: str):
 
     MAINT.set(0)
 
-def scale_health_api(namespace: str, deployment_name: str, replicas: int, py_env: str):
-    scale(namespace, 'deployment', deployment_name, replicas, py_env)
-    
+# The scale and the PDB are independent, so both are patched at once
+async def scale_health_api(namespace: str, deployment_name: str, replicas: int, py_env: str):
     min_available = 1 if replicas > 0 else 0
-    update_pdb(namespace, deployment_name + '-pdb', min_available, py_env)
+    await asyncio.gather(
+        kube_async.scale(namespace, 'deployment', deployment_name, replicas, py_env),
+        kube_async.update_pdb(namespace, deployment_name + '-pdb', min_available, py_env))
 
 # Setting the in_recovery indicator on the pipeline will force in_maintenance to False
-def set_in_recovery(state: bool, py_env: str):
+async def set_in_recovery(state: bool, py_env: str):
     state_str = 'false'
     if state:
         state_str = 'true'
     spec = {"in_recovery": state_str, "in_maintenance": "false"}
-    patch_secret(config.get("tekton_namespace"),
-                 config.get("tekton_terraform_tfvars"), py_env, spec)
+    await kube_async.patch_secret(config.get("tekton_namespace"),
+                                  config.get("tekton_terraform_tfvars"), py_env, spec)
 
 # Setting the maintenance indicator on the pipeline will force in_recovery to False
 
 
-def set_in_maintenance(state: bool, py_env: str):
+async def set_in_maintenance(state: bool, py_env: str):
     state_str = 'false'
     if state:
         state_str = 'true'
     spec = {"in_recovery": "false", "in_maintenance": state_str}
-    patch_secret(config.get("tekton_namespace"),
-                 config.get("tekton_terraform_tfvars"), py_env, spec)
+    await kube_async.patch_secret(config.get("tekton_namespace"),
+                                  config.get("tekton_terraform_tfvars"), py_env, spec)
 
 
-def update_patroni_spilo_env_vars(standby: bool, py_env: str):
+async def update_patroni_spilo_env_vars(standby: bool, py_env: str):
     name = config['configmap_patroni_env_vars']
     ns = config['solution_namespace']
 
@@ -91,4 +93,4 @@ def update_patroni_spilo_env_vars(standby: bool, py_env: str):
             STANDBY_HOST="",
             STANDBY_PORT=""
         ))
-    update_configmap(ns, name, py_env, update)
+    await kube_async.update_configmap(ns, name, py_env, update)
@@ -0,0 +1,149 @@
+from collections import namedtuple
+from transitions.initiate_down import initiate_active_down
+from transitions.initiate_maintenance import initiate_passive_maintenance
+from transitions.initiate_primary import initiate_active_primary, initiate_passive_primary
+from transitions.initiate_standby import initiate_active_standby, initiate_passive_standby
+
+# The transitions Logic performs when the switchover configmap asks for one,
+# declared as data.  Each rule covers one requested transition at one site:
+#
+#   from_states - last_stable_state values the transition may start from
+#                 (None for any)
+#   guards      - checked in order; 'peer_state' asks the peer when there is
+#                 no fresh digest, so it always comes last
+#   action      - run as a background job with the named args, None when
+#                 the site has nothing to do
+#   next_state  - last_stable_state once the action succeeds (None leaves
+#                 the switchover state alone)
+#   notify_peer - tell the peer to follow with the same transition
+#
+# The rules are validated and compiled into a lookup by (transition, site)
+# on import, so a bad table stops the agent at startup.
+
+ACTIVE = 'active'
+PASSIVE = 'passive'
+SITES = (ACTIVE, PASSIVE)
+
+STATES = ('independent', 'active-passive', 'gold-standby', 'golddr-primary', 'golddr-maintenance')
+# An empty last_stable_state is reset to 'independent' by Logic
+INITIAL_STATES = ('independent',)
+
+ARGS = ('logic', 'patroni_local_url', 'py_env')
+
+Guard = namedtuple('Guard', ['name', 'arg'])
+
+PEER_REACHABLE = Guard('peer_reachable', None)
+GUARDS = ('peer_reachable', 'peer_state')
+
+
+def peer_in(state: str):
+    return Guard('peer_state', state)
+
+
+Rule = namedtuple('Rule', ['transition', 'site', 'from_states', 'guards', 'action', 'args',
+                           'next_state', 'notify_peer'])
+
+KEEP = object()
+
+
+def rule(transition: str, site: str, action=None, args=(), from_states=None, guards=(),
+         next_state=KEEP, notify_peer: bool = False):
+    return Rule(transition, site, None if from_states is None else tuple(from_states), tuple(guards),
+                action, tuple(args), transition if next_state is KEEP else next_state, notify_peer)
+
+
+ACTIVE_PASSIVE_FROM = ('independent', 'golddr-maintenance', 'gold-standby')
+PRIMARY_ARGS = ('logic', 'patroni_local_url', 'py_env')
+STANDBY_ARGS = ('logic', 'py_env')
+
+TRANSITIONS = [
+    rule('active-passive', ACTIVE, initiate_active_primary, PRIMARY_ARGS,
+         from_states=ACTIVE_PASSIVE_FROM, guards=[PEER_REACHABLE, peer_in('gold-standby')], notify_peer=True),
+    rule('active-passive', PASSIVE, initiate_passive_standby, STANDBY_ARGS,
+         from_states=ACTIVE_PASSIVE_FROM, guards=[PEER_REACHABLE]),
+
+    rule('active-passive-force', ACTIVE, initiate_active_primary, PRIMARY_ARGS,
+         next_state='active-passive', notify_peer=True),
+
+    rule('gold-standby', ACTIVE, initiate_active_standby, STANDBY_ARGS,
+         from_states=['golddr-primary'], guards=[PEER_REACHABLE, peer_in('golddr-primary')], notify_peer=True),
+    # do nothing - passive site is already primary
+    rule('gold-standby', PASSIVE,
+         from_states=['golddr-primary'], guards=[PEER_REACHABLE]),
+
+    # : if AUTOMATION_ENABLED, then GSLB should trigger this anyway on peer
+    rule('golddr-primary', ACTIVE, initiate_active_down, ['py_env'], notify_peer=True),
+    rule('golddr-primary', PASSIVE, initiate_passive_primary, PRIMARY_ARGS),
+
+    # Do nothing - maintenance not currently tested for Active site
+    rule('golddr-maintenance', ACTIVE,
+         from_states=['active-passive'], guards=[PEER_REACHABLE]),
+    rule('golddr-maintenance', PASSIVE, initiate_passive_maintenance, PRIMARY_ARGS,
+         from_states=['active-passive'], guards=[PEER_REACHABLE]),
+
+    rule('test-ping-pong', ACTIVE, guards=[peer_in('independent')], next_state=None),
+    rule('test-ping-pong', PASSIVE, guards=[peer_in('independent')], next_state=None),
+]
+
+
+def validate_table(rules):
+    seen = set()
+    for r in rules:
+        where = "%s at %s site" % (r.transition, r.site)
+        if r.site not in SITES:
+            raise ValueError("Rule %s - unknown site" % where)
+        if (r.transition, r.site) in seen:
+            raise ValueError("Conflicting rules for %s" % where)
+        seen.add((r.transition, r.site))
+
+        if r.from_states is not None:
+            if len(r.from_states) == 0:
+                raise ValueError("Rule %s can never start - no from_states" % where)
+            for state in r.from_states:
+                if state not in STATES:
+                    raise ValueError("Rule %s starts from unknown state %s" % (where, state))
+            if r.transition in r.from_states:
+                raise ValueError("Rule %s starts from its own target state" % where)
+        if r.next_state is not None and r.next_state not in STATES:
+            raise ValueError("Rule %s ends in unknown state %s" % (where, r.next_state))
+
+        for i, guard in enumerate(r.guards):
+            if guard.name not in GUARDS:
+                raise ValueError("Rule %s has unknown guard %s" % (where, guard.name))
+            if guard.name == 'peer_state':
+                if guard.arg not in STATES:
+                    raise ValueError("Rule %s requires unknown peer state %s" % (where, guard.arg))
+                if i != len(r.guards) - 1:
+                    raise ValueError("Rule %s - peer_state must be the last guard" % where)
+
+        if r.action is None and len(r.args) > 0:
+            raise ValueError("Rule %s has args but no action" % where)
+        if r.action is not None and not callable(r.action):
+            raise ValueError("Rule %s action is not callable" % where)
+        for arg in r.args:
+            if arg not in ARGS:
+                raise ValueError("Rule %s has unknown arg %s" % (where, arg))
+
+    # Every state a rule starts from has to be reachable, or the rule is dead
+    reachable = set(INITIAL_STATES) | set(r.next_state for r in rules if r.next_state is not None)
+    for r in rules:
+        for state in r.from_states or ():
+            if state not in reachable:
+                raise ValueError("Rule %s at %s site starts from unreachable state %s"
+                                 % (r.transition, r.site, state))
+
+
+class TransitionTable:
+    def __init__(self, rules):
+        validate_table(rules)
+        self.rules = dict(((r.transition, r.site), r) for r in rules)
+        self.transitions = frozenset(r.transition for r in rules)
+
+    def supports(self, transition: str):
+        return transition in self.transitions
+
+    def lookup(self, transition: str, site: str):
+        return self.rules.get((transition, site))
+
+
+TABLE = TransitionTable(TRANSITIONS)
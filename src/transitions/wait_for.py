@@ -4,9 +4,23 @@ logger = logging.getLogger(__name__)
 
 
 class WaitFor:
+    id = None
     condition = None
     action = None
     args = None
+    keys = ('patroni',)
+    deadline = None
+    on_timeout = None
+    timeout_args = ()
+    # Set by Logic when the action failed and is being retried with backoff
+    not_before = None
+    failures = 0
+
+    def watching(self, *keys):
+        """The Logic state keys the condition reads; it is only re-evaluated
+        when one of them changes."""
+        self.keys = keys
+        return self
 
     def wait_until(self, condition):
         self.condition = condition
@@ -17,6 +31,13 @@ class WaitFor:
         self.args = args
         return self
 
+    def expire_at(self, deadline, on_timeout=None, *args):
+        """Drops the trigger at deadline, calling on_timeout(*args) if given."""
+        self.deadline = deadline
+        self.on_timeout = on_timeout
+        self.timeout_args = args
+        return self
+
     def eval(self):
         logger.debug("WaitFor Eval Condition : %s" % self.condition())
         if self.condition():
@@ -0,0 +1,78 @@
+"""Unit tests for checkpointing Logic state for a warm restart."""
+import datetime
+from unittest.mock import patch
+
+from checkpoint import Journal, restore, snapshot
+from event_bus import EventBus
+from transitions.initiate_standby import complete_standby, standby_not_ready
+from transitions.wait_for import WaitFor
+
+from conftest import make_pipeline_run_event
+
+
+def _tracking(logic, clock):
+    logic.set_pipeline(dict(event_id="evt-001", start_ts=clock(), maintenance=True))
+    logic._on_pipeline_failure("test")
+    logic.triggers.add(WaitFor().watching('patroni').wait_until(logic.patroni_has_no_standby_concerns).then_trigger(
+        complete_standby, logic, "test-ns", "test", "gold-standby").expire_at(
+        clock() + datetime.timedelta(seconds=600), standby_not_ready, "gold-standby"))
+
+
+class TestJournal:
+    def test_round_trip_restores_state_and_trigger(self, logic, clock, tmp_path):
+        _tracking(logic, clock)
+        journal = Journal(str(tmp_path / "logic.json"))
+        journal.save(snapshot(logic))
+        state = journal.load()
+        logic.clear_triggers()
+
+        restore(logic, state)
+        assert logic.pipeline['maintenance'] is True
+        assert logic.retry_state['retry_at'] == clock() + datetime.timedelta(seconds=30)
+        assert len(logic.triggers) == 1
+        trigger = list(logic.triggers)[0]
+        assert trigger.action is complete_standby
+        assert trigger.args == (logic, "test-ns", "test", "gold-standby")
+        assert trigger.keys == ('patroni',)
+        assert trigger.deadline == clock() + datetime.timedelta(seconds=600)
+        assert trigger.on_timeout is standby_not_ready
+        logic.clear_triggers()
+
+    def test_unchanged_state_is_not_rewritten(self, logic, tmp_path):
+        journal = Journal(str(tmp_path / "logic.json"))
+        with patch("checkpoint.os.replace") as replace:
+            journal.save(snapshot(logic))
+            journal.save(snapshot(logic))
+        assert replace.call_count == 1
+
+    def test_missing_or_corrupt_checkpoint_is_ignored(self, tmp_path):
+        path = tmp_path / "logic.json"
+        assert Journal(str(path)).load() is None
+        path.write_text("{not json")
+        assert Journal(str(path)).load() is None
+
+    def test_disabled_without_a_path(self, logic):
+        journal = Journal("")
+        journal.save(snapshot(logic))
+        assert journal.load() is None
+
+
+class TestRestore:
+    def test_restart_reconciles_tracked_pipeline(self, logic, clock, tmp_path):
+        journal = Journal(str(tmp_path / "logic.json"))
+        logic.journal = journal
+        logic.set_pipeline(dict(event_id="evt-001", start_ts=clock(), maintenance=False))
+
+        logic.pipeline = logic._empty_pipeline()
+        logic.retry_state = None
+        bus = EventBus()
+        run = make_pipeline_run_event("evt-001", reason="Succeeded")['data']['object']
+        with patch("logic.list_pipeline_runs", return_value=[run]) as runs:
+            logic._restore(bus, "test")
+
+        assert logic.pipeline['event_id'] == "evt-001"
+        assert logic.retry_state['event_id'] == "evt-001"
+        assert runs.call_args.args[0] == "triggers.tekton.dev/triggers-eventid=evt-001"
+        replay = bus.get(timeout=1)
+        assert replay['event'] == "kube_stream"
+        assert replay['data']['object']['metadata']['name'] == "pipeline-run-test"
@@ -0,0 +1,149 @@
+"""Unit tests for the key-indexed WaitFor condition engine."""
+import datetime
+from unittest.mock import DEFAULT, MagicMock, patch
+
+from event_bus import EventBus
+from logic import HandlerContext
+from transitions.conditions import ConditionEngine
+from transitions.initiate_standby import complete_standby, initiate_standby
+from transitions.wait_for import WaitFor
+
+
+class Counting:
+    """A condition that records how often it was evaluated."""
+
+    def __init__(self, result=True):
+        self.result = result
+        self.calls = 0
+        self.__name__ = "counting"
+
+    def __call__(self):
+        self.calls += 1
+        return self.result
+
+
+def _trigger(condition, *keys):
+    return WaitFor().watching(*keys).wait_until(condition).then_trigger(print)
+
+
+class TestConditionEngine:
+    def test_only_triggers_watching_the_key_are_evaluated(self):
+        engine = ConditionEngine()
+        patroni, dns = Counting(), Counting()
+        engine.add(_trigger(patroni, 'patroni'))
+        engine.add(_trigger(dns, 'dns', 'peer'))
+
+        assert len(engine.ready('patroni')) == 1
+        assert (patroni.calls, dns.calls) == (1, 0)
+        engine.ready('peer')
+        assert (patroni.calls, dns.calls) == (1, 1)
+        assert engine.ready('switchover_state') == []
+
+    def test_ready_without_key_evaluates_everything_oldest_first(self):
+        engine = ConditionEngine()
+        first = engine.add(_trigger(Counting(), 'patroni'))
+        engine.add(_trigger(Counting(False), 'dns'))
+        second = engine.add(_trigger(Counting(), 'peer'))
+        assert engine.ready() == [first, second]
+
+    def test_cancel_removes_trigger_from_index(self):
+        engine = ConditionEngine()
+        trigger = engine.add(_trigger(Counting(), 'patroni', 'dns'))
+        engine.cancel(trigger)
+        engine.cancel(trigger)
+        assert len(engine) == 0
+        assert engine.index == {}
+
+    def test_expired_triggers_are_dropped(self, clock):
+        engine = ConditionEngine()
+        soon = engine.add(_trigger(Counting(), 'patroni').expire_at(clock() + datetime.timedelta(seconds=5)))
+        engine.add(_trigger(Counting(), 'patroni').expire_at(clock() + datetime.timedelta(seconds=50)))
+        assert engine.next_deadline() == soon.deadline
+        clock.advance(5)
+        assert engine.expired(clock()) == [soon]
+        assert len(engine) == 1
+
+
+class TestLogicTriggers:
+    def test_relevant_change_starts_trigger_as_job(self, logic):
+        ctx = HandlerContext(None, None, None, "test", None, EventBus())
+        logic.triggers.add(_trigger(Counting(), 'dns'))
+        with patch.object(logic, "_start_job") as start:
+            logic._state_changed('patroni', ctx)
+            start.assert_not_called()
+            logic._state_changed('dns', ctx)
+        start.assert_called_once()
+        logic.clear_triggers()
+
+    def test_trigger_deadline_wakes_logic_and_times_out(self, logic, clock):
+        timed_out = []
+        logic.triggers.add(_trigger(Counting(False), 'patroni').expire_at(
+            clock() + datetime.timedelta(seconds=60), timed_out.append, "gold-standby"))
+        logic._schedule_deadlines()
+        assert logic.deadlines.timeout() == 60
+
+        clock.advance(60)
+        logic._on_deadlines(HandlerContext(None, None, None, "test", None, EventBus()))
+        assert timed_out == ["gold-standby"]
+        assert len(logic.triggers) == 0
+
+    def test_failing_trigger_backs_off_instead_of_rerunning(self, logic, clock):
+        ctx = HandlerContext(None, None, None, "test", None, EventBus())
+        runs = []
+
+        def complete_standby():
+            runs.append(clock())
+            raise RuntimeError("scale failed")
+
+        logic.triggers.add(WaitFor().watching('patroni').wait_until(Counting()).then_trigger(complete_standby))
+        with patch.object(logic, 'background_jobs', False):
+            logic._state_changed('patroni', ctx)
+            # The job's outcome re-evaluates the triggers
+            logic.handle(ctx.bus.get(0), ctx)
+            assert len(runs) == 1 and ctx.bus.get(0) is None
+
+            retry = list(logic.triggers)[0]
+            assert retry.not_before == clock() + datetime.timedelta(seconds=30)
+            assert logic.deadlines.timeout() == 30
+
+            clock.advance(30)
+            logic.handle(None, ctx)
+            logic.handle(ctx.bus.get(0), ctx)
+        assert len(runs) == 2
+        assert list(logic.triggers)[0].not_before == clock() + datetime.timedelta(seconds=60)
+        logic.clear_triggers()
+
+    def test_standby_trigger_expires_on_logics_clock(self, logic, clock):
+        with patch.dict("config.config", standby_trigger_timeout_seconds=600), \
+                patch.multiple("transitions.initiate_standby", maintenance_on=DEFAULT, kube_async=DEFAULT,
+                               update_patroni_spilo_env_vars=MagicMock(), scale_and_wait=DEFAULT,
+                               run_concurrently=DEFAULT):
+            work = initiate_standby(logic, "test", "gold-standby")
+        assert work.deadline == clock() + datetime.timedelta(seconds=600)
+
+    def _complete_standby(self, logic, trigger_tekton_build):
+        ctx = HandlerContext(None, None, None, "test", None, EventBus())
+        logic.triggers.add(WaitFor().watching('patroni').wait_until(Counting()).then_trigger(
+            complete_standby, logic, "ns", "test", "gold-standby"))
+        with patch.object(logic, 'background_jobs', False), \
+                patch.object(logic, 'update_switchover_state') as update, \
+                patch.multiple("transitions.initiate_standby", kube_async=DEFAULT, run_concurrently=DEFAULT,
+                               scale_and_wait=DEFAULT, trigger_tekton_build=trigger_tekton_build):
+            logic._state_changed('patroni', ctx)
+            # Nothing is applied from the job's thread
+            assert logic.pipeline['event_id'] is None
+            update.assert_not_called()
+            logic.handle(ctx.bus.get(0), ctx)
+        return update
+
+    def test_completed_standby_is_applied_on_the_handler_thread(self, logic):
+        update = self._complete_standby(logic, MagicMock(return_value={'eventID': "evt-9"}))
+        assert logic.pipeline['event_id'] == "evt-9"
+        update.assert_called_once_with("gold-standby", '', None, "test")
+        assert len(logic.triggers) == 0 and logic.running_trigger is None
+
+    def test_failed_tekton_trigger_leaves_standby_to_retry(self, logic):
+        self._complete_standby(logic, MagicMock(side_effect=RuntimeError("tekton down")))
+        assert [t.action for t in logic.triggers] == [complete_standby]
+        assert list(logic.triggers)[0].failures == 1
+        logic.clear_triggers()
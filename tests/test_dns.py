@@ -0,0 +1,144 @@
+"""Unit tests for the dns_watch helpers (wire format and resolver quorum)."""
+import asyncio
+import socket
+import struct
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from clients.dns_query import build_query, parse_response, resolve_a
+from clients.dns import confirm_error, dns_quorum, probe_result, quorum_result, resolve_udp
+
+
+def _answer(rtype, ttl, rdata):
+    # Name is a compression pointer back to the question name at offset 12.
+    return b'\xc0\x0c' + struct.pack('!HHIH', rtype, 1, ttl, len(rdata)) + rdata
+
+
+def _response(query_id, answers, rcode=0):
+    question = build_query(query_id, "ggw.example.ca")[12:]
+    header = struct.pack('!HHHHHH', query_id, 0x8180 | rcode, 1, len(answers), 0, 0)
+    return header + question + b''.join(answers)
+
+
+class TestParseResponse:
+    def test_single_a_record(self):
+        data = _response(7, [_answer(1, 30, socket.inet_aton("142.34.229.4"))])
+        assert parse_response(7, data) == dict(addresses=["142.34.229.4"], ttl=30)
+
+    def test_ttl_is_lowest_along_cname_chain(self):
+        cname = b'\x03glb\x00'
+        data = _response(7, [_answer(5, 10, cname),
+                             _answer(1, 30, socket.inet_aton("142.34.64.4"))])
+        assert parse_response(7, data) == dict(addresses=["142.34.64.4"], ttl=10)
+
+    def test_nxdomain_raises_gaierror(self):
+        with pytest.raises(socket.gaierror):
+            parse_response(7, _response(7, [], rcode=3))
+
+    def test_mismatched_id_is_rejected(self):
+        with pytest.raises(ValueError):
+            parse_response(8, _response(7, []))
+
+
+class TestQuorumResult:
+    def test_agreement_meets_quorum(self):
+        assert quorum_result(["142.34.64.4", "142.34.64.4", "142.34.229.4"], 2) == "142.34.64.4"
+
+    def test_no_agreement_returns_none(self):
+        assert quorum_result(["142.34.64.4", "142.34.229.4", "error"], 2) is None
+
+    def test_errors_can_form_a_quorum(self):
+        assert quorum_result(["error", "error", "142.34.229.4"], 2) == "error"
+
+    def test_inconclusive_probes_do_not_vote(self):
+        assert quorum_result([None, None, "142.34.229.4"], 2) is None
+        assert quorum_result([None, "142.34.229.4"], 1) == "142.34.229.4"
+
+
+class TestDnsQuorum:
+    RESOLVERS = [dict(name=ns) for ns in ("10.0.0.1", "10.0.0.2", "10.0.0.3")]
+
+    def test_defaults_to_majority(self):
+        with patch.dict("config.config", dns_quorum=0):
+            assert dns_quorum(self.RESOLVERS) == 2
+            assert dns_quorum(self.RESOLVERS[:1]) == 1
+
+    @pytest.mark.parametrize("quorum", [1, 4])
+    def test_unreachable_or_tied_quorum_is_rejected(self, quorum):
+        with patch.dict("config.config", dns_quorum=quorum):
+            with pytest.raises(ValueError):
+                dns_quorum(self.RESOLVERS)
+
+
+class Nameserver(asyncio.DatagramProtocol):
+    """Answers every query after the first `drop` with one A record."""
+
+    def __init__(self, drop):
+        self.drop = drop
+        self.received = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.received += 1
+        if self.received > self.drop:
+            query_id = struct.unpack('!H', data[:2])[0]
+            self.transport.sendto(_response(query_id, [_answer(1, 30, socket.inet_aton("142.34.229.4"))]), addr)
+
+
+async def _resolve(drop, attempts):
+    server = Nameserver(drop)
+    transport, _ = await asyncio.get_running_loop().create_datagram_endpoint(
+        lambda: server, local_addr=("127.0.0.1", 0))
+    try:
+        port = transport.get_extra_info('sockname')[1]
+        return await resolve_a("ggw.example.ca", "127.0.0.1", 0.2, port=port, attempts=attempts), server.received
+    finally:
+        transport.close()
+
+
+class TestResolveA:
+    def test_lost_query_is_retransmitted(self):
+        answer, received = asyncio.run(_resolve(drop=1, attempts=2))
+        assert answer['addresses'] == ["142.34.229.4"] and received == 2
+
+    def test_times_out_after_every_attempt(self):
+        with pytest.raises(asyncio.TimeoutError):
+            asyncio.run(_resolve(drop=5, attempts=2))
+
+
+class TestResolveUdp:
+    ANSWER = dict(addresses=["142.34.229.4"], ttl=30)
+
+    def test_next_nameserver_is_tried_after_a_timeout(self):
+        with patch("clients.dns.resolve_a", AsyncMock(side_effect=[asyncio.TimeoutError(), self.ANSWER])) as query:
+            assert asyncio.run(resolve_udp("ggw.example.ca", ["10.0.0.1", "10.0.0.2"], 2)) == self.ANSWER
+        assert [c.args[1] for c in query.call_args_list] == ["10.0.0.1", "10.0.0.2"]
+
+    def test_nxdomain_is_an_answer(self):
+        with patch("clients.dns.resolve_a", AsyncMock(side_effect=socket.gaierror("NXDOMAIN"))) as query:
+            with pytest.raises(socket.gaierror):
+                asyncio.run(resolve_udp("ggw.example.ca", ["10.0.0.1", "10.0.0.2"], 2))
+        assert query.call_count == 1
+
+
+class TestConfirmError:
+    def test_timeouts_are_only_reported_after_consecutive_failures(self):
+        resolver = dict(name="udp", mechanism="udp", nameservers=["10.0.0.1"])
+        with patch("clients.dns.resolve_a", AsyncMock(side_effect=asyncio.TimeoutError())), \
+                patch.dict("config.config", dns_error_probes=3):
+            errors = 0
+            reported = []
+            for _ in range(3):
+                outcome = asyncio.run(probe_result(resolver, "ggw.example.ca", 2))
+                result, errors = confirm_error(outcome['result'], errors)
+                reported.append(result)
+        assert reported == [None, None, "error"]
+
+    def test_an_answer_resets_the_count(self):
+        with patch.dict("config.config", dns_error_probes=2):
+            assert confirm_error("error", 0) == (None, 1)
+            assert confirm_error(None, 1) == (None, 1)
+            assert confirm_error("142.34.229.4", 1) == ("142.34.229.4", 0)
+            assert confirm_error("error", 0) == (None, 1)
@@ -0,0 +1,78 @@
+"""Unit tests for the Logic event bus."""
+import queue
+
+from conftest import make_pipeline_run_event
+from event_bus import Event, EventBus, as_dict, stamped
+
+
+def _drain(bus):
+    events = []
+    while bus.qsize() > 0:
+        events.append(bus.get())
+    return events
+
+
+class TestEventBus:
+    def test_failover_events_jump_tekton_backlog(self):
+        bus = EventBus()
+        for n in range(5):
+            bus.put(make_pipeline_run_event("evt-%d" % n))
+        bus.put({"event": "tick"})
+        bus.put({"event": "dns", "result": "1.1.1.1"})
+        events = _drain(bus)
+        assert events[0]["event"] == "dns"
+        assert [e["event"] for e in events[1:]] == ["kube_stream", "tick"]
+
+    def test_superseded_events_coalesce_in_place(self):
+        bus = EventBus()
+        bus.put({"event": "patroni", "control": "up", "member_count": 1})
+        bus.put({"event": "kube_stream", "kind": "configmap", "data": {"object": {}}})
+        bus.put({"event": "patroni", "control": "up", "member_count": 3})
+        events = _drain(bus)
+        assert [(e["event"], e.get("member_count")) for e in events] == [("patroni", 3), ("kube_stream", None)]
+
+    def test_added_is_not_superseded_by_modified(self):
+        bus = EventBus()
+        bus.put(make_pipeline_run_event("evt-1", event_type="ADDED"))
+        bus.put(make_pipeline_run_event("evt-1", reason="Failed"))
+        bus.put(make_pipeline_run_event("evt-1", reason="Succeeded"))
+        events = _drain(bus)
+        assert [e["data"]["type"] for e in events] == ["ADDED", "MODIFIED"]
+        assert events[1]["data"]["object"]["status"]["conditions"][0]["reason"] == "Succeeded"
+
+    def test_handled_event_is_not_coalesced_into(self):
+        bus = EventBus()
+        bus.put({"event": "patroni", "member_count": 1})
+        first = bus.get()
+        bus.put({"event": "patroni", "member_count": 2})
+        assert first["member_count"] == 1
+        assert bus.get()["member_count"] == 2
+
+    def test_switchover_state_never_coalesces(self):
+        bus = EventBus()
+        for transition in ("gold-standby", ""):
+            bus.put({"event": "switchover_state", "data": {"transition": transition}})
+        assert [e["data"]["transition"] for e in _drain(bus)] == ["gold-standby", ""]
+
+    def test_pump_and_timeout(self):
+        bus = EventBus()
+        source = queue.Queue()
+        bus.pump(source)
+        source.put({"event": "peer", "state": "ok"})
+        assert bus.get(timeout=2)["state"] == "ok"
+        assert bus.get(timeout=0.01) is None
+
+
+def test_event_behaves_like_the_dict():
+    item = {"event": "dns", "result": "1.1.1.1"}
+    event = Event.from_dict(item)
+    event["peer_ok"] = True
+    assert "peer_ok" in event and "missing" not in event
+    assert as_dict(event) == dict(item, peer_ok=True)
+    assert as_dict(item) is item
+
+
+def test_stamped_events_keep_their_timestamp_through_the_bus():
+    bus = EventBus()
+    bus.put(stamped({"event": "dns", "result": "1.1.1.1"}))
+    assert bus.get()["ts"] > 0
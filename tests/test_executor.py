@@ -0,0 +1,99 @@
+"""Unit tests for the transition step executor."""
+import asyncio
+import threading
+import time
+import pytest
+from unittest.mock import patch
+
+from transitions.executor import Step, run_plan, validate_plan
+from transitions.initiate_primary import primary_steps
+
+
+@pytest.fixture(autouse=True)
+def no_backoff():
+    with patch("transitions.executor._backoff", return_value=0):
+        yield
+
+
+class TestValidatePlan:
+    def test_rejects_unknown_dependency(self):
+        with pytest.raises(ValueError):
+            validate_plan([Step("a", print, after=["b"])])
+
+    def test_rejects_duplicate_names(self):
+        with pytest.raises(ValueError):
+            validate_plan([Step("a", print), Step("a", print)])
+
+    def test_rejects_cycle(self):
+        with pytest.raises(ValueError):
+            validate_plan([Step("a", print, after=["b"]), Step("b", print, after=["a"])])
+
+
+class TestRunPlan:
+    def test_independent_steps_overlap(self):
+        barrier = threading.Barrier(2, timeout=2)
+        result = run_plan("test", [
+            Step("a", lambda: barrier.wait() is not None),
+            Step("b", lambda: barrier.wait() is not None),
+        ])
+        assert result == {"a": True, "b": True}
+
+    def test_dependents_run_after_dependencies(self):
+        order = []
+
+        def record(name):
+            time.sleep(0.01)
+            order.append(name)
+
+        run_plan("test", [
+            Step("last", record, "last", after=["first"]),
+            Step("first", record, "first"),
+        ])
+        assert order == ["first", "last"]
+
+    def test_failure_blocks_dependents(self):
+        ran = []
+
+        def boom():
+            raise RuntimeError("boom")
+
+        with pytest.raises(RuntimeError):
+            run_plan("test", [
+                Step("a", boom),
+                Step("b", ran.append, "b", after=["a"]),
+                Step("c", ran.append, "c"),
+            ])
+        assert ran == ["c"]
+
+    def test_retries_until_success(self):
+        attempts = []
+
+        def flaky():
+            attempts.append(1)
+            if len(attempts) < 3:
+                raise RuntimeError("flaky")
+            return "ok"
+
+        assert run_plan("test", [Step("a", flaky, retries=2)]) == {"a": "ok"}
+        assert len(attempts) == 3
+
+    def test_step_timeout(self):
+        with pytest.raises(asyncio.TimeoutError):
+            run_plan("test", [Step("slow", time.sleep, 0.5, timeout=0.05)])
+
+    def test_timed_out_step_is_not_retried(self):
+        calls = []
+
+        def slow():
+            calls.append(1)
+            time.sleep(0.2)
+
+        with pytest.raises(asyncio.TimeoutError):
+            run_plan("test", [Step("slow", slow, timeout=0.05, retries=2)])
+        assert len(calls) == 1
+
+
+class TestPlans:
+    def test_deploy_waits_for_the_health_api(self):
+        steps = dict((step.name, step) for step in primary_steps(None, None, "test", False))
+        assert 'scale_health_api' in steps['trigger_deploy'].after
@@ -0,0 +1,90 @@
+"""Unit tests for the async Kube layer (I/O pool and async watch bridging)."""
+import asyncio
+import threading
+import time
+from unittest.mock import patch
+
+from clients import kube_async, kube_watcher
+
+
+class QuietWatch:
+    """A watch on a resource that never changes: stream() blocks until
+    stop() is called, as a real read does until the socket is shut down."""
+
+    def __init__(self, events=()):
+        self.events = list(events)
+        self.yielded = 0
+        self.stopped = threading.Event()
+
+    def __call__(self):
+        return self
+
+    def stream(self, func, *args, **kwargs):
+        for event in self.events:
+            self.yielded += 1
+            yield event
+        self.events = []
+        self.stopped.wait(5)
+
+    def stop(self):
+        self.stopped.set()
+
+
+def _listing():
+    return {"metadata": {"resourceVersion": "1"}, "items": []}
+
+
+def _watch_threads():
+    return [t for t in threading.enumerate() if t.name == "watch-test"]
+
+
+class TestRun:
+    def test_calls_overlap_on_the_pool(self):
+        def slow(n):
+            time.sleep(0.2)
+            return n
+
+        started = time.monotonic()
+        assert kube_async.run_concurrently(kube_async.run(slow, 1), kube_async.run(slow, 2)) == [1, 2]
+        assert time.monotonic() - started < 0.35
+
+    def test_run_concurrently_inside_a_running_loop(self):
+        async def step():
+            return kube_async.run_concurrently(kube_async.run(lambda: 1), kube_async.run(lambda: 2))
+
+        assert asyncio.run(step()) == [1, 2]
+
+
+class TestAsyncResumableStream:
+    def test_closing_a_quiet_stream_stops_its_thread(self):
+        fake = QuietWatch()
+
+        async def first_event():
+            stream = kube_watcher.async_resumable_stream("test", lambda *a, **kw: _listing())
+            event = await stream.__anext__()
+            await stream.aclose()
+            return event
+
+        with patch.object(kube_watcher.watch, "Watch", fake):
+            assert asyncio.run(first_event())['type'] == 'SYNCED'
+            assert fake.stopped.is_set()
+            deadline = time.monotonic() + 2
+            while len(_watch_threads()) > 0 and time.monotonic() < deadline:
+                time.sleep(0.01)
+        assert _watch_threads() == []
+
+    def test_unread_events_hold_back_the_pump(self):
+        obj = {"metadata": {"name": "a", "resourceVersion": "2"}}
+        fake = QuietWatch([{"type": "MODIFIED", "object": obj, "raw_object": obj}] * 10)
+
+        async def unread():
+            stream = kube_watcher.async_resumable_stream("test", lambda *a, **kw: _listing())
+            await stream.__anext__()
+            await asyncio.sleep(0.2)
+            await stream.aclose()
+
+        with patch.object(kube_watcher.watch, "Watch", fake), \
+                patch.object(kube_watcher, "ASYNC_QUEUE_DEPTH", 2):
+            asyncio.run(unread())
+        # Two queued and one waiting to be put, not all ten
+        assert fake.yielded == 3
@@ -0,0 +1,66 @@
+"""Unit tests for the informer cache indexes (no API server involved)."""
+import threading
+from types import SimpleNamespace
+
+from clients.kube_cache import Informer, parse_selector, matches
+
+
+def _obj(name, labels, resource_version="1", ready=None):
+    return SimpleNamespace(
+        metadata=SimpleNamespace(name=name, labels=labels, resource_version=resource_version),
+        status=SimpleNamespace(ready_replicas=ready))
+
+
+SELECTOR = "app=switchover,name=switchover-config,env=test"
+LABELS = {"app": "switchover", "name": "switchover-config", "env": "test"}
+
+
+class TestSelector:
+    def test_equality_terms(self):
+        assert matches(LABELS, parse_selector(SELECTOR))
+        assert not matches(dict(LABELS, env="prod"), parse_selector(SELECTOR))
+
+    def test_inequality_and_exists(self):
+        assert matches({"app": "a"}, parse_selector("app,tier!=db"))
+        assert not matches({"tier": "db"}, parse_selector("app"))
+
+
+class TestInformerStore:
+    def _informer(self, objects):
+        inf = Informer("configmap", "test-tools", "test")
+        for obj in objects:
+            inf.apply(obj)
+        inf._mark_synced()
+        return inf
+
+    def test_list_by_selector(self):
+        inf = self._informer([_obj("switchover-state-test", LABELS), _obj("other", {})])
+        assert [o.metadata.name for o in inf.list(SELECTOR)] == ["switchover-state-test"]
+        assert inf.synced.is_set()
+
+    def test_index_follows_label_changes_and_deletes(self):
+        inf = self._informer([_obj("cm", LABELS)])
+        assert len(inf.list(SELECTOR)) == 1
+        inf.apply(_obj("cm", {}, resource_version="2"))
+        assert inf.list(SELECTOR) == []
+        inf.apply(_obj("cm", LABELS, resource_version="3"))
+        inf._delete(_obj("cm", LABELS))
+        assert inf.list(SELECTOR) == []
+
+    def test_own_write_is_kept_until_watch_catches_up(self):
+        inf = self._informer([_obj("cm", {}, resource_version="a")])
+        inf.write(_obj("cm", LABELS, resource_version="c"))
+        # Event from before our write, still in flight
+        inf.apply(_obj("cm", {}, resource_version="b"))
+        assert len(inf.list(SELECTOR)) == 1
+        inf.apply(_obj("cm", LABELS, resource_version="c"))
+        # Later events replace it whatever their resourceVersion looks like
+        inf.apply(_obj("cm", {}, resource_version="10"))
+        assert inf.list(SELECTOR) == []
+
+    def test_wait_until_wakes_on_change(self):
+        inf = self._informer([_obj("patroni-spilo", {"app": "patroni-spilo"}, ready=0)])
+        threading.Timer(0.05, inf.apply, args=(
+            _obj("patroni-spilo", {"app": "patroni-spilo"}, resource_version="2", ready=3),)).start()
+        assert inf.wait_until(
+            lambda i: any(o.status.ready_replicas == 3 for o in i.list("app=patroni-spilo")), 2)
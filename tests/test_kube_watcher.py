@@ -0,0 +1,75 @@
+"""Unit tests for resumable_stream (resourceVersion resume and targeted relist)."""
+import itertools
+import pytest
+from unittest.mock import patch
+from kubernetes.client.rest import ApiException
+
+from clients import kube_watcher
+
+
+def _run(name, rv):
+    return {"kind": "PipelineRun", "metadata": {"name": name, "resourceVersion": rv}}
+
+
+def _event(event_type, obj):
+    return {"type": event_type, "object": obj, "raw_object": obj}
+
+
+class FakeWatch:
+    """Replays one scripted outcome per stream() call."""
+
+    def __init__(self, script):
+        self.script = script
+        self.calls = []
+
+    def __call__(self):
+        return self
+
+    def stream(self, func, *args, **kwargs):
+        self.calls.append(kwargs)
+        outcome = self.script.pop(0)
+        for event in outcome.get('events', []):
+            yield event
+        if 'raise' in outcome:
+            raise outcome['raise']
+
+
+def _collect(script, listings, count):
+    fake = FakeWatch(script)
+    lists = iter(listings)
+    with patch.object(kube_watcher.watch, "Watch", fake), patch.object(kube_watcher.time, "sleep"):
+        stream = kube_watcher.resumable_stream("test", lambda *a, **kw: next(lists))
+        events = list(itertools.islice(stream, count))
+    return events, fake
+
+
+class TestResumableStream:
+    def test_resumes_from_bookmark_without_relisting(self):
+        listings = [{"metadata": {"resourceVersion": "10"}, "items": [_run("a", "10")]}]
+        script = [
+            {"events": [_event("MODIFIED", _run("a", "11")),
+                        _event("BOOKMARK", {"metadata": {"resourceVersion": "15"}})]},
+            {"events": [_event("MODIFIED", _run("a", "16"))]},
+        ]
+        events, fake = _collect(script, listings, 4)
+
+        assert [e["type"] for e in events] == ["ADDED", "SYNCED", "MODIFIED", "MODIFIED"]
+        assert fake.calls[0]["resource_version"] == "10"
+        assert fake.calls[0]["allow_watch_bookmarks"] is True
+        assert fake.calls[1]["resource_version"] == "15"
+
+    def test_gone_relists_and_only_delivers_differences(self):
+        listings = [
+            {"metadata": {"resourceVersion": "10"},
+             "items": [_run("a", "10"), _run("b", "10"), _run("c", "10")]},
+            {"metadata": {"resourceVersion": "50"},
+             "items": [_run("a", "10"), _run("b", "42")]},
+        ]
+        script = [{"raise": ApiException(status=410)},
+                  {"events": [_event("MODIFIED", _run("a", "51"))]}]
+        events, fake = _collect(script, listings, 8)
+
+        assert [e["type"] for e in events[:4]] == ["ADDED", "ADDED", "ADDED", "SYNCED"]
+        relisted = [(e["type"], e.get("object", {}).get("metadata", {}).get("name")) for e in events[4:7]]
+        assert relisted == [("MODIFIED", "b"), ("DELETED", "c"), ("SYNCED", None)]
+        assert fake.calls[1]["resource_version"] == "50"
@@ -0,0 +1,148 @@
+"""Unit tests for the Patroni poller."""
+import asyncio
+import queue
+import pytest
+import requests
+from types import SimpleNamespace
+from prometheus_client import REGISTRY
+from unittest.mock import MagicMock, patch
+
+from clients import patroni
+from clients.patroni_kube import patroni_kube_watch, state_from_objects
+from clients.patroni_lag import LagTracker
+from config import config
+
+STATE = dict(is_standby_configured=False, member_count=1, concerns=[],
+             leader=dict(member="patroni-spilo-0", role="leader"))
+
+
+def _poll(results):
+    """Runs patroni_query for a number of polls, returning the queued messages."""
+    logic_q = queue.Queue()
+    results = list(results)
+
+    async def fake_fetch(url):
+        result = results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return dict(result)
+
+    async def fake_sleep(seconds):
+        if len(results) == 0:
+            raise asyncio.CancelledError()
+
+    with patch("clients.patroni.fetch_state", side_effect=fake_fetch), \
+            patch("clients.patroni.asyncio.sleep", side_effect=fake_sleep):
+        with pytest.raises(asyncio.CancelledError):
+            asyncio.run(patroni.patroni_query("http://patroni", logic_q, MagicMock()))
+    messages = []
+    while not logic_q.empty():
+        messages.append(logic_q.get())
+    return messages
+
+
+class TestPatroniQuery:
+    def test_unchanged_state_emitted_once(self):
+        messages = _poll([STATE, STATE, STATE])
+        assert len(messages) == 1
+        assert messages[0]["control"] == "up"
+
+    def test_down_emitted_once_while_unreachable(self):
+        error = requests.exceptions.ConnectionError()
+        messages = _poll([STATE, error, error, error, STATE])
+        assert [m["control"] for m in messages] == ["up", "down", "up"]
+
+    def test_changed_state_emitted(self):
+        changed = dict(STATE, member_count=2)
+        messages = _poll([STATE, changed])
+        assert [m["member_count"] for m in messages] == [1, 2]
+
+
+def test_changed_keys():
+    assert patroni.changed_keys(STATE, dict(STATE, member_count=2)) == ["member_count"]
+    assert patroni.changed_keys(None, dict(a=1)) == ["a"]
+
+
+def _obj(name, **annotations):
+    return SimpleNamespace(metadata=SimpleNamespace(name=name, annotations=annotations))
+
+
+class TestStateFromObjects:
+    def test_matches_rest_api_shape(self):
+        pods = [_obj("patroni-spilo-0", status='{"state": "running", "role": "master"}'),
+                _obj("patroni-spilo-1", status='{"state": "starting", "role": "replica"}')]
+        state = state_from_objects(_obj("patroni-spilo-config", config='{"ttl": 30}'),
+                                   _obj("patroni-spilo-leader", leader="patroni-spilo-0"),
+                                   pods)
+        assert state == dict(is_standby_configured=False, member_count=2,
+                             concerns=[dict(member="patroni-spilo-1", role="replica", state="starting")],
+                             leader=dict(member="patroni-spilo-0", role="leader"))
+
+    def test_standby_leader(self):
+        pods = [_obj("patroni-spilo-0", status='{"state": "running", "role": "standby_leader"}')]
+        state = state_from_objects(_obj("c", config='{"standby_cluster": {"host": "x"}}'), None, pods)
+        assert state["is_standby_configured"] is True
+        assert state["leader"] == dict(member="patroni-spilo-0", role="standby_leader")
+
+    def test_missing_objects(self):
+        assert state_from_objects(None, None, []) == dict(
+            is_standby_configured=False, member_count=0, concerns=[], leader=None)
+
+    def test_kube_source_needs_the_cache(self):
+        with patch.dict("config.config", patroni_source="kube", kube_cache_enabled=False), \
+                pytest.raises(ValueError, match="KUBE_CACHE_ENABLED"):
+            patroni_kube_watch("test-ns", queue.Queue(), MagicMock(), "test")
+
+
+class TestLagTracker:
+    def _tracker(self, clock):
+        return LagTracker(stall_seconds=20, now_fn=lambda: clock[0])
+
+    def test_rate_and_eta(self):
+        clock = [0]
+        tracker = self._tracker(clock)
+        for lag in (1000, 800, 600):
+            tracker.observe("patroni-spilo-1", lag, 2)
+            clock[0] += 10
+        assert tracker.rate("patroni-spilo-1") == 20
+        assert tracker.eta("patroni-spilo-1") == 30
+        assert tracker.stalled("patroni-spilo-1") is False
+
+    def test_stalled_when_not_reducing(self):
+        clock = [0]
+        tracker = self._tracker(clock)
+        for lag in (1000, 1000, 1200):
+            tracker.observe("patroni-spilo-1", lag, 2)
+            clock[0] += 10
+        assert tracker.eta("patroni-spilo-1") is None
+        assert tracker.stalled("patroni-spilo-1") is True
+
+    def test_stalls_with_the_default_poll_interval(self):
+        clock = [0]
+        tracker = LagTracker(stall_seconds=config['patroni_catchup_stall_seconds'], now_fn=lambda: clock[0])
+        for _ in range(100):
+            tracker.observe("patroni-spilo-1", 1000, 2)
+            clock[0] += config['patroni_poll_interval_seconds']
+        assert tracker.stalled("patroni-spilo-1") is True
+        assert len(tracker.samples["patroni-spilo-1"]) <= 14
+
+    def test_timeline_change_resets_window(self):
+        clock = [0]
+        tracker = self._tracker(clock)
+        tracker.observe("patroni-spilo-1", 1000, 2)
+        clock[0] += 10
+        tracker.observe("patroni-spilo-1", 5000, 3)
+        assert tracker.rate("patroni-spilo-1") is None
+
+    def test_unknown_lag_ignored(self):
+        tracker = self._tracker([0])
+        tracker.observe("patroni-spilo-1", "unknown", 2)
+        assert tracker.summary() == {}
+
+    def test_departed_member_series_are_removed(self):
+        tracker = self._tracker([0])
+        tracker.observe("patroni-spilo-9", 1000, 2)
+        tracker.summary()
+        tracker.forget(["patroni-spilo-0"])
+        assert REGISTRY.get_sample_value(
+            "switchover_patroni_catchup_eta_seconds", {"member": "patroni-spilo-9"}) is None
@@ -0,0 +1,118 @@
+"""Unit tests for the persistent peer channel."""
+import asyncio
+import functools
+import queue
+import pytest
+
+import websockets
+
+from peers import heartbeat
+from peers.channel import PeerChannel, forward
+from peers.outbox import Deduplicator, Outbox
+from peers.server import hello
+
+
+def test_pipelined_requests_over_one_connection():
+    received = queue.Queue()
+
+    async def scenario():
+        server = await websockets.serve(functools.partial(hello, q=received), "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        states = []
+        channel = PeerChannel("ws://127.0.0.1:%d" % port, None, states.append)
+        runner = asyncio.ensure_future(channel.run())
+        try:
+            futures = [await channel.send({"event": "from_peer", "message": {"n": n}}) for n in range(3)]
+            replies = await asyncio.wait_for(asyncio.gather(*futures), 5)
+            await asyncio.sleep(0.1)
+        finally:
+            runner.cancel()
+            server.close()
+            await server.wait_closed()
+        return states, replies
+
+    states, replies = asyncio.run(scenario())
+    assert states == ["connected"]
+    assert [reply["event"] for reply in replies] == ["pong", "pong", "pong"]
+    assert len(set(reply["id"] for reply in replies)) == 3
+    forwarded = [received.get_nowait() for _ in range(3)]
+    assert [m["message"]["n"] for m in forwarded] == [0, 1, 2]
+    assert all("id" not in m for m in forwarded)
+
+
+def test_replies_without_id_match_in_order():
+    async def scenario():
+        channel = PeerChannel("ws://unused", None)
+        loop = asyncio.get_running_loop()
+        first, second = loop.create_future(), loop.create_future()
+        channel.pending = {1: first, 2: second}
+        channel._on_reply({"event": "pong", "n": "a"})
+        channel._on_reply({"event": "pong", "n": "b"})
+        return first.result(), second.result()
+
+    first, second = asyncio.run(scenario())
+    assert first["n"] == "a" and second["n"] == "b"
+
+
+def test_timed_out_request_is_forgotten():
+    async def scenario():
+        channel = PeerChannel("ws://unused", None)
+        channel.connected.set()
+
+        class Silent:
+            async def send(self, frame):
+                pass
+        channel.websocket = Silent()
+        with pytest.raises(asyncio.TimeoutError):
+            await channel.request({"event": "ping"}, 0.01)
+        late = await channel.send({"event": "ping"})
+        channel._on_reply({"event": "pong"})
+        return channel.pending, late.result()
+
+    pending, reply = asyncio.run(scenario())
+    # The reply goes to the live request, not the one that timed out
+    assert pending == {} and reply == {"event": "pong"}
+
+
+def test_heartbeat_rtt_and_offset():
+    # Peer clock 10s ahead, 20ms each way, 5ms processing on the peer
+    reply = {"event": "pong", "t0": 100.0, "t1": 110.02, "t2": 110.025}
+    rtt, offset = heartbeat.measure(reply, 100.045)
+    assert abs(rtt - 0.04) < 1e-6
+    assert abs(offset - 10.0) < 1e-6
+
+
+def test_pong_stamps_only_timed_pings():
+    assert heartbeat.pong({"event": "from_peer"}, 1.0) == {"event": "pong"}
+    reply = heartbeat.pong(heartbeat.ping((0.01, 0.5)), 2.0)
+    assert reply["t1"] == 2.0 and "t0" in reply and "t2" in reply
+
+
+def test_outbox_messages_acked_by_peer():
+    received = queue.Queue()
+    fwd_to_peer_q = queue.Queue()
+    outbox = Outbox(60, 10)
+
+    async def scenario():
+        server = await websockets.serve(functools.partial(hello, q=received, dedup=Deduplicator()), "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        channel = PeerChannel("ws://127.0.0.1:%d" % port, None)
+        tasks = [asyncio.ensure_future(channel.run()),
+                 asyncio.ensure_future(forward(channel, fwd_to_peer_q, outbox))]
+        try:
+            fwd_to_peer_q.put({"event": "from_peer", "message": {"event": "transition_to", "state": "gold-standby"}})
+            for _ in range(50):
+                await asyncio.sleep(0.05)
+                if received.qsize() == 1 and len(outbox.entries) == 0:
+                    break
+        finally:
+            for task in tasks:
+                task.cancel()
+            server.close()
+            await server.wait_closed()
+
+    asyncio.run(scenario())
+    assert outbox.entries == {}
+    message = received.get_nowait()
+    assert message.pop("ts") > 0
+    assert message == {"event": "from_peer", "message": {"event": "transition_to", "state": "gold-standby"}}
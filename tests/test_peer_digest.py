@@ -0,0 +1,52 @@
+"""Unit tests for peer state digests standing in for confirm_happy_to_proceed."""
+import queue
+
+from peers.digest import build_digest, newer
+
+ITEM = {"event": "switchover_state", "data": {"transition": "gold-standby", "last_stable_state": "golddr-primary"}}
+
+
+def _peer_digest(logic, clock, last_stable_state, transition="", version=1):
+    logic.peer_digest = build_digest("peer", version, clock().timestamp(),
+                                     dict(last_stable_state=last_stable_state, transition=transition),
+                                     dict(control="up", leader=dict(role="leader")), "1.1.1.1")
+
+
+class TestPeerHappyToProceed:
+    def test_fresh_matching_digest_confirms_without_round_trip(self, logic, clock):
+        q = queue.Queue()
+        _peer_digest(logic, clock, "golddr-primary")
+        clock.advance(10)
+        assert logic.peer_happy_to_proceed(ITEM, "golddr-primary", q) is True
+        assert q.empty()
+
+    def test_fresh_digest_in_wrong_state_still_asks_peer(self, logic, clock):
+        q = queue.Queue()
+        _peer_digest(logic, clock, "golddr-primary", transition="gold-standby")
+        assert logic.peer_happy_to_proceed(ITEM, "golddr-primary", q) is False
+        assert q.get_nowait()["message"]["event"] == "confirm_happy_to_proceed"
+
+    def test_digest_is_aged_from_when_it_was_built(self, logic, clock):
+        q = queue.Queue()
+        _peer_digest(logic, clock, "golddr-primary")
+        # Held in the peer's outbox, delivered just now
+        clock.advance(90)
+        assert logic.peer_happy_to_proceed(ITEM, "golddr-primary", q) is False
+        assert q.get_nowait()["message"]["event"] == "confirm_happy_to_proceed"
+
+    def test_stale_digest_falls_back_to_confirmation(self, logic, clock):
+        q = queue.Queue()
+        _peer_digest(logic, clock, "golddr-primary")
+        clock.advance(3600)
+        assert logic.peer_happy_to_proceed(ITEM, "golddr-primary", q) is False
+        assert q.get_nowait()["message"]["event"] == "confirm_happy_to_proceed"
+
+    def test_returned_item_confirms(self, logic, clock):
+        assert logic.peer_happy_to_proceed(dict(ITEM, peer_ok=True), "golddr-primary", queue.Queue()) is True
+
+
+def test_newer():
+    first = build_digest("a", 2, 0, None, dict(control="down"), None)
+    assert newer(None, first)
+    assert not newer(first, dict(first, version=1))
+    assert newer(first, dict(first, session="b", version=1))
@@ -0,0 +1,64 @@
+"""Unit tests for the peer outbox and its peer-side deduplication."""
+from peers.outbox import Deduplicator, Outbox
+
+
+def _dns(result):
+    return {"event": "from_peer", "message": {"event": "dns", "result": result}}
+
+
+def _confirm(state):
+    return {"event": "from_peer", "message": {"event": "confirm_happy_to_proceed", "required_state": state}}
+
+
+def _outbox(clock, ttl=60, max_depth=10):
+    return Outbox(ttl, max_depth, now_fn=lambda: clock[0])
+
+
+class TestOutbox:
+    def test_latest_dns_supersedes_earlier(self):
+        outbox = _outbox([0])
+        outbox.put(_dns("1.1.1.1"))
+        outbox.put(_confirm("gold-standby"))
+        outbox.put(_dns("2.2.2.2"))
+        assert [e.msg["message"].get("result") for e in outbox.unsent()] == [None, "2.2.2.2"]
+
+    def test_unacked_messages_are_resent(self):
+        outbox = _outbox([0])
+        seq = outbox.put(_confirm("gold-standby"))
+        outbox.mark_sent(seq)
+        assert outbox.unsent() == []
+        outbox.resend(seq)
+        assert [e.seq for e in outbox.unsent()] == [seq]
+        outbox.ack(seq)
+        assert outbox.entries == {}
+
+    def test_expires_after_ttl(self):
+        clock = [0]
+        outbox = _outbox(clock, ttl=60)
+        outbox.put(_confirm("gold-standby"))
+        clock[0] = 30
+        outbox.put(_confirm("independent"))
+        clock[0] = 61
+        outbox.expire()
+        assert [e.msg["message"]["required_state"] for e in outbox.unsent()] == ["independent"]
+
+    def test_drops_oldest_when_full(self):
+        outbox = _outbox([0], max_depth=2)
+        for state in ("a", "b", "c"):
+            outbox.put(_confirm(state))
+        assert [e.msg["message"]["required_state"] for e in outbox.unsent()] == ["b", "c"]
+
+    def test_envelope_carries_seq_and_session(self):
+        outbox = _outbox([0])
+        seq = outbox.put(_dns("1.1.1.1"))
+        envelope = outbox.envelope(outbox.entries[seq])
+        assert envelope["seq"] == seq and envelope["session"] == outbox.session
+
+
+def test_deduplicator():
+    dedup = Deduplicator(size=2)
+    assert dedup.first_time("s", 1) is True
+    assert dedup.first_time("s", 1) is False
+    assert dedup.first_time("other", 1) is True
+    assert dedup.first_time(None, None) is True
+    assert dedup.first_time(None, None) is True
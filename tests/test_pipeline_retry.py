@@ -4,6 +4,9 @@ import os
 import pytest
 from unittest.mock import patch
 
+from conftest import make_pipeline_run_event
+from logic import HandlerContext
+
 # Defaults mirrored from config.py / conftest pipeline fixtures
 INTERVAL = 30    # post-failure retry backoff
 ATTEMPT_TIMEOUT = 360
@@ -294,6 +297,18 @@ class TestAttemptTimeout:
             _tick(logic)
             mock_cancel.assert_called_once()
 
+    def test_deferred_cancel_issued_once_run_name_is_known(self, logic, clock):
+        self._seed_in_flight(logic, clock, name=None)
+        clock.advance(ATTEMPT_TIMEOUT)
+        ctx = HandlerContext(None, None, None, "test", None, None)
+
+        with patch("clients.tekton.cancel_pipeline_run") as mock_cancel:
+            _tick(logic)
+            mock_cancel.assert_not_called()
+            logic._on_kube_stream(make_pipeline_run_event("evt-001"), ctx)
+            mock_cancel.assert_called_once()
+        assert logic.pipeline['cancelling'] is True
+
     def test_terminal_cancelled_schedules_fast_retry(self, logic, clock):
         self._seed_in_flight(logic, clock)
         clock.advance(ATTEMPT_TIMEOUT)
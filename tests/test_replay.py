@@ -0,0 +1,118 @@
+"""Unit tests for recording Logic's events and effects and replaying them."""
+import datetime
+import json
+import queue
+import pytest
+from unittest.mock import patch
+
+from config import config
+from event_bus import EventBus
+from recorder import Recorder, Tapped, load
+from replay import RecordedJobs, first_difference, main, replay
+from transitions.initiate_standby import complete_standby
+
+from conftest import make_pipeline_run_event
+
+T0 = 1767225600.0
+SITES = dict(active_site="gold", passive_site="golddr")
+
+
+def _event(t, item):
+    return dict(kind="event", t=t, item=item)
+
+
+def _effect(t, effect, data, job=None):
+    return dict(kind="effect", t=t, effect=effect, data=data, job=job)
+
+
+# The passive site is asked for golddr-primary, the deploy pipeline fails and
+# is retried 30s later, and the retry succeeds.
+RECORDING = [
+    _event(T0, {"event": "switchover_state",
+                "data": {"transition": "golddr-primary", "last_stable_state": "active-passive"}}),
+    _effect(T0, "job", dict(name="golddr-primary"), "a1"),
+    _effect(T0, "job_done", dict(state="succeeded", partial=False, trigger=None, final_state=None), "a1"),
+    _effect(T0, "pipeline", dict(event_id="evt-1", maintenance=False), "a1"),
+    _effect(T0, "switchover_state", dict(last_stable_state="golddr-primary", transition="", maintenance=None)),
+    _event(T0 + 10, make_pipeline_run_event("evt-1", reason="Failed")),
+    _effect(T0 + 40, "retry", dict(event_id="evt-2")),
+    _event(T0 + 300, make_pipeline_run_event("evt-2", reason="Succeeded")),
+]
+
+
+@pytest.fixture
+def sites():
+    with patch.dict("config.config", SITES):
+        yield
+
+
+class TestRecorder:
+    def test_appends_json_lines(self, tmp_path):
+        path = str(tmp_path / "recording.jsonl")
+        recorder = Recorder(path)
+        recorder.event({"event": "dns", "result": "1.1.1.1", "ts": T0})
+        recorder.effect("peer", T0, {"event": "from_peer"})
+        entries = list(load(path))
+        assert [e['kind'] for e in entries] == ["event", "effect"]
+        assert entries[0]['item']['ts'] == T0
+
+    def test_tapped_queue_passes_puts_through(self):
+        seen = []
+        q = Tapped(queue.Queue(), seen.append)
+        q.put({"event": "from_peer"})
+        assert seen == [{"event": "from_peer"}]
+        assert q.get_nowait() == {"event": "from_peer"}
+
+
+class TestRecordedEvents:
+    def test_superseded_events_are_not_recorded(self, logic):
+        logic.recorder = Recorder()
+        bus = EventBus()
+        bus.put({"event": "dns", "result": "1.1.1.1"})
+        bus.put({"event": "dns", "result": "2.2.2.2"})
+        logic._record_event(bus.get(0))
+        assert [e['item']['result'] for e in logic.recorder.entries] == ["2.2.2.2"]
+
+
+class TestReplay:
+    def test_replay_reproduces_recorded_effects(self, logic, sites):
+        result = replay(RECORDING, "golddr")
+        replayed = result['replayed']
+        assert first_difference(result['recorded'], replayed) is None
+        retry = [e for e in replayed if e['effect'] == 'retry'][0]
+        # Retry fires when due, not on the next tick
+        assert retry['t'] == T0 + 40
+
+    def test_changed_decision_is_reported(self, logic, sites):
+        # The active site also tells its peer to follow
+        result = replay(RECORDING, "gold")
+        assert first_difference(result['recorded'], result['replayed']) == 3
+        assert result['replayed'][3]['effect'] == "peer"
+
+    def test_cli_exit_status(self, logic, sites, tmp_path, capsys):
+        path = tmp_path / "recording.jsonl"
+        path.write_text("".join(json.dumps(e) + "\n" for e in RECORDING))
+        assert main([str(path), "--cluster", "golddr"]) == 0
+        assert "matches" in capsys.readouterr().out
+
+    def test_partial_job_trigger_expires_as_recorded(self, logic, sites):
+        trigger = dict(condition="patroni_has_no_standby_concerns", keys=["patroni"],
+                       action="complete_standby", args=["ns", "replay", "golddr-primary"],
+                       deadline=str(datetime.datetime.fromtimestamp(T0 + 60)), on_timeout="standby_not_ready",
+                       timeout_args=["golddr-primary"], not_before=None, failures=0)
+        recording = RECORDING[:2] + [
+            _effect(T0, "job_done", dict(state="succeeded", partial=True, trigger=trigger), "a1"),
+            _event(T0 + 120, {"event": "dns", "result": "1.1.1.1"}),
+        ]
+        timed_out = []
+        with patch.dict("checkpoint.ACTIONS", standby_not_ready=timed_out.append):
+            result = replay(recording, "golddr")
+        assert timed_out == ["golddr-primary"]
+        assert len(result['logic'].triggers) == 0
+
+    def test_partial_job_without_a_recorded_trigger_is_bound(self, logic):
+        recorded = [_effect(T0, "job", dict(name="gold-standby"), "s1"),
+                    _effect(T0, "job_done", dict(state="succeeded", partial=True), "s1")]
+        work = RecordedJobs(recorded, logic, "replay").stub("gold-standby")()
+        assert work.action is complete_standby
+        assert work.args == (logic, config['solution_namespace'], "replay", "gold-standby")
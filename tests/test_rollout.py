@@ -0,0 +1,71 @@
+"""Unit tests for wait_for_rollout over informer caches."""
+import threading
+from types import SimpleNamespace
+import pytest
+from unittest.mock import patch
+
+from clients.kube_cache import Informer
+from clients.rollout import RolloutGoal, wait_for_rollout
+
+
+def _workload(name, rv, ready, replicas, generation=2, observed=2, spec=None):
+    return SimpleNamespace(
+        metadata=SimpleNamespace(name=name, labels={"app": name}, resource_version=rv,
+                                 generation=generation),
+        spec=SimpleNamespace(replicas=replicas if spec is None else spec),
+        status=SimpleNamespace(replicas=replicas, ready_replicas=ready,
+                               observed_generation=observed))
+
+
+def _informers(*objects):
+    inf = Informer("statefulset", "test-ns", "test")
+    for obj in objects:
+        inf.apply(obj)
+    inf._mark_synced()
+    return inf
+
+
+def _patched(inf):
+    def fake_informer(kind, namespace, py_env, sync_timeout=None):
+        return inf if kind == "statefulset" else None
+    return patch("clients.rollout.informer", side_effect=fake_informer)
+
+
+GOALS = [RolloutGoal("statefulset", "patroni-spilo", "app=patroni-spilo", 3),
+         RolloutGoal("statefulset", "keycloak", "app=keycloak", 0)]
+
+
+class TestWaitForRollout:
+    def test_completes_when_all_goals_met(self):
+        inf = _informers(_workload("patroni-spilo", "1", 1, 3), _workload("keycloak", "1", None, 0))
+
+        def converge():
+            update = SimpleNamespace(type="MODIFIED")
+            inf.apply(_workload("patroni-spilo", "2", 3, 3))
+            inf._notify(update)
+
+        threading.Timer(0.05, converge).start()
+        with _patched(inf):
+            progress = wait_for_rollout("test-ns", GOALS, 2, "test")
+
+        assert progress[("statefulset", "patroni-spilo")]["met"]
+        assert progress[("statefulset", "keycloak")]["met"]
+        assert inf.listeners == []
+
+    def test_stale_observed_generation_is_not_done(self):
+        inf = _informers(_workload("patroni-spilo", "1", 3, 3, generation=3, observed=2),
+                         _workload("keycloak", "1", None, 0))
+        with _patched(inf), pytest.raises(Exception, match="patroni-spilo"):
+            wait_for_rollout("test-ns", GOALS, 0.1, "test")
+
+    def test_cache_from_before_the_scale_is_not_done(self):
+        # keycloak was just scaled to 0; the cache still has it at 3, not
+        # yet reporting ready replicas
+        inf = _informers(_workload("patroni-spilo", "1", 3, 3),
+                         _workload("keycloak", "1", None, 3))
+        with _patched(inf), pytest.raises(Exception, match="keycloak"):
+            wait_for_rollout("test-ns", GOALS, 0.1, "test")
+
+    def test_returns_none_without_cache(self):
+        with patch("clients.rollout.informer", return_value=None):
+            assert wait_for_rollout("test-ns", GOALS, 1, "test") is None
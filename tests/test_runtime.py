@@ -0,0 +1,110 @@
+"""Unit tests for the single-process asyncio runtime and worker supervision."""
+import asyncio
+import queue
+import threading
+import pytest
+from unittest.mock import patch
+
+import runtime
+from runtime import Supervised, Worker, read_status, run_tasks, write_status
+
+
+class FakeServer:
+    """Stands in for uvicorn; returns once the expected events were seen."""
+
+    def __init__(self, q, count):
+        self.q = q
+        self.count = count
+        self.events = []
+
+    async def serve(self):
+        while len(self.events) < self.count:
+            try:
+                self.events.append(self.q.get_nowait())
+            except queue.Empty:
+                await asyncio.sleep(0.01)
+
+
+@pytest.fixture(autouse=True)
+def status_file(tmp_path):
+    with patch.dict(runtime.config, worker_status_file=str(tmp_path / "workers.json")):
+        yield
+
+
+def test_workers_share_one_loop_and_in_memory_queue():
+    logic_q = queue.Queue()
+    loops = []
+
+    async def watcher(q):
+        loops.append(asyncio.get_running_loop())
+        q.put({"event": "dns", "result": "1.1.1.1"})
+        await asyncio.Future()
+
+    def blocking(q):
+        q.put({"event": "tick"})
+        # Keep the thread alive so the supervisor does not restart it
+        done.wait(1)
+
+    done = threading.Event()
+    server = FakeServer(logic_q, 2)
+    asyncio.run(run_tasks([Worker('dns_watch', None, (logic_q,), watcher),
+                           Worker('tick_producer', blocking, (logic_q,), None)], server))
+    done.set()
+
+    assert sorted(e["event"] for e in server.events) == ["dns", "tick"]
+    assert len(loops) == 1
+
+
+def test_crashed_worker_is_restarted():
+    logic_q = queue.Queue()
+
+    async def flaky(q):
+        q.put({"event": "started"})
+        raise RuntimeError("boom")
+
+    with patch("runtime.Supervised.mark_exited", return_value=0) as exited:
+        asyncio.run(run_tasks([Worker('dns_watch', None, (logic_q,), flaky)], FakeServer(logic_q, 3)))
+    assert exited.call_count >= 2
+
+
+class TestSupervised:
+    def test_backoff_doubles_and_resets_when_stable(self):
+        clock = [0]
+        sup = Supervised(Worker('dns_watch', None, (), None), now_fn=lambda: clock[0])
+        backoffs = []
+        for _ in range(3):
+            sup.mark_started()
+            clock[0] += 1
+            backoffs.append(sup.mark_exited("crash"))
+        assert backoffs == [1, 2, 4]
+        sup.mark_started()
+        clock[0] += runtime.STABLE_SECONDS
+        assert sup.mark_exited("crash") == 1
+        assert sup.restarts == 4
+
+    def test_health_degrades_after_grace(self):
+        clock = [0]
+        sup = Supervised(Worker('dns_watch', None, (), None), now_fn=lambda: clock[0])
+        sup.mark_started()
+        sup.mark_exited("crash")
+        write_status([sup])
+        healthy, workers = read_status()
+        assert healthy is True and workers['dns_watch']['up'] is False
+        clock[0] += runtime.config.get('worker_down_grace_seconds') + 1
+        write_status([sup])
+        assert read_status()[0] is False
+
+    def test_stale_status_is_unhealthy(self):
+        sup = Supervised(Worker('dns_watch', None, (), None))
+        sup.mark_started()
+        write_status([sup], now_fn=lambda: 1000)
+        assert read_status(now_fn=lambda: 1001)[0] is True
+        # Supervisor stopped rewriting the file
+        stale = 1000 + runtime.STATUS_INTERVAL_SECONDS * runtime.STATUS_STALE_INTERVALS + 1
+        healthy, workers = read_status(now_fn=lambda: stale)
+        assert healthy is False and workers['dns_watch']['up'] is True
+
+    def test_missing_status_is_unhealthy_after_grace(self):
+        grace = runtime.config.get('worker_down_grace_seconds')
+        assert read_status(now_fn=lambda: runtime._started + 1) == (True, {})
+        assert read_status(now_fn=lambda: runtime._started + grace + 1) == (False, {})
@@ -0,0 +1,98 @@
+"""Unit tests for the deadline scheduler and Logic's pipeline deadlines."""
+import datetime
+from unittest.mock import patch
+
+from event_bus import EventBus
+from logic import HandlerContext
+from scheduler import DeadlineScheduler
+
+from conftest import make_pipeline_run_event
+
+INTERVAL = 30
+ATTEMPT_TIMEOUT = 360
+CAP = 900
+
+
+def _at(clock, seconds):
+    return clock() + datetime.timedelta(seconds=seconds)
+
+
+class TestDeadlineScheduler:
+    def test_timeout_tracks_nearest_deadline(self, clock):
+        deadlines = DeadlineScheduler(clock)
+        assert deadlines.timeout() is None
+        deadlines.schedule('b', _at(clock, 20))
+        deadlines.schedule('a', _at(clock, 5))
+        assert deadlines.timeout() == 5
+        clock.advance(2)
+        assert deadlines.timeout() == 3
+
+    def test_due_pops_passed_deadlines_in_order(self, clock):
+        deadlines = DeadlineScheduler(clock)
+        deadlines.schedule('late', _at(clock, 10))
+        deadlines.schedule('early', _at(clock, 1))
+        assert deadlines.due() == []
+        clock.advance(10)
+        assert [key for key, _ in deadlines.due()] == ['early', 'late']
+        assert deadlines.timeout() is None
+
+    def test_moved_and_cancelled_deadlines_do_not_fire(self, clock):
+        deadlines = DeadlineScheduler(clock)
+        deadlines.schedule('retry', _at(clock, 1))
+        deadlines.schedule('retry', _at(clock, 50))
+        deadlines.schedule('cap', _at(clock, 2))
+        deadlines.cancel('cap')
+        clock.advance(5)
+        assert deadlines.due() == []
+        assert deadlines.timeout() == 45
+
+    def test_fired_deadline_is_not_rescheduled(self, clock):
+        deadlines = DeadlineScheduler(clock)
+        when = _at(clock, 1)
+        deadlines.schedule('retry', when)
+        clock.advance(1)
+        assert len(deadlines.due()) == 1
+        deadlines.schedule('retry', when)
+        assert deadlines.timeout() is None
+
+
+class TestLogicDeadlines:
+    def test_failure_registers_retry_deadline(self, logic, clock):
+        logic.set_pipeline(dict(event_id="evt-001", start_ts=clock(), maintenance=False))
+        logic._schedule_deadlines()
+        assert logic.deadlines.timeout() == ATTEMPT_TIMEOUT
+
+        logic._on_pipeline_failure("test")
+        logic._schedule_deadlines()
+        assert logic.deadlines.timeout() == INTERVAL
+
+    def test_retry_fires_when_due_without_a_tick(self, logic, clock):
+        logic.set_pipeline(dict(event_id="evt-001", start_ts=clock(), maintenance=False))
+        logic._on_pipeline_failure("test")
+        logic._schedule_deadlines()
+
+        clock.advance(INTERVAL)
+        with patch("logic.Logic._fire_retry") as fire:
+            logic._on_deadlines(HandlerContext(None, None, None, "test", None, EventBus()))
+        fire.assert_called_once()
+
+    def test_success_clears_deadlines(self, logic, clock):
+        logic.set_pipeline(dict(event_id="evt-001", start_ts=clock(), maintenance=False))
+        logic._schedule_deadlines()
+        with patch("logic.maintenance_off"):
+            logic._on_pipeline_success("test")
+        logic._schedule_deadlines()
+        assert logic.deadlines.timeout() is None
+
+    def test_due_retry_fires_ahead_of_queued_events(self, logic, clock):
+        logic.set_pipeline(dict(event_id="evt-001", start_ts=clock(), maintenance=False))
+        logic._on_pipeline_failure("test")
+        logic._schedule_deadlines()
+        ctx = HandlerContext(None, None, None, "test", None, EventBus())
+        for i in range(5):
+            ctx.bus.put(make_pipeline_run_event("evt-other-%d" % i))
+
+        clock.advance(INTERVAL)
+        with patch("logic.Logic._fire_retry") as fire:
+            logic.handle_next(ctx.bus, ctx)
+        fire.assert_called_once()
@@ -0,0 +1,107 @@
+"""Unit tests for transitions running as background jobs."""
+import queue
+import threading
+from unittest.mock import patch
+
+from event_bus import EventBus
+from logic import HandlerContext
+from transitions.executor import Step, run_plan
+from transitions.jobs import TransitionJob, checkpoint, CANCELLED, FAILED, SUCCEEDED
+from transitions.wait_for import WaitFor
+
+
+def _finished(q):
+    event = q.get(timeout=2)
+    assert event["event"] == "transition_job"
+    return event
+
+
+class TestTransitionJob:
+    def test_success_reports_result(self):
+        q = queue.Queue()
+        job = TransitionJob("gold-standby", lambda a, b: a + b, (1, 2), q.put)
+        job.start()
+        assert _finished(q)["state"] == SUCCEEDED
+        assert job.result == 3
+        assert not job.running()
+
+    def test_failure_is_recorded(self):
+        q = queue.Queue()
+        job = TransitionJob("gold-standby", lambda: 1 / 0, (), q.put)
+        job.start()
+        assert _finished(q)["state"] == FAILED
+        assert "ZeroDivisionError" in job.status()["error"]
+
+    def test_cancel_stops_at_next_checkpoint(self):
+        q = queue.Queue()
+        release = threading.Event()
+        done = []
+
+        def work():
+            checkpoint("first")
+            release.wait(2)
+            checkpoint("second")
+            done.append("second")
+
+        job = TransitionJob("gold-standby", work, (), q.put)
+        job.start()
+        job.cancel()
+        release.set()
+        assert _finished(q)["state"] == CANCELLED
+        assert done == []
+
+    def test_plan_steps_report_progress_and_honour_cancel(self):
+        q = queue.Queue()
+        ran = []
+        job = None
+
+        def first():
+            ran.append("first")
+            job.cancel()
+
+        job = TransitionJob("golddr-primary", run_plan, ("golddr-primary", [
+            Step("first", first),
+            Step("second", lambda: ran.append("second"), after=["first"]),
+        ]), q.put)
+        job.start()
+        assert _finished(q)["state"] == CANCELLED
+        assert ran == ["first"]
+        assert job.status()["steps"] == {"first": SUCCEEDED}
+
+    def test_checkpoint_outside_a_job_is_a_no_op(self):
+        checkpoint("anything")
+
+
+class TestLogicJobs:
+    def test_handler_finishes_transition_after_job(self, logic):
+        bus = EventBus()
+        fwd = queue.Queue()
+        with patch.object(logic, "update_switchover_state") as update:
+            logic._start_transition(bus, "golddr-primary", "golddr-primary", lambda: None, (), "test", fwd)
+            event = bus.get(timeout=2)
+            update.assert_not_called()
+            logic._on_job_finished(event, HandlerContext(None, None, None, "test", fwd, bus))
+        update.assert_called_once_with("golddr-primary", "", None, "test")
+        assert fwd.get_nowait()["message"] == {"event": "transition_to", "state": "golddr-primary"}
+        assert logic.job is None
+
+    def test_follow_up_work_leaves_transition_partial(self, logic):
+        bus = EventBus()
+        work = WaitFor().wait_until(lambda: False).then_trigger(print)
+        with patch.object(logic, "update_switchover_state") as update:
+            logic._start_transition(bus, "gold-standby", "gold-standby", lambda: work, (), "test")
+            logic._on_job_finished(bus.get(timeout=2), HandlerContext(None, None, None, "test", None, bus))
+        update.assert_called_once_with("gold-standby-partial", "", None, "test")
+        assert work in logic.triggers
+        logic.clear_triggers()
+
+    def test_failed_job_leaves_state_alone_and_replays_deferred(self, logic):
+        bus = EventBus()
+        deferred = {"event": "switchover_state", "data": {"transition": "golddr-primary"}}
+        with patch.object(logic, "update_switchover_state") as update:
+            logic._start_transition(bus, "gold-standby", "gold-standby", lambda: 1 / 0, (), "test")
+            logic.deferred = deferred
+            logic._on_job_finished(bus.get(timeout=2), HandlerContext(None, None, None, "test", None, bus))
+        update.assert_not_called()
+        assert logic.deferred is None
+        assert bus.get(timeout=1)["data"] == deferred["data"]
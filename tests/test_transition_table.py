@@ -0,0 +1,92 @@
+"""Unit tests for the declarative transition table and its dispatch."""
+import queue
+import pytest
+from unittest.mock import patch
+
+from logic import HandlerContext
+from transitions.table import (TABLE, TRANSITIONS, ACTIVE, PASSIVE, PEER_REACHABLE, peer_in, rule,
+                               validate_table)
+from transitions.initiate_primary import initiate_active_primary
+
+SITES = dict(active_site="gold", passive_site="golddr")
+
+
+@pytest.fixture
+def ctx():
+    with patch.dict("config.config", SITES):
+        yield HandlerContext("gold", "ns", "http://patroni", "test", queue.Queue(), None)
+
+
+def _switchover(transition, last_stable_state, **extra):
+    return dict({"event": "switchover_state",
+                 "data": {"transition": transition, "last_stable_state": last_stable_state}}, **extra)
+
+
+class TestValidateTable:
+    def test_shipped_table_is_valid(self):
+        validate_table(TRANSITIONS)
+
+    def test_rejects_conflicting_rules(self):
+        with pytest.raises(ValueError, match="Conflicting"):
+            validate_table([rule('golddr-primary', ACTIVE), rule('golddr-primary', ACTIVE)])
+
+    def test_rejects_unreachable_from_state(self):
+        with pytest.raises(ValueError, match="unreachable"):
+            validate_table([rule('active-passive', PASSIVE, from_states=['gold-standby'])])
+
+    def test_rejects_peer_state_before_other_guards(self):
+        with pytest.raises(ValueError, match="last guard"):
+            validate_table([rule('active-passive', ACTIVE, guards=[peer_in('independent'), PEER_REACHABLE])])
+
+    def test_rejects_unknown_action_arg(self):
+        with pytest.raises(ValueError, match="unknown arg"):
+            validate_table([rule('golddr-primary', ACTIVE, initiate_active_primary, ['namespace'])])
+
+    def test_rejects_rule_starting_from_its_target(self):
+        with pytest.raises(ValueError, match="own target"):
+            validate_table([rule('independent', ACTIVE, from_states=['independent'])])
+
+
+class TestApplyTransition:
+    def test_active_passive_on_active_site_starts_job_and_notifies_peer(self, logic, ctx):
+        with patch.object(logic, "_start_transition") as start, \
+                patch.object(logic, "peer_happy_to_proceed", return_value=True):
+            logic._apply_transition(_switchover("active-passive", "gold-standby"),
+                                    "active-passive", "gold-standby", ctx)
+        args = start.call_args.args
+        assert args[1:4] == ("active-passive", "active-passive", initiate_active_primary)
+        assert args[4] == (logic, "http://patroni", "test")
+        assert args[6] is ctx.fwd_to_peer_q
+
+    def test_unreachable_peer_keeps_last_stable_state(self, logic, ctx):
+        logic.peer = "error"
+        with patch.object(logic, "_start_transition") as start, \
+                patch.object(logic, "update_switchover_state") as update:
+            logic._apply_transition(_switchover("gold-standby", "golddr-primary"),
+                                    "gold-standby", "golddr-primary", ctx)
+        start.assert_not_called()
+        update.assert_called_once_with("golddr-primary", "", None, "test")
+
+    def test_wrong_from_state_keeps_last_stable_state(self, logic, ctx):
+        with patch.object(logic, "update_switchover_state") as update:
+            logic._apply_transition(_switchover("golddr-maintenance", "independent"),
+                                    "golddr-maintenance", "independent", ctx)
+        update.assert_called_once_with("independent", "", None, "test")
+
+    def test_rule_without_action_moves_state_directly(self, logic, ctx):
+        logic.peer = "ok"
+        with patch.object(logic, "update_switchover_state") as update:
+            logic._apply_transition(_switchover("golddr-maintenance", "active-passive"),
+                                    "golddr-maintenance", "active-passive", ctx)
+        update.assert_called_once_with("golddr-maintenance", "", None, "test")
+
+    def test_unsupported_transition_is_ignored(self, logic, ctx):
+        with patch.object(logic, "update_switchover_state") as update:
+            logic._apply_transition(_switchover("sideways", "independent"), "sideways", "independent", ctx)
+        update.assert_not_called()
+
+
+def test_lookup_by_transition_and_site():
+    assert TABLE.lookup('golddr-primary', PASSIVE).next_state == 'golddr-primary'
+    assert TABLE.lookup('active-passive-force', PASSIVE) is None
+    assert TABLE.supports('test-ping-pong')